@@ -0,0 +1,178 @@
+"""Run the benchmarks of the stack runtime and write the results as JSON.
+
+Each workload runs in a fresh worker process, such that its peak memory usage
+can be measured. For each workload the following is reported:
+ - wall time of the simulation (best of the repeats, and all repeats)
+ - simulated events per second (if the NetSquid version reports event counts)
+ - peak resident set size of the worker process
+
+Usage:
+    python benchmarks/run_benchmarks.py [-k FILTER] [-n NUM_TIMES] [-r REPEAT]
+        [-o OUTPUT] [--compare BASELINE]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from unittest import mock
+
+import netsquid as ns
+from netqasm.logging.glob import set_log_level
+from workloads import WORKLOADS
+
+from squidasm.run.stack.run import run
+from squidasm.sim.stack.common import LogManager
+
+
+def _num_triggered_events(stats: Any) -> Optional[int]:
+    """Get the number of triggered events from the statistics returned by
+    `ns.sim_run`, if available."""
+    data = getattr(stats, "data", None)
+    if callable(data):
+        data = data()
+    if not isinstance(data, dict):
+        return None
+    for key, value in data.items():
+        if "triggered" in str(key) and isinstance(value, int):
+            return value
+    return None
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_workload(name: str, num_times: int, repeat: int) -> Dict[str, Any]:
+    """Run a single workload. Called inside a worker process."""
+    set_log_level(logging.WARNING)
+    LogManager.set_log_level("WARNING")
+
+    workload = WORKLOADS[name]
+    config, programs = workload.create()
+
+    events: List[Optional[int]] = []
+    sim_run = ns.sim_run
+
+    def counting_sim_run(*args, **kwargs):
+        stats = sim_run(*args, **kwargs)
+        events.append(_num_triggered_events(stats))
+        return stats
+
+    wall_times = []
+    num_events = None
+    with mock.patch.object(ns, "sim_run", counting_sim_run):
+        for _ in range(repeat):
+            events.clear()
+            ns.sim_reset()
+            start = time.perf_counter()
+            run(config, programs, num_times=num_times)
+            wall_times.append(time.perf_counter() - start)
+            if len(events) > 0 and all(e is not None for e in events):
+                num_events = sum(events)
+
+    best = min(wall_times)
+    return {
+        "application": workload.application.name,
+        "hardware": workload.hardware,
+        "link": workload.link,
+        "num_times": num_times,
+        "wall_time": best,
+        "wall_times": wall_times,
+        "events": num_events,
+        "events_per_second": None if num_events is None else num_events / best,
+        "peak_rss": _peak_rss_bytes(),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'workload':40} {'baseline [s]':>14} {'current [s]':>14} {'change':>8}")
+    for name, result in results.items():
+        if "wall_time" not in result or "wall_time" not in baseline.get(name, {}):
+            continue
+        old, new = baseline[name]["wall_time"], result["wall_time"]
+        print(f"{name:40} {old:14.4f} {new:14.4f} {(new - old) / old:+8.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-k", "--filter", default="", help="only run workloads containing FILTER"
+    )
+    parser.add_argument(
+        "-n", "--num-times", type=int, default=10, help="program iterations per run"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="number of runs per workload"
+    )
+    parser.add_argument(
+        "-o", "--output", default="benchmark_results.json", help="output file"
+    )
+    parser.add_argument("--compare", help="results file of an earlier benchmark run")
+    args = parser.parse_args()
+
+    names = [name for name in WORKLOADS if args.filter in name]
+    results: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        # A fresh process per workload, such that the peak RSS is its own.
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            future = executor.submit(run_workload, name, args.num_times, args.repeat)
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+
+        result = results[name]
+        if "error" in result:
+            print(f"{name:40} FAILED ({result['error']})")
+        else:
+            eps = result["events_per_second"]
+            print(
+                f"{name:40} {result['wall_time']:10.4f} s"
+                f" {'-' if eps is None else f'{eps:12.0f}'} events/s"
+                f" {result['peak_rss'] / 2**20:8.1f} MiB"
+            )
+
+    output = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "num_times": args.num_times,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Workloads for benchmarking the stack runtime.
+
+Each workload runs the programs of one of the applications in
+`examples/applications` on a two-node network, for a combination of a hardware
+type (generic or NV) and a link type (perfect, depolarise or heralded).
+"""
+from __future__ import annotations
+
+import importlib.util
+import itertools
+import os
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, Dict, List, Tuple
+
+from squidasm.run.stack.config import (
+    DepolariseLinkConfig,
+    GenericQDeviceConfig,
+    HeraldedLinkConfig,
+    LinkConfig,
+    NVQDeviceConfig,
+    StackConfig,
+    StackNetworkConfig,
+)
+from squidasm.sim.stack.program import Program
+
+EXAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "examples", "applications"
+)
+
+HARDWARE = ["generic", "nv"]
+LINKS = ["perfect", "depolarise", "heralded"]
+
+
+def load_example(path: str) -> ModuleType:
+    """Import an example application by its path relative to `EXAMPLES_DIR`."""
+    name = "bench_" + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(EXAMPLES_DIR, path)
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+@dataclass
+class Application:
+    name: str
+    """Name of the application, used in the names of its workloads."""
+    example: str
+    """Path of the example file, relative to `EXAMPLES_DIR`."""
+    node_names: List[str]
+    """Names of the two nodes the programs run on."""
+    create_programs: Callable[[ModuleType], Dict[str, Program]]
+    """Function creating the programs (per node name) from the example module."""
+
+
+def _teleport_programs(example: ModuleType) -> Dict[str, Program]:
+    params = example.TeleportParams(phi=0.3, theta=1.2)
+    return {
+        "Sender": example.SenderProgram(params),
+        "Receiver": example.ReceiverProgram(),
+    }
+
+
+def _qkd_programs(example: ModuleType) -> Dict[str, Program]:
+    return {
+        "Alice": example.AliceProgram(num_epr=20),
+        "Bob": example.BobProgram(num_epr=20),
+    }
+
+
+def _bqc_programs(example: ModuleType) -> Dict[str, Program]:
+    params = example.BQCProgramParams(alpha=1.5708, beta=1.5708, theta1=0.4)
+    return {
+        "Client": example.ClientProgram(params),
+        "Server": example.ServerProgram(),
+    }
+
+
+def _chsh_programs(example: ModuleType) -> Dict[str, Program]:
+    return {"Alice": example.AliceProgram(1), "Bob": example.BobProgram(0)}
+
+
+def _magic_square_programs(example: ModuleType) -> Dict[str, Program]:
+    strategy = example.get_default_strategy()
+    return {
+        "Player1": example.Player1Program(1, strategy),
+        "Player2": example.Player2Program(2, strategy),
+    }
+
+
+def _distributed_cnot_programs(example: ModuleType) -> Dict[str, Program]:
+    params = example.DistributedCNOTParams(phi=0.0, theta=3.1416)
+    return {
+        "Controller": example.ControllerProgram(params),
+        "Target": example.TargetProgram(params),
+    }
+
+
+APPLICATIONS = [
+    Application(
+        "teleport",
+        "teleport/example_teleport.py",
+        ["Sender", "Receiver"],
+        _teleport_programs,
+    ),
+    Application("qkd", "qkd/example_qkd.py", ["Alice", "Bob"], _qkd_programs),
+    Application("bqc", "bqc/example_bqc.py", ["Client", "Server"], _bqc_programs),
+    Application(
+        "chsh", "chsh_game/example_chsh_game.py", ["Alice", "Bob"], _chsh_programs
+    ),
+    Application(
+        "magic_square",
+        "magic_square/example_magic_square.py",
+        ["Player1", "Player2"],
+        _magic_square_programs,
+    ),
+    Application(
+        "distributed_cnot",
+        "distributed_gate/example_distributed_cnot.py",
+        ["Controller", "Target"],
+        _distributed_cnot_programs,
+    ),
+]
+
+
+def create_network_config(
+    node_names: List[str], hardware: str, link: str
+) -> StackNetworkConfig:
+    """Create a two-node network configuration.
+
+    :param node_names: names of the two nodes
+    :param hardware: type of the QDevices, "generic" or "nv"
+    :param link: type of the link, "perfect", "depolarise" or "heralded"
+    """
+    if hardware == "generic":
+        qdevice_cfg = GenericQDeviceConfig.perfect_config()
+        qdevice_cfg.num_qubits = 10
+    elif hardware == "nv":
+        qdevice_cfg = NVQDeviceConfig.perfect_config()
+        qdevice_cfg.num_qubits = 10
+    else:
+        raise ValueError(f"Unknown hardware type {hardware!r}")
+    stacks = [
+        StackConfig(name=name, qdevice_typ=hardware, qdevice_cfg=qdevice_cfg)
+        for name in node_names
+    ]
+
+    if link == "perfect":
+        link_cfg = None
+    elif link == "depolarise":
+        link_cfg = DepolariseLinkConfig(fidelity=0.95, prob_success=0.5, t_cycle=1000)
+    elif link == "heralded":
+        link_cfg = HeraldedLinkConfig(length=10)
+    else:
+        raise ValueError(f"Unknown link type {link!r}")
+    links = [
+        LinkConfig(stack1=node_names[0], stack2=node_names[1], typ=link, cfg=link_cfg)
+    ]
+
+    return StackNetworkConfig(stacks=stacks, links=links)
+
+
+@dataclass
+class Workload:
+    application: Application
+    hardware: str
+    link: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.application.name}-{self.hardware}-{self.link}"
+
+    def create(self) -> Tuple[StackNetworkConfig, Dict[str, Program]]:
+        """Create the network configuration and the programs of this workload."""
+        example = load_example(self.application.example)
+        config = create_network_config(
+            self.application.node_names, self.hardware, self.link
+        )
+        return config, self.application.create_programs(example)
+
+
+WORKLOADS = {
+    workload.name: workload
+    for workload in (
+        Workload(application, hardware, link)
+        for application, hardware, link in itertools.product(
+            APPLICATIONS, HARDWARE, LINKS
+        )
+    )
+}
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+from scipy.stats import norm
+
+from squidasm.run.stack.config import StackNetworkConfig
+from squidasm.run.stack.run import NodePrograms, prepare, run_iterations
+from squidasm.sim.stack.program import Program
+
+
+@dataclass
+class AdaptiveRunResult:
+    """Results of a run that stopped once the estimate of a metric had converged."""
+
+    results: List[List[Dict[str, Any]]]
+    """Program results, outer list is per stack, inner list is per program
+    iteration (the same shape as the return value of `run`, so a stack that runs
+    programs concurrently has a result per program for each iteration)."""
+    values: List[float]
+    """Value of the metric for each iteration."""
+    mean: float
+    """Estimate (sample mean) of the metric."""
+    half_width: float
+    """Half-width of the confidence interval of the estimate."""
+    converged: bool
+    """Whether the confidence interval became narrow enough before `max_times`
+    iterations were run."""
+
+    @property
+    def num_times(self) -> int:
+        """Number of iterations that were run."""
+        return len(self.values)
+
+
+def _confidence_half_width(values: List[float], confidence: float) -> float:
+    """Half-width of the normal-approximation confidence interval of the mean."""
+    if len(values) < 2:
+        return math.inf
+    z = norm.ppf(0.5 + confidence / 2)
+    return float(z * np.std(values, ddof=1) / math.sqrt(len(values)))
+
+
+def run_until(
+    config: StackNetworkConfig,
+    programs: Dict[str, NodePrograms],
+    metric_fn: Callable[
+        [Dict[str, Union[Dict[str, Any], List[Dict[str, Any]]]]], float
+    ],
+    rel_tol: float = 0.01,
+    max_times: int = 10000,
+    abs_tol: float = 0.0,
+    batch_size: int = 100,
+    confidence: float = 0.95,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> AdaptiveRunResult:
+    """Run programs on a network until the estimate of a metric has converged.
+
+    The programs are run in batches of `batch_size` iterations. After each batch,
+    `metric_fn` is evaluated on the results of the new iterations and a confidence
+    interval of the mean of the metric is computed (using the normal
+    approximation). Running stops as soon as the half-width of the interval is at
+    most `rel_tol` times the absolute value of the mean, or at most `abs_tol`, or
+    when `max_times` iterations have been run.
+
+    All iterations are seeded as in `run(config, programs, num_times, seed=seed)`,
+    so the results of a given seed are reproducible and do not depend on
+    `batch_size` or `workers`.
+
+    :param config: configuration of the network
+    :param programs: dictionary of node names to programs, or to sequences of
+        programs that are run concurrently (see `Host.enqueue_program`)
+    :param metric_fn: function mapping the results of a single iteration, as a
+        dictionary of stack name to program result (for the stacks that run a
+        program), to the value of the metric, e.g. the fidelity of a teleported
+        state. For a stack that runs a sequence of programs concurrently, the
+        value is the list of the results of these programs, in the order in which
+        they finished.
+    :param rel_tol: maximal half-width of the confidence interval, relative to the
+        mean, defaults to 0.01
+    :param max_times: maximal number of iterations, defaults to 10000
+    :param abs_tol: maximal absolute half-width of the confidence interval, which
+        is useful for metrics with a mean close to 0 (such as an error rate),
+        defaults to 0
+    :param batch_size: number of iterations run between convergence checks,
+        defaults to 100
+    :param confidence: confidence level of the interval, defaults to 0.95
+    :param workers: number of worker processes over which each batch is spread (see
+        `run_parallel`). If None (default), all iterations are run in this process.
+    :param seed: seed from which the seeds of the iterations are derived. If None,
+        fresh entropy is used.
+    :return: the results, the estimate of the metric and its confidence interval
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    stack_names = [stack.name for stack in config.stacks]
+    results: List[List[Dict[str, Any]]] = [[] for _ in stack_names]
+    # Index, name and number of results per iteration of the stacks that run a
+    # program. A stack that runs programs concurrently has one result per program.
+    program_stacks = [
+        (i, name, None if isinstance(programs[name], Program) else len(programs[name]))
+        for i, name in enumerate(stack_names)
+        if name in programs
+    ]
+    values: List[float] = []
+
+    # Batches are either run on a network prepared once in this process, or
+    # spread over a pool of worker processes that is kept for all batches.
+    network = None
+    executor = None
+    if workers is None:
+        network = prepare(config)
+    else:
+        workers = max(1, min(workers, batch_size, max_times))
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        mean = math.nan
+        half_width = math.inf
+        converged = False
+        while not converged and len(values) < max_times:
+            start = len(values)
+            stop = min(start + batch_size, max_times)
+
+            if network is not None:
+                batch = network.run_iterations(programs, range(start, stop), seed)
+            else:
+                bounds = np.linspace(start, stop, workers + 1).astype(int).tolist()
+                futures = [
+                    executor.submit(run_iterations, config, programs, range(a, b), seed)
+                    for a, b in zip(bounds[:-1], bounds[1:])
+                    if b > a
+                ]
+                batch = [[] for _ in stack_names]
+                for future in futures:
+                    for stack_results, shard_results in zip(batch, future.result()):
+                        stack_results.extend(shard_results)
+
+            for stack_results, batch_results in zip(results, batch):
+                stack_results.extend(batch_results)
+            # Stacks without a program have no results, so only those that ran a
+            # program are passed to the metric.
+            for k in range(stop - start):
+                iteration_results = {
+                    name: batch[i][k]
+                    if num_concurrent is None
+                    else batch[i][k * num_concurrent : (k + 1) * num_concurrent]
+                    for i, name, num_concurrent in program_stacks
+                }
+                values.append(float(metric_fn(iteration_results)))
+
+            mean = float(np.mean(values))
+            half_width = _confidence_half_width(values, confidence)
+            converged = half_width <= max(rel_tol * abs(mean), abs_tol)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return AdaptiveRunResult(
+        results=results,
+        values=values,
+        mean=mean,
+        half_width=half_width,
+        converged=converged,
+    )
@@ -36,7 +36,7 @@ def build_generic_qdevice(name: str, cfg: GenericQDeviceConfig) -> QuantumProces
     phys_instructions.append(
         PhysicalInstruction(
             INSTR_INIT,
-            parallel=False,
+            parallel=cfg.parallel_gates,
             duration=cfg.init_time,
         )
     )
@@ -54,7 +54,7 @@ def build_generic_qdevice(name: str, cfg: GenericQDeviceConfig) -> QuantumProces
         phys_instructions.append(
             PhysicalInstruction(
                 instr,
-                parallel=False,
+                parallel=cfg.parallel_gates,
                 quantum_noise_model=single_qubit_gate_noise,
                 apply_q_noise_after=True,
                 duration=cfg.single_qubit_gate_time,
@@ -65,7 +65,7 @@ def build_generic_qdevice(name: str, cfg: GenericQDeviceConfig) -> QuantumProces
         phys_instructions.append(
             PhysicalInstruction(
                 instr,
-                parallel=False,
+                parallel=cfg.parallel_gates,
                 quantum_noise_model=two_qubit_gate_noise,
                 apply_q_noise_after=True,
                 duration=cfg.two_qubit_gate_time,
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, List
+from typing import Any, List, Optional
 
 import yaml
 from pydantic import BaseModel
@@ -44,6 +44,10 @@ class GenericQDeviceConfig(BaseModel):
     two_qubit_gate_depolar_prob: float = 0.01
     """Probability of error in each two qubit gate operation."""
 
+    parallel_gates: bool = False
+    """Whether initializations and gates on disjoint qubits can be executed at the
+    same time. If False, all operations on the device are executed one by one."""
+
     @classmethod
     def from_file(cls, path: str) -> GenericQDeviceConfig:
         """Load the configuration from a YAML file."""
@@ -157,6 +161,32 @@ class StackConfig(BaseModel):
     """Type of the quantum device."""
     qdevice_cfg: Any
     """Configuration of the quantum device, allowed configuration depends on type."""
+    fuse_gates: bool = False
+    """Whether blocks of consecutive quantum instructions are executed as a single
+    program on the quantum device, which gives the same results with fewer
+    simulator events. See `Processor.fuse_gates`."""
+    optimize_placement: bool = False
+    """Whether qubits are placed on the electron when that avoids moving them
+    there for their measurement. Only used for NV quantum devices. See
+    `NVProcessor.optimize_placement`."""
+    compact_app_memory: bool = False
+    """Whether applications store their registers and arrays in NumPy buffers.
+    See `CompactAppMemory`."""
+    compile_subroutines: bool = False
+    """Whether subroutines are compiled to Python functions instead of being
+    interpreted. See `Processor.compile_subroutines`."""
+    interleave_subroutines: bool = False
+    """Whether subroutines of other applications are executed while a subroutine
+    waits for entanglement. See `Processor.interleave_subroutines`."""
+    max_pairs_in_flight: Optional[int] = 1
+    """Maximal number of pairs of a Create and Keep request that are requested from
+    the link layer at the same time. If None, only limited by the free
+    communication qubits. See `Netstack.max_pairs_in_flight`."""
+    scheduling_policy: str = "fifo"
+    """Order in which the network stack handles outstanding entanglement requests
+    with the same remote node: "fifo" (in the order in which they were issued) or
+    "round_robin" (EPR sockets of all applications in turn). See
+    `Netstack.scheduling_policy`."""
 
     @classmethod
     def from_file(cls, path: str) -> StackConfig:
@@ -243,6 +273,14 @@ class LinkConfig(BaseModel):
     """Type of the link."""
     cfg: Any
     """Configuration of the link, allowed configuration depends on type."""
+    buffer_size: int = 0
+    """Number of entangled pairs that are generated before the applications ask
+    for them, and kept buffered in communication qubits of both stacks. If 0
+    (default), pairs are only generated when requested. See
+    `Netstack.enable_buffer`."""
+    buffer_max_age: Optional[float] = None
+    """Age (in nanoseconds) after which a buffered pair is discarded instead of
+    handed to an application. If None, pairs are never discarded."""
 
     @classmethod
     def from_file(cls, path: str) -> LinkConfig:
@@ -1,9 +1,25 @@
 from __future__ import annotations
 
 import itertools
-from typing import Any, Dict, List
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import netsquid as ns
+import numpy as np
 from netsquid_magic.link_layer import (
     MagicLinkLayerProtocol,
     MagicLinkLayerProtocolWithSignaling,
@@ -26,20 +42,30 @@ from squidasm.run.stack.config import (
     NVQDeviceConfig,
     StackNetworkConfig,
 )
+from squidasm.run.stack.sink import ResultSink
 from squidasm.sim.stack.context import NetSquidContext
 from squidasm.sim.stack.globals import GlobalSimData
+from squidasm.sim.stack.netstack import RoundRobinPolicy
+from squidasm.sim.stack.profiling import Profiler, ProfileReport
 from squidasm.sim.stack.program import Program
 from squidasm.sim.stack.stack import NodeStack, StackNetwork
 
+T = TypeVar("T")
+
+# Entry of a workload: a program that is run once, or a program together with the
+# number of times it is run.
+WorkloadEntry = Union[Program, Tuple[Program, int]]
+
+# Programs of a node in a run: a single program, or a sequence of programs that
+# run concurrently (see `Host.enqueue_program`).
+NodePrograms = Union[Program, Sequence[Program]]
+
 
 def fidelity_to_prob_max_mixed(fid: float) -> float:
     return (1 - fid) * 4.0 / 3.0
 
 
 def _setup_network(config: StackNetworkConfig) -> StackNetwork:
-    assert len(config.stacks) <= 2
-    assert len(config.links) <= 1
-
     stacks: Dict[str, NodeStack] = {}
     link_prots: List[MagicLinkLayerProtocol] = []
 
@@ -50,18 +76,26 @@ def _setup_network(config: StackNetworkConfig) -> StackNetwork:
                 qdevice_cfg = NVQDeviceConfig(**cfg.qdevice_cfg)
             qdevice = build_nv_qdevice(f"qdevice_{cfg.name}", cfg=qdevice_cfg)
             stack = NodeStack(cfg.name, qdevice_type="nv", qdevice=qdevice)
+            stack.qnos.processor.optimize_placement = cfg.optimize_placement
         elif cfg.qdevice_typ == "generic":
             qdevice_cfg = cfg.qdevice_cfg
             if not isinstance(qdevice_cfg, GenericQDeviceConfig):
                 qdevice_cfg = GenericQDeviceConfig(**cfg.qdevice_cfg)
             qdevice = build_generic_qdevice(f"qdevice_{cfg.name}", cfg=qdevice_cfg)
             stack = NodeStack(cfg.name, qdevice_type="generic", qdevice=qdevice)
+            stack.qnos.processor.parallel_gates = qdevice_cfg.parallel_gates
+        stack.qnos.processor.fuse_gates = cfg.fuse_gates
+        stack.qnos.processor.compile_subroutines = cfg.compile_subroutines
+        stack.qnos.processor.interleave_subroutines = cfg.interleave_subroutines
+        stack.qnos.handler.compact_app_memory = cfg.compact_app_memory
+        stack.qnos.netstack.max_pairs_in_flight = cfg.max_pairs_in_flight
+        if cfg.scheduling_policy == "round_robin":
+            stack.qnos.netstack.scheduling_policy = RoundRobinPolicy()
+        elif cfg.scheduling_policy != "fifo":
+            raise ValueError(f"Unknown scheduling policy {cfg.scheduling_policy}")
         NetSquidContext.add_node(stack.node.ID, cfg.name)
         stacks[cfg.name] = stack
 
-    for (_, s1), (_, s2) in itertools.combinations(stacks.items(), 2):
-        s1.connect_to(s2)
-
     for link in config.links:
         stack1 = stacks[link.stack1]
         stack2 = stacks[link.stack2]
@@ -110,8 +144,16 @@ def _setup_network(config: StackNetworkConfig) -> StackNetwork:
             magic_distributor=link_dist,
             translation_unit=SingleClickTranslationUnit(),
         )
-        stack1.assign_ll_protocol(link_prot)
-        stack2.assign_ll_protocol(link_prot)
+        stack1.assign_ll_protocol(link_prot, stack2.node.ID)
+        stack2.assign_ll_protocol(link_prot, stack1.node.ID)
+        if link.buffer_size > 0:
+            for stack, peer in [(stack1, stack2), (stack2, stack1)]:
+                stack.qnos.netstack.enable_buffer(
+                    peer.node.ID, link.buffer_size, link.buffer_max_age
+                )
+
+        # Only nodes sharing a link get channels between their QNodeOS instances.
+        stack1.connect_to(stack2, host=False)
 
         link_prots.append(link_prot)
 
@@ -121,14 +163,9 @@ def _setup_network(config: StackNetworkConfig) -> StackNetwork:
 def _run(network: StackNetwork) -> List[List[Dict[str, Any]]]:
     """Run the protocols of a network and programs running in that network.
 
-    NOTE: For now, only two nodes and a single link are supported.
-
     :param network: `StackNetwork` representing the nodes and links
     :return: final results of the programs
     """
-    assert len(network.stacks) <= 2
-    assert len(network.links) <= 1
-
     # Start the link protocols.
     for link in network.links:
         link.start()
@@ -143,25 +180,439 @@ def _run(network: StackNetwork) -> List[List[Dict[str, Any]]]:
     return [stack.host.get_results() for _, stack in network.stacks.items()]
 
 
-def run(
-    config: StackNetworkConfig, programs: Dict[str, Program], num_times: int = 1
+def _register_network(network: StackNetwork) -> None:
+    """Make `network` the network that is currently simulated."""
+    NetSquidContext.set_nodes({})
+    for name, stack in network.stacks.items():
+        NetSquidContext.add_node(stack.node.ID, name)
+
+    GlobalSimData.set_network(network)
+
+
+def _iteration_seed(seed: int, iteration: int) -> int:
+    """Derive the seed of the random stream of a single program iteration.
+
+    The seed of iteration `k` only depends on `seed` and `k`, and is the same as
+    the seed of the `k`-th child of `np.random.SeedSequence(seed).spawn()`.
+    """
+    seq = np.random.SeedSequence(seed, spawn_key=(iteration,))
+    return int(seq.generate_state(1)[0])
+
+
+def _load_programs(
+    network: StackNetwork, programs: Dict[str, NodePrograms], num_times: int
+) -> None:
+    """Queue programs on the Hosts of a network.
+
+    Hosts are connected on demand, only for the classical sockets that the
+    programs use."""
+    for name, node_programs in programs.items():
+        stack = network.stacks[name]
+        concurrent = (
+            [node_programs] if isinstance(node_programs, Program) else node_programs
+        )
+        for program in concurrent:
+            for remote_name in program.meta.csockets:
+                stack.connect_to(network.stacks[remote_name], qnos=False)
+        stack.host.enqueue_program(node_programs, num_times)
+
+
+def _sink_callback(
+    sink: ResultSink, stack_name: str, first_iteration: int = 0
+) -> Callable[[Dict[str, Any]], None]:
+    """Create a result callback for a Host that writes results to `sink`."""
+    iterations = itertools.count(first_iteration)
+
+    def callback(result: Dict[str, Any]) -> None:
+        sink.write(stack_name, next(iterations), result)
+
+    return callback
+
+
+def _set_result_callbacks(
+    network: StackNetwork,
+    sink: Optional[ResultSink],
+    retain_results: bool,
+    first_iteration: int = 0,
+) -> None:
+    for name, stack in network.stacks.items():
+        stack.host.retain_results = retain_results
+        stack.host.result_callback = (
+            None if sink is None else _sink_callback(sink, name, first_iteration)
+        )
+
+
+@contextmanager
+def _opened(sink: Optional[ResultSink], stack_names: List[str]) -> Iterator[None]:
+    """Open `sink` (if any) for the duration of the context."""
+    if sink is None:
+        yield
+        return
+    sink.open(stack_names)
+    try:
+        yield
+    finally:
+        sink.close()
+
+
+def _run_with_sink(
+    network: StackNetwork, sink: Optional[ResultSink], retain_results: bool
 ) -> List[List[Dict[str, Any]]]:
+    """Run a network while streaming the program results to `sink` (if any)."""
+    _set_result_callbacks(network, sink, retain_results)
+    with _opened(sink, list(network.stacks.keys())):
+        return _run(network)
+
+
+def _profiled(func: Callable[[], T]) -> Tuple[T, ProfileReport]:
+    """Call `func` with profiling enabled and return its result together with the
+    profiling report."""
+    Profiler.enable()
+    try:
+        result = func()
+        return result, Profiler.get_report()
+    finally:
+        Profiler.disable()
+
+
+def run(
+    config: StackNetworkConfig,
+    programs: Dict[str, NodePrograms],
+    num_times: int = 1,
+    sink: Optional[ResultSink] = None,
+    retain_results: bool = True,
+    seed: Optional[int] = None,
+    profile: bool = False,
+) -> Union[
+    List[List[Dict[str, Any]]], Tuple[List[List[Dict[str, Any]]], ProfileReport]
+]:
     """Run programs on a network specified by a network configuration.
 
+    :param config: configuration of the network
+    :param programs: dictionary of node names to programs. A sequence of programs
+        is run concurrently on its node, in each iteration (see
+        `Host.enqueue_program`), and has a result per program in the order in
+        which the programs finish.
+    :param num_times: numbers of times to run the programs, defaults to 1
+    :param sink: sink to which the result of each program iteration is written as
+        soon as that iteration has finished, defaults to None
+    :param retain_results: whether to keep the results in memory and return them.
+        If False, the returned lists are empty and results are only written to
+        `sink`. Defaults to True.
+    :param seed: if given, each iteration is run in its own simulation with its own
+        random stream derived from `seed` and the iteration index. Iteration `k`
+        then gives the same result regardless of how many iterations are run and of
+        how they are distributed over processes (see `run_parallel`). If None
+        (default), all iterations are run in a single simulation using the current
+        NetSquid random state.
+    :param profile: whether to profile the protocols of the stacks (see
+        `Profiler`), defaults to False
+    :return: program results, outer list is per stack, inner list is per program
+        iteration. If `profile` is True, a tuple of the program results and a
+        `ProfileReport`.
+    """
+    if profile:
+        return _profiled(
+            lambda: run(config, programs, num_times, sink, retain_results, seed)
+        )
+
+    if seed is not None:
+        return prepare(config).run(programs, num_times, sink, retain_results, seed)
+
+    network = _setup_network(config)
+    _register_network(network)
+
+    _load_programs(network, programs, num_times)
+
+    results = _run_with_sink(network, sink, retain_results)
+    return results
+
+
+def _load_workload(
+    network: StackNetwork,
+    workload: Dict[str, Union[Sequence[WorkloadEntry], Iterator[Program]]],
+) -> None:
+    """Queue the programs of a workload on the Hosts of a network.
+
+    For sequences of entries, Hosts are connected for the classical sockets that
+    the programs use. Since the programs of an iterator are only known once they
+    run, a Host running an iterator is connected to the Hosts of all other nodes."""
+    for name, entries in workload.items():
+        stack = network.stacks[name]
+        if not isinstance(entries, Sequence):
+            for remote_name, remote in network.stacks.items():
+                if remote_name != name:
+                    stack.connect_to(remote, qnos=False)
+            stack.host.enqueue_programs(entries)
+            continue
+
+        for entry in entries:
+            program, num_times = entry if isinstance(entry, tuple) else (entry, 1)
+            for remote_name in program.meta.csockets:
+                stack.connect_to(network.stacks[remote_name], qnos=False)
+            stack.host.enqueue_program(program, num_times)
+
+
+def run_workload(
+    config: StackNetworkConfig,
+    workload: Dict[str, Union[Sequence[WorkloadEntry], Iterator[Program]]],
+    sink: Optional[ResultSink] = None,
+    retain_results: bool = True,
+) -> List[List[Tuple[str, Dict[str, Any]]]]:
+    """Run a mix of (different) programs on a network in a single simulation.
+
+    Each node runs its programs back to back, in order. Unlike calling `run` once
+    per program, the network is only set up and the simulator only started once.
+    Programs on different nodes that communicate with each other must be queued
+    in matching orders.
+
+    :param config: configuration of the network
+    :param workload: dictionary of node names to the programs that node runs.
+        The programs are given either as a sequence of entries, each a program
+        (run once) or a tuple of a program and the number of times it is run, or
+        as an iterator (e.g. a generator) of programs that are each run once.
+    :param sink: sink to which the result of each program run is written as soon
+        as that run has finished, defaults to None
+    :param retain_results: whether to keep the results in memory and return them.
+        If False, the returned lists are empty and results are only written to
+        `sink`. Defaults to True.
+    :return: program results, outer list is per stack, inner list is per program
+        run, as tuples of the program name (see `ProgramMeta.name`) and the result
+    """
+    network = _setup_network(config)
+    _register_network(network)
+
+    _load_workload(network, workload)
+
+    _run_with_sink(network, sink, retain_results)
+    return [
+        list(zip(stack.host.get_result_program_names(), stack.host.get_results()))
+        for stack in network.stacks.values()
+    ]
+
+
+class PreparedNetwork:
+    """A network that is built once and can then run programs many times.
+
+    Building a network (all `NodeStack`s, QDevices and link layer protocols) is
+    done only once, when the network is prepared. Each call to `run` only resets
+    the simulator and the state of the protocols and memories, such that many
+    short runs on the same topology do not pay for the setup each time.
+
+    Typically created using `prepare`.
+    """
+
+    def __init__(self, network: StackNetwork) -> None:
+        self._network = network
+
+    @property
+    def network(self) -> StackNetwork:
+        return self._network
+
+    def reset(self) -> None:
+        """Stop all protocols, reset the NetSquid simulator (including simulation
+        time) and clear all simulation state of the nodes, such that the network
+        can run new programs."""
+        for stack in self._network.stacks.values():
+            stack.stop()
+        for link in self._network.links:
+            link.stop()
+
+        ns.sim_reset()
+
+        for stack in self._network.stacks.values():
+            stack.reset_state()
+
+    def run(
+        self,
+        programs: Dict[str, NodePrograms],
+        num_times: int = 1,
+        sink: Optional[ResultSink] = None,
+        retain_results: bool = True,
+        seed: Optional[int] = None,
+        profile: bool = False,
+    ) -> Union[
+        List[List[Dict[str, Any]]], Tuple[List[List[Dict[str, Any]]], ProfileReport]
+    ]:
+        """Run programs on this network.
+
+        :param programs: dictionary of node names to programs
+        :param num_times: numbers of times to run the programs, defaults to 1
+        :param sink: sink to which the result of each program iteration is written
+            as soon as that iteration has finished, defaults to None
+        :param retain_results: whether to keep the results in memory and return
+            them, defaults to True
+        :param seed: if given, run each iteration with its own random stream
+            derived from `seed`, see `run_iterations`. Defaults to None.
+        :param profile: whether to profile the protocols of the stacks (see
+            `Profiler`), defaults to False
+        :return: program results, outer list is per stack, inner list is per program
+            iteration. If `profile` is True, a tuple of the program results and a
+            `ProfileReport`.
+        """
+        if profile:
+            return _profiled(
+                lambda: self.run(programs, num_times, sink, retain_results, seed)
+            )
+
+        if seed is not None:
+            return self.run_iterations(
+                programs, range(num_times), seed, sink, retain_results
+            )
+
+        self.reset()
+        _register_network(self._network)
+
+        _load_programs(self._network, programs, num_times)
+
+        return _run_with_sink(self._network, sink, retain_results)
+
+    def run_iterations(
+        self,
+        programs: Dict[str, NodePrograms],
+        iterations: Iterable[int],
+        seed: int,
+        sink: Optional[ResultSink] = None,
+        retain_results: bool = True,
+    ) -> List[List[Dict[str, Any]]]:
+        """Run selected iterations of a seeded run on this network.
+
+        Each iteration is run in its own simulation, which starts from a reset
+        network and with the NetSquid random state seeded by a seed that only
+        depends on `seed` and the iteration index. Hence, iteration `k` gives the
+        same result when it is run as part of `run(..., seed=seed)`, as part of a
+        shard of `run_parallel(..., seed=seed)` or on its own, e.g. to replay it
+        with `run_iterations(programs, [k], seed)`.
+
+        :param programs: dictionary of node names to programs
+        :param iterations: indices of the iterations to run
+        :param seed: seed from which the seeds of the iterations are derived
+        :param sink: sink to which the result of each program iteration is written
+            as soon as that iteration has finished, defaults to None
+        :param retain_results: whether to keep the results in memory and return
+            them, defaults to True
+        :return: program results, outer list is per stack, inner list is per program
+            iteration (in the order of `iterations`)
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in self._network.stacks]
+
+        with _opened(sink, list(self._network.stacks.keys())):
+            for iteration in iterations:
+                self.reset()
+                ns.set_random_state(seed=_iteration_seed(seed, iteration))
+                _register_network(self._network)
+
+                _load_programs(self._network, programs, 1)
+
+                _set_result_callbacks(self._network, sink, retain_results, iteration)
+                for stack_results, iteration_results in zip(
+                    results, _run(self._network)
+                ):
+                    stack_results.extend(iteration_results)
+
+        return results
+
+
+def prepare(config: StackNetworkConfig) -> PreparedNetwork:
+    """Build a network specified by a network configuration, such that it can be
+    used for many runs without being rebuilt.
+
+    :param config: configuration of the network
+    :return: the prepared network
+    """
+    return PreparedNetwork(_setup_network(config))
+
+
+def run_iterations(
+    config: StackNetworkConfig,
+    programs: Dict[str, NodePrograms],
+    iterations: Iterable[int],
+    seed: int,
+) -> List[List[Dict[str, Any]]]:
+    """Run selected iterations of a seeded run on a network specified by a
+    network configuration, e.g. a shard of the iterations inside a worker process.
+
+    The network is built from scratch. Since each iteration uses its own random
+    stream, the results do not depend on how the iterations are sharded (see
+    `PreparedNetwork.run_iterations`).
+
+    :param config: configuration of the network
+    :param programs: dictionary of node names to programs
+    :param iterations: indices of the iterations to run
+    :param seed: seed from which the seeds of the iterations are derived
+    :return: program results, outer list is per stack, inner list is per program
+        iteration (in the order of `iterations`)
+    """
+    ns.sim_reset()
+    return prepare(config).run_iterations(programs, iterations, seed)
+
+
+def run_parallel(
+    config: StackNetworkConfig,
+    programs: Dict[str, NodePrograms],
+    num_times: int = 1,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    sink: Optional[ResultSink] = None,
+    retain_results: bool = True,
+) -> List[List[Dict[str, Any]]]:
+    """Run programs on a network specified by a network configuration, spreading
+    the iterations over a pool of worker processes.
+
+    The iterations are split into one contiguous shard per worker. Each worker
+    builds its own network and runs each iteration of its shard in a separate
+    NetSquid simulation with its own random stream derived from `seed` (see
+    `PreparedNetwork.run_iterations`). The results are therefore identical to
+    those of `run(config, programs, num_times, seed=seed)`, independent of the
+    number of workers. Since the programs and configuration are sent to the
+    workers, they must be picklable.
+
     :param config: configuration of the network
     :param programs: dictionary of node names to programs
     :param num_times: numbers of times to run the programs, defaults to 1
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param seed: seed from which the seeds of the iterations are derived. If None,
+        fresh entropy is used.
+    :param sink: sink to which the results are written. Results are written per
+        shard, in order, as soon as the shard and all shards before it have finished.
+        Defaults to None.
+    :param retain_results: whether to keep the results in memory and return them,
+        defaults to True
     :return: program results, outer list is per stack, inner list is per program iteration
     """
-    network = _setup_network(config)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, num_times))
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
 
-    NetSquidContext.set_nodes({})
-    for name, stack in network.stacks.items():
-        NetSquidContext.add_node(stack.node.ID, name)
+    shard_size, remainder = divmod(num_times, workers)
+    shard_sizes = [shard_size + (1 if i < remainder else 0) for i in range(workers)]
+    shard_starts = list(itertools.accumulate([0] + shard_sizes[:-1]))
 
-    GlobalSimData.set_network(network)
-    for name, program in programs.items():
-        network.stacks[name].host.enqueue_program(program, num_times)
+    stack_names = [stack.name for stack in config.stacks]
+    results: List[List[Dict[str, Any]]] = [[] for _ in stack_names]
+    if num_times == 0:
+        return results
+
+    with _opened(sink, stack_names):
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    run_iterations, config, programs, range(start, start + size), seed
+                )
+                for start, size in zip(shard_starts, shard_sizes)
+            ]
+            # Merge the shards in order, such that the iterations keep their order.
+            num_written = [0 for _ in stack_names]
+            for future in futures:
+                shard = future.result()
+                for i, (name, shard_results) in enumerate(zip(stack_names, shard)):
+                    if sink is not None:
+                        for j, result in enumerate(shard_results):
+                            sink.write(name, num_written[i] + j, result)
+                    num_written[i] += len(shard_results)
+                    if retain_results:
+                        results[i].extend(shard_results)
 
-    results = _run(network)
     return results
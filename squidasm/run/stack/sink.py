@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import abc
+import json
+from typing import IO, Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class ResultSink(abc.ABC):
+    """Destination for program results that are streamed out of a simulation.
+
+    A sink receives the result of each program iteration as soon as the
+    iteration has finished, instead of all results being returned at the end
+    of the simulation.
+    """
+
+    def open(self, stack_names: List[str]) -> None:
+        """Called once before the simulation starts.
+
+        :param stack_names: names of the stacks in the network
+        """
+        pass
+
+    @abc.abstractmethod
+    def write(self, stack_name: str, iteration: int, result: Dict[str, Any]) -> None:
+        """Called for each finished program iteration.
+
+        :param stack_name: name of the stack that ran the program
+        :param iteration: index of the iteration on that stack
+        :param result: the result returned by the program
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Called once after the simulation has finished."""
+        pass
+
+
+class CallbackSink(ResultSink):
+    """Sink that calls a function for each finished program iteration."""
+
+    def __init__(self, callback: Callable[[str, int, Dict[str, Any]], None]) -> None:
+        """
+        :param callback: function called with the stack name, the iteration index
+            and the result of each finished program iteration
+        """
+        self._callback = callback
+
+    def write(self, stack_name: str, iteration: int, result: Dict[str, Any]) -> None:
+        self._callback(stack_name, iteration, result)
+
+
+def _to_json(value: Any) -> Any:
+    """Convert values that the `json` module can not serialize by itself."""
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, complex):
+        return [value.real, value.imag]
+    if isinstance(value, list):
+        return [_to_json(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class JsonLinesSink(ResultSink):
+    """Sink that writes each program result as a line of JSON to a file.
+
+    Each line is an object with the keys `stack`, `iteration` and `result`.
+    NumPy arrays are written as (nested) lists and complex numbers as
+    `[real, imag]` pairs. Other values that are not JSON serializable are
+    written as strings.
+    """
+
+    def __init__(self, path: str, mode: str = "w") -> None:
+        """
+        :param path: location of the output file
+        :param mode: mode in which the file is opened, "w" (overwrite, default)
+            or "a" (append)
+        """
+        self._path = path
+        self._mode = mode
+        self._file: Optional[IO[str]] = None
+
+    def open(self, stack_names: List[str]) -> None:
+        self._file = open(self._path, self._mode)
+
+    def write(self, stack_name: str, iteration: int, result: Dict[str, Any]) -> None:
+        assert self._file is not None, "sink has not been opened"
+        line = {"stack": stack_name, "iteration": iteration, "result": result}
+        self._file.write(json.dumps(line, default=_to_json) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Column types, from narrowest to widest.
+_DTYPES = [np.bool_, np.int64, np.float64, object]
+
+
+def _widest(*dtypes: Any) -> Any:
+    return max(dtypes, key=_DTYPES.index)
+
+
+class _Column:
+    """Growable NumPy array with amortized constant-time appends."""
+
+    def __init__(self, dtype: Any, capacity: int = 64) -> None:
+        self._dtype = dtype
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def widen(self, dtype: Any) -> None:
+        """Convert the column such that it can hold values of type `dtype`."""
+        new_dtype = _widest(self._dtype, dtype)
+        if new_dtype is not self._dtype:
+            self._data = self._data.astype(new_dtype)
+            self._dtype = new_dtype
+
+    def append(self, value: Any) -> None:
+        if self._size == len(self._data):
+            self._data = np.resize(self._data, 2 * len(self._data))
+        self._data[self._size] = value
+        self._size += 1
+
+    def append_missing(self) -> None:
+        self.append(None if self._dtype is object else np.nan)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[: self._size]
+
+
+class ColumnarSink(ResultSink):
+    """Sink that accumulates program results per stack in NumPy columns.
+
+    There is one column per result key. Columns of numerical results are stored
+    in bool, int64 or float64 arrays, other values in object arrays. Results that
+    do not contain the key of a column get NaN (numerical columns) or None
+    (object columns) in that column.
+    """
+
+    def __init__(self) -> None:
+        self._columns: Dict[str, Dict[str, _Column]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def open(self, stack_names: List[str]) -> None:
+        for name in stack_names:
+            self._columns.setdefault(name, {})
+            self._counts.setdefault(name, 0)
+
+    @staticmethod
+    def _dtype_for(value: Any) -> Any:
+        if isinstance(value, (bool, np.bool_)):
+            return np.bool_
+        if isinstance(value, (int, np.integer)):
+            return np.int64
+        if isinstance(value, (float, np.floating)):
+            return np.float64
+        return object
+
+    def write(self, stack_name: str, iteration: int, result: Dict[str, Any]) -> None:
+        columns = self._columns.setdefault(stack_name, {})
+        count = self._counts.get(stack_name, 0)
+        result = result if result is not None else {}
+
+        for key, value in result.items():
+            dtype = self._dtype_for(value)
+            if key not in columns:
+                columns[key] = _Column(dtype)
+                # Earlier results did not contain this key.
+                if count > 0:
+                    columns[key].widen(np.float64)
+                    for _ in range(count):
+                        columns[key].append_missing()
+            columns[key].widen(dtype)
+            columns[key].append(value)
+
+        for key, column in columns.items():
+            if key not in result:
+                column.widen(np.float64)
+                column.append_missing()
+
+        self._counts[stack_name] = count + 1
+
+    def columns(self, stack_name: str) -> Dict[str, np.ndarray]:
+        """Get the accumulated results of a stack.
+
+        :param stack_name: name of the stack
+        :return: dictionary of result key to a column with one entry per iteration
+        """
+        return {key: col.values for key, col in self._columns[stack_name].items()}
+
+    def num_results(self, stack_name: str) -> int:
+        """Get the number of accumulated results of a stack."""
+        return self._counts.get(stack_name, 0)
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import itertools
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from squidasm.run.stack.config import StackNetworkConfig
+from squidasm.run.stack.run import run_iterations
+from squidasm.sim.stack.program import Program
+
+_PATH_TOKEN = re.compile(r"([A-Za-z_]\w*)|\[([^\]]+)\]")
+
+
+def _parse_path(path: str) -> List[Tuple[Union[str, int], bool]]:
+    """Split a dotted field path like `links[0].cfg.fidelity` into its parts.
+
+    Each part is returned together with whether it was given between brackets.
+    Attribute names are returned as strings and list indices as integers.
+    Non-numeric indices (e.g. `stacks[Alice]`) are returned as strings and are
+    resolved by matching the `name` of the list elements.
+    """
+    parts: List[Tuple[Union[str, int], bool]] = []
+    position = 0
+    for match in _PATH_TOKEN.finditer(path):
+        separator = path[position : match.start()]
+        if separator not in ("", "."):
+            raise ValueError(f"Invalid field path {path!r}")
+        attr, index = match.groups()
+        if attr is not None:
+            parts.append((attr, False))
+        elif index.lstrip("-").isdigit():
+            parts.append((int(index), True))
+        else:
+            parts.append((index, True))
+        position = match.end()
+    if position != len(path) or len(parts) == 0:
+        raise ValueError(f"Invalid field path {path!r}")
+    return parts
+
+
+def _get_part(obj: Any, part: Union[str, int], bracketed: bool) -> Any:
+    if isinstance(part, int):
+        return obj[part]
+    if bracketed:
+        for element in obj:
+            if getattr(element, "name", None) == part:
+                return element
+        raise KeyError(f"No element with name {part!r}")
+    if isinstance(obj, dict):
+        return obj[part]
+    return getattr(obj, part)
+
+
+def _walk(config: Any, path: str) -> Tuple[Any, Union[str, int], bool]:
+    """Resolve all but the last part of `path`. Return the object holding the last
+    part, the last part and whether the last part was given between brackets."""
+    parts = _parse_path(path)
+    obj = config
+    for part, bracketed in parts[:-1]:
+        obj = _get_part(obj, part, bracketed)
+    last, bracketed = parts[-1]
+    return obj, last, bracketed
+
+
+def get_config_value(config: Any, path: str) -> Any:
+    """Get the value of a field in a (nested) configuration object.
+
+    :param config: configuration object, e.g. a `StackNetworkConfig`
+    :param path: dotted field path, e.g. `links[0].cfg.fidelity` or
+        `stacks[1].qdevice_cfg.T2`
+    :return: value of the field
+    """
+    obj, last, bracketed = _walk(config, path)
+    return _get_part(obj, last, bracketed)
+
+
+def set_config_value(config: Any, path: str, value: Any) -> None:
+    """Set the value of a field in a (nested) configuration object.
+
+    Both configuration models and plain dictionaries (e.g. a link configuration
+    loaded from a YAML file) are supported along the path.
+
+    :param config: configuration object, e.g. a `StackNetworkConfig`
+    :param path: dotted field path, e.g. `links[0].cfg.fidelity` or
+        `stacks[1].qdevice_cfg.T2`
+    :param value: new value of the field
+    """
+    obj, last, bracketed = _walk(config, path)
+    if isinstance(last, int):
+        obj[last] = value
+    elif bracketed:
+        for i, element in enumerate(obj):
+            if getattr(element, "name", None) == last:
+                obj[i] = value
+                return
+        raise KeyError(f"No element with name {last!r}")
+    elif isinstance(obj, dict):
+        # A mistyped key would otherwise be added, and silently ignored.
+        if last not in obj:
+            raise KeyError(f"Configuration has no field {last!r}")
+        obj[last] = value
+    else:
+        if not hasattr(obj, last):
+            raise AttributeError(f"{type(obj).__name__} has no field {last!r}")
+        setattr(obj, last, value)
+
+
+def _sweep_points(
+    parameters: Union[Dict[str, Sequence[Any]], Sequence[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    if isinstance(parameters, dict):
+        paths = list(parameters.keys())
+        return [
+            dict(zip(paths, values))
+            for values in itertools.product(*parameters.values())
+        ]
+    return [dict(point) for point in parameters]
+
+
+@dataclass
+class SweepResult:
+    """Results of a parameter sweep.
+
+    The results of point `i` are `results[i]`, which has the same
+    per-stack, per-iteration shape as the return value of `run`.
+    """
+
+    stack_names: List[str]
+    """Names of the stacks, in the order of the per-stack results."""
+    points: List[Dict[str, Any]]
+    """Parameter values (field path to value) of each point of the sweep."""
+    results: List[List[List[Dict[str, Any]]]]
+    """Program results of each point of the sweep."""
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __iter__(self) -> Iterator[Tuple[Dict[str, Any], List[List[Dict[str, Any]]]]]:
+        return iter(zip(self.points, self.results))
+
+    def get(self, **values: Any) -> List[List[Dict[str, Any]]]:
+        """Get the results of the point with the given parameter values.
+
+        Since field paths are not valid keyword names, the values may also be
+        given as a dictionary: `result.get(**{"links[0].cfg.fidelity": 0.9})`.
+        """
+        for point, results in self:
+            if point == values:
+                return results
+        raise KeyError(f"No sweep point with parameter values {values}")
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Flatten the results into a tidy table, with one row per point, stack and
+        iteration. Each row contains the parameter values, the stack name, the
+        iteration index and the entries of the program result."""
+        rows = []
+        for point, results in self:
+            for stack_name, stack_results in zip(self.stack_names, results):
+                for iteration, result in enumerate(stack_results):
+                    row = dict(point)
+                    row["stack"] = stack_name
+                    row["iteration"] = iteration
+                    if result is not None:
+                        row.update(result)
+                    rows.append(row)
+        return rows
+
+    def to_dataframe(self) -> Any:
+        """Convert the tidy table of `rows` to a pandas DataFrame, indexed by the
+        parameter values, the stack name and the iteration index.
+
+        Requires pandas to be installed."""
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise ImportError("to_dataframe() requires pandas to be installed") from e
+
+        index = list(self.points[0].keys()) if len(self.points) > 0 else []
+        return pd.DataFrame(self.rows()).set_index(index + ["stack", "iteration"])
+
+
+def sweep(
+    config: StackNetworkConfig,
+    programs: Dict[str, Program],
+    parameters: Union[Dict[str, Sequence[Any]], Sequence[Dict[str, Any]]],
+    num_times: int = 1,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> SweepResult:
+    """Run programs on a network for each point of a parameter sweep.
+
+    Each point of the sweep is a copy of the base configuration with some of its
+    fields overridden. Fields are addressed by dotted field paths, such as
+    `links[0].cfg.fidelity` or `stacks[1].qdevice_cfg.T2`. The points are run in
+    parallel on a pool of worker processes. If there are fewer points than
+    workers, the iterations of each point are split into shards (as in
+    `run_parallel`), such that all workers are used.
+
+    :param config: base configuration of the network, which is not modified
+    :param programs: dictionary of node names to programs
+    :param parameters: either a dictionary of field paths to lists of values, in
+        which case the full grid (Cartesian product) of values is swept, or a list
+        of points, each a dictionary of field paths to values
+    :param num_times: numbers of times to run the programs per point, defaults to 1
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param seed: seed from which the seeds of the points are derived. If None,
+        fresh entropy is used. Each point is run as a seeded run (see `run`).
+    :return: the results of all points
+    """
+    points = _sweep_points(parameters)
+
+    point_configs = []
+    for point in points:
+        point_config = config.copy(deep=True)
+        for path, value in point.items():
+            set_config_value(point_config, path, value)
+        point_configs.append(point_config)
+
+    point_seeds = [
+        int(seq.generate_state(1)[0])
+        for seq in np.random.SeedSequence(seed).spawn(len(points))
+    ]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    num_shards = max(1, min(-(-workers // max(1, len(points))), num_times))
+    bounds = np.linspace(0, num_times, num_shards + 1).astype(int).tolist()
+    shards = [range(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    workers = max(1, min(workers, len(points) * len(shards)))
+
+    stack_names = [stack.name for stack in config.stacks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            [
+                executor.submit(
+                    run_iterations, point_config, programs, shard, point_seed
+                )
+                for shard in shards
+            ]
+            for point_config, point_seed in zip(point_configs, point_seeds)
+        ]
+        results = []
+        for point_futures in futures:
+            point_results: List[List[Dict[str, Any]]] = [[] for _ in stack_names]
+            for future in point_futures:
+                for stack_results, shard_results in zip(point_results, future.result()):
+                    stack_results.extend(shard_results)
+            results.append(point_results)
+
+    return SweepResult(
+        stack_names=stack_names,
+        points=points,
+        results=results,
+    )
@@ -0,0 +1,358 @@
+"""Translation of NetQASM subroutines into Python generator functions.
+
+A subroutine is translated into the source code of a generator function, which is
+compiled once and can then be executed any number of times. In the generated
+function:
+ - registers are local variables,
+ - classical instructions (`set`, `lea`, arithmetic, `load`, `store`, `undef` and
+   `array`) are Python statements,
+ - branches are Python control flow, over the basic blocks of the subroutine,
+ - all other instructions (quantum instructions, EPR instructions, qubit
+   allocation, ...) call their handler in the `Processor` and yield from the
+   generator it returns, like the interpreter does.
+
+Before control is handed to a handler, the program counter and the registers
+written by the generated code are stored in the app memory. Afterwards the
+registers are read back, since handlers may write to them (e.g. `meas`).
+"""
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+
+from netqasm.lang.instr import NetQASMInstruction, core
+from netqasm.lang.operand import ArrayEntry, Register
+
+from pydynaa import EventExpression
+
+if TYPE_CHECKING:
+    from squidasm.sim.stack.common import AppMemory
+    from squidasm.sim.stack.processor import DecodedInstr, Processor
+
+# Generator function executing a compiled subroutine. Called with the processor,
+# the app ID, the app memory, the instructions of the subroutine and their
+# decoded handlers (see `Processor._decode`).
+CompiledSubroutine = Callable[
+    ["Processor", int, "AppMemory", List[NetQASMInstruction], List["DecodedInstr"]],
+    Generator[EventExpression, None, None],
+]
+
+_BRANCH_INSTRUCTIONS = (
+    core.JmpInstruction,
+    core.BranchUnaryInstruction,
+    core.BranchBinaryInstruction,
+)
+
+# Instructions that are translated into Python statements.
+_COMPILED_INSTRUCTIONS = _BRANCH_INSTRUCTIONS + (
+    core.SetInstruction,
+    core.LeaInstruction,
+    core.LoadInstruction,
+    core.StoreInstruction,
+    core.UndefInstruction,
+    core.ArrayInstruction,
+    core.ClassicalOpInstruction,
+    core.ClassicalOpModInstruction,
+)
+
+# Python expressions of the conditions of branch instructions.
+_CONDITIONS: Dict[Type[NetQASMInstruction], str] = {
+    core.BeqInstruction: "{0} == {1}",
+    core.BneInstruction: "{0} != {1}",
+    core.BltInstruction: "{0} < {1}",
+    core.BgeInstruction: "{0} >= {1}",
+    core.BezInstruction: "{0} == 0",
+    core.BnzInstruction: "{0} != 0",
+}
+
+# Python operators of arithmetic instructions.
+_OPERATORS: Dict[Type[NetQASMInstruction], str] = {
+    core.AddInstruction: "+",
+    core.AddmInstruction: "+",
+    core.SubInstruction: "-",
+    core.SubmInstruction: "-",
+}
+
+
+def _local(reg: Register) -> str:
+    """Name of the local variable holding a register."""
+    return f"{reg.name.name}{reg.index}"
+
+
+def _read_registers(instr: NetQASMInstruction) -> List[Register]:
+    """Registers read by a compiled instruction."""
+    if isinstance(instr, (core.StoreInstruction, core.LoadInstruction)):
+        regs = [instr.reg] if isinstance(instr, core.StoreInstruction) else []
+        if isinstance(instr.entry.index, Register):
+            regs.append(instr.entry.index)
+        return regs
+    elif isinstance(instr, core.UndefInstruction):
+        index = instr.entry.index
+        return [index] if isinstance(index, Register) else []
+    elif isinstance(instr, core.ArrayInstruction):
+        return [instr.size]
+    elif isinstance(instr, core.ClassicalOpModInstruction):
+        return [instr.regin0, instr.regin1, instr.regmod]
+    elif isinstance(instr, core.ClassicalOpInstruction):
+        return [instr.regin0, instr.regin1]
+    elif isinstance(instr, core.BranchUnaryInstruction):
+        return [instr.reg]
+    elif isinstance(instr, core.BranchBinaryInstruction):
+        return [instr.reg0, instr.reg1]
+    return []
+
+
+def _written_registers(instr: NetQASMInstruction) -> List[Register]:
+    """Registers written by a compiled instruction."""
+    if isinstance(
+        instr, (core.SetInstruction, core.LeaInstruction, core.LoadInstruction)
+    ):
+        return [instr.reg]
+    elif isinstance(
+        instr, (core.ClassicalOpInstruction, core.ClassicalOpModInstruction)
+    ):
+        return [instr.regout]
+    return []
+
+
+class _Translator:
+    """Translation of the instructions of a single subroutine into source code."""
+
+    def __init__(
+        self,
+        instructions: List[NetQASMInstruction],
+        fusible: Tuple[Type[NetQASMInstruction], ...],
+        count: bool,
+    ) -> None:
+        self._instrs = instructions
+        self._fusible = fusible
+        self._count = count
+        self._lines: List[str] = []
+        self._indent = 1
+        self._has_yield = False
+
+        # Registers that are kept in local variables, and those that are written.
+        self.registers: Set[Register] = set()
+        self._written: Set[Register] = set()
+        for instr in instructions:
+            if isinstance(instr, _COMPILED_INSTRUCTIONS):
+                self.registers.update(_read_registers(instr))
+                self._written.update(_written_registers(instr))
+        self.registers.update(self._written)
+        # Registers whose local variable may differ from the app memory.
+        self._dirty: Set[Register] = set()
+
+    def _emit(self, line: str) -> None:
+        self._lines.append("    " * self._indent + line)
+
+    def _emit_load_registers(self) -> None:
+        for reg in sorted(self.registers, key=_local):
+            self._emit(f"{_local(reg)} = get_reg(REGISTERS[{_local(reg)!r}])")
+
+    def _emit_store_registers(self) -> None:
+        for reg in sorted(self._dirty, key=_local):
+            self._emit(f"if {_local(reg)} is not None:")
+            self._emit(f"    set_reg(REGISTERS[{_local(reg)!r}], {_local(reg)})")
+        self._dirty = set()
+
+    def _block_starts(self) -> List[int]:
+        """Indices of the first instructions of the basic blocks."""
+        starts = {0}
+        for i, instr in enumerate(self._instrs):
+            if isinstance(instr, _BRANCH_INSTRUCTIONS):
+                starts.add(i + 1)
+                starts.add(instr.line.value)
+        return sorted(s for s in starts if s < len(self._instrs))
+
+    def translate(self) -> str:
+        """Translate the subroutine into the source code of a generator function
+        called `subroutine`."""
+        self._emit("get_reg = app_mem.get_reg_value")
+        self._emit("set_reg = app_mem.set_reg_value")
+        self._emit_load_registers()
+
+        if any(isinstance(instr, _BRANCH_INSTRUCTIONS) for instr in self._instrs):
+            # Basic blocks are selected by a label, which is set by branches.
+            starts = self._block_starts()
+            self._emit("label = 0")
+            self._emit("while True:")
+            self._indent += 1
+            for n, start in enumerate(starts):
+                end = starts[n + 1] if n + 1 < len(starts) else len(self._instrs)
+                self._emit(f"{'if' if n == 0 else 'elif'} label == {start}:")
+                self._indent += 1
+                # A block can be entered from several places.
+                self._dirty = set(self._written)
+                self._translate_block(start, end)
+                if not isinstance(self._instrs[end - 1], _BRANCH_INSTRUCTIONS):
+                    self._emit(f"label = {end}")
+                self._indent -= 1
+            self._emit("else:")
+            self._emit("    break")
+            self._indent -= 1
+            self._emit("app_mem.set_prog_counter(label)")
+            self._dirty = set(self._written)
+        else:
+            self._translate_block(0, len(self._instrs))
+            self._emit(f"app_mem.set_prog_counter({len(self._instrs)})")
+        self._emit_store_registers()
+
+        if not self._has_yield:
+            # Make the function a generator, also if no instruction yields.
+            self._emit("return")
+            self._emit("yield")
+
+        header = "def subroutine(proc, app_id, app_mem, instrs, decoded):"
+        return "\n".join([header] + self._lines) + "\n"
+
+    def _translate_block(self, start: int, end: int) -> None:
+        pc = start
+        while pc < end:
+            instr = self._instrs[pc]
+            if isinstance(instr, _COMPILED_INSTRUCTIONS):
+                if self._count:
+                    self._emit(f"count({type(instr).__name__!r})")
+                self._translate_instr(pc, instr)
+                self._dirty.update(_written_registers(instr))
+                pc += 1
+                continue
+
+            # Hand control to the processor.
+            self._has_yield = True
+            self._emit(f"app_mem.set_prog_counter({pc})")
+            self._emit_store_registers()
+
+            block_end = pc
+            while block_end < end and isinstance(
+                self._instrs[block_end], self._fusible
+            ):
+                block_end += 1
+            if block_end > pc + 1:
+                # Gates do not write registers, so they need not be read back.
+                self._emit(
+                    f"yield from proc._execute_fused(app_id, instrs[{pc}:{block_end}])"
+                )
+                pc = block_end
+                continue
+
+            self._emit(f"generator = decoded[{pc}][0](app_id, instrs[{pc}])")
+            self._emit("if generator:")
+            self._emit("    yield from generator")
+            self._emit_load_registers()
+            pc += 1
+
+    def _index(self, entry: ArrayEntry) -> str:
+        if isinstance(entry.index, Register):
+            return _local(entry.index)
+        return str(entry.index)
+
+    def _translate_instr(self, pc: int, instr: NetQASMInstruction) -> None:
+        if isinstance(instr, core.SetInstruction):
+            self._emit(f"{_local(instr.reg)} = {instr.imm.value}")
+        elif isinstance(instr, core.LeaInstruction):
+            self._emit(f"{_local(instr.reg)} = {instr.address.address}")
+        elif isinstance(instr, core.ClassicalOpModInstruction):
+            mod = _local(instr.regmod)
+            self._emit(f"if {mod} is not None and {mod} < 1:")
+            self._emit(
+                "    raise RuntimeError("
+                f'f"Modulus needs to be greater or equal to 1, not {{{mod}}}")'
+            )
+            self._emit(
+                f"{_local(instr.regout)} = ({_local(instr.regin0)} "
+                f"{_OPERATORS[type(instr)]} {_local(instr.regin1)}) % {mod}"
+            )
+        elif isinstance(instr, core.ClassicalOpInstruction):
+            self._emit(
+                f"{_local(instr.regout)} = {_local(instr.regin0)} "
+                f"{_OPERATORS[type(instr)]} {_local(instr.regin1)}"
+            )
+        elif isinstance(instr, core.StoreInstruction):
+            value = _local(instr.reg)
+            self._emit(f"if {value} is None:")
+            self._emit(
+                f'    raise RuntimeError("value in register {instr.reg} is not defined")'
+            )
+            self._emit(
+                f"app_mem.set_array_value({instr.entry.address.address}, "
+                f"{self._index(instr.entry)}, {value})"
+            )
+        elif isinstance(instr, core.LoadInstruction):
+            value = _local(instr.reg)
+            self._emit(
+                f"{value} = app_mem.get_array_value({instr.entry.address.address}, "
+                f"{self._index(instr.entry)})"
+            )
+            self._emit(f"if {value} is None:")
+            self._emit(
+                f'    raise RuntimeError("array value at {instr.entry} is not defined")'
+            )
+        elif isinstance(instr, core.UndefInstruction):
+            self._emit(
+                f"app_mem.set_array_value({instr.entry.address.address}, "
+                f"{self._index(instr.entry)}, None)"
+            )
+        elif isinstance(instr, core.ArrayInstruction):
+            self._emit(
+                f"app_mem.init_new_array({instr.address.address}, "
+                f"{_local(instr.size)})"
+            )
+        elif isinstance(instr, core.JmpInstruction):
+            self._emit(f"label = {instr.line.value}")
+        else:
+            operands = [_local(reg) for reg in _read_registers(instr)]
+            condition = _CONDITIONS.get(type(instr))
+            if condition is None:
+                condition = f"instrs[{pc}].check_condition({', '.join(operands)})"
+            else:
+                condition = condition.format(*operands)
+            self._emit(f"label = {instr.line.value} if {condition} else {pc + 1}")
+
+
+def translate_subroutine(
+    instructions: List[NetQASMInstruction],
+    fusible: Tuple[Type[NetQASMInstruction], ...] = (),
+    count: bool = False,
+) -> Tuple[str, Dict[str, Register]]:
+    """Translate the instructions of a subroutine into the source code of a Python
+    generator function.
+
+    :param instructions: the instructions of the subroutine
+    :param fusible: types of the instructions of which consecutive runs are
+        executed together with `Processor._execute_fused`. If empty, instructions
+        are not fused.
+    :param count: whether the code calls a function `count` with the name of the
+        type of each classical instruction it executes
+    :return: the source code, and the registers it refers to by name
+    """
+    translator = _Translator(instructions, fusible, count)
+    source = translator.translate()
+    return source, {_local(reg): reg for reg in translator.registers}
+
+
+def compile_subroutine(
+    instructions: List[NetQASMInstruction],
+    fusible: Tuple[Type[NetQASMInstruction], ...] = (),
+    count: Optional[Callable[[str], None]] = None,
+) -> CompiledSubroutine:
+    """Translate the instructions of a subroutine into a Python generator function
+    and compile it. See `translate_subroutine`.
+
+    :param count: if given, called with the name of the type of each classical
+        instruction that the compiled subroutine executes. Other instructions are
+        executed by the processor, which counts them itself.
+    :return: the compiled subroutine
+    """
+    source, registers = translate_subroutine(instructions, fusible, count is not None)
+    namespace: Dict[str, object] = {"REGISTERS": registers, "count": count}
+    exec(compile(source, "<netqasm subroutine>", "exec"), namespace)
+    return namespace["subroutine"]  # type: ignore
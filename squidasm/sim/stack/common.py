@@ -1,15 +1,17 @@
 import logging
 from dataclasses import dataclass
-from typing import Dict, Generator, List, Optional, Set, Tuple, Union
+from typing import Any, Dict, Generator, List, Optional, Set, Tuple, Union
 
 import netsquid as ns
+import numpy as np
 from netqasm.lang import operand
-from netqasm.lang.encoding import RegisterName
+from netqasm.lang.encoding import REG_INDEX_BITS, RegisterName
 from netqasm.sdk.shared_memory import Arrays, RegisterGroup, setup_registers
 from netsquid.components.component import Component, Port
 from netsquid.protocols import Protocol
 
 from pydynaa import EventExpression
+from squidasm.sim.stack.profiling import Profiler
 
 
 class SimTimeFilter(logging.Filter):
@@ -94,6 +96,14 @@ class PortListener(Protocol):
     def buffer(self) -> List[bytes]:
         return self._buffer
 
+    def clear_buffer(self) -> None:
+        self._buffer.clear()
+
+    def _deliver(self, items: List[Any]) -> None:
+        """Add the messages of an input of the port to the buffer. All messages
+        received by the listener pass through here (see `Profiler`)."""
+        self._buffer += items
+
     def run(self) -> Generator[EventExpression, None, None]:
         while True:
             # Wait for an event saying that there is new input.
@@ -105,7 +115,7 @@ class PortListener(Protocol):
                 input = self._port.rx_input()
                 if input is None:
                     break
-                self._buffer += input.items
+                self._deliver(input.items)
                 counter += 1
             # If there are n inputs, there have been n events, but we yielded only
             # on one of them so far. "Flush" these n-1 additional events:
@@ -152,7 +162,39 @@ class ComponentProtocol(Protocol):
             yield self.await_signal(sender=listener, signal_label=wake_up_signal)
         return listener.buffer.pop(0)
 
+    def _receive_any_msg(
+        self, wake_up_signals: Dict[str, str]
+    ) -> Generator[EventExpression, None, Tuple[str, Any]]:
+        """Wait for a message on any of several listeners.
+
+        :param wake_up_signals: wake-up signal of each listener, by listener name.
+            If several listeners have a message, the first one in this dictionary
+            is taken.
+        :return: the name of the listener and the message
+        """
+        while True:
+            for name in wake_up_signals:
+                buffer = self._listeners[name].buffer
+                if len(buffer) > 0:
+                    return name, buffer.pop(0)
+            expr = None
+            for name, signal in wake_up_signals.items():
+                await_signal = self.await_signal(
+                    sender=self._listeners[name], signal_label=signal
+                )
+                expr = await_signal if expr is None else expr | await_signal
+            yield expr
+
+    def reset_state(self) -> None:
+        """Clear the simulation state of this protocol, such that it can be started
+        again for a new simulation run. Should only be called when stopped."""
+        for listener in self._listeners.values():
+            listener.clear_buffer()
+
     def start(self) -> None:
+        Profiler.instrument(self, self.name)
+        for name, listener in self._listeners.items():
+            Profiler.instrument_listener(listener, self.name, name)
         super().start()
         for listener in self._listeners.values():
             listener.start()
@@ -166,13 +208,20 @@ class ComponentProtocol(Protocol):
 class AppMemory:
     def __init__(self, app_id: int, max_qubits: int) -> None:
         self._app_id: int = app_id
-        self._registers: Dict[RegisterName, RegisterGroup] = setup_registers()
-        self._arrays: Arrays = Arrays()
+        self._init_classical_memory()
         self._virt_qubits: Dict[int, Optional[int]] = {
             i: None for i in range(max_qubits)
         }
         self._prog_counter: int = 0
 
+    def _init_classical_memory(self) -> None:
+        self._registers: Dict[RegisterName, RegisterGroup] = setup_registers()
+        self._arrays: Arrays = Arrays()
+
+    @property
+    def app_id(self) -> int:
+        return self._app_id
+
     @property
     def prog_counter(self) -> int:
         return self._prog_counter
@@ -324,6 +373,161 @@ class AppMemory:
         return address, index
 
 
+class CompactAppMemory(AppMemory):
+    """`AppMemory` that stores registers and arrays in NumPy int64 buffers.
+
+    The registers of all groups share a single buffer and each array is a buffer
+    of fixed length, such that reading and writing values does not go through
+    netqasm's `RegisterGroup` and `Arrays` objects. Values that have not been
+    set are stored as `UNDEFINED` and are returned as None.
+
+    Next to the methods of `AppMemory` (which are still used by the processor,
+    the netstack and netqasm Futures), values can be accessed by integer index
+    with `get_reg`, `set_reg`, `get_array_value` and `set_array_value`, and in
+    bulk with `read_array` and `write_array`.
+    """
+
+    UNDEFINED = np.iinfo(np.int64).min
+    """Value stored in the buffers for undefined values."""
+
+    def _init_classical_memory(self) -> None:
+        # Replaces the register groups and `Arrays` of `AppMemory`.
+        self._reg_buffer: np.ndarray = np.full(
+            (len(RegisterName), 2**REG_INDEX_BITS), self.UNDEFINED, dtype=np.int64
+        )
+        self._array_buffers: Dict[int, np.ndarray] = {}
+
+    def _to_value(self, value: np.int64) -> Optional[int]:
+        return None if value == self.UNDEFINED else int(value)
+
+    def _to_values(self, values: np.ndarray) -> List[Optional[int]]:
+        undefined = self.UNDEFINED
+        return [None if v == undefined else v for v in values.tolist()]
+
+    def _to_buffer_value(self, value: Optional[int]) -> int:
+        return self.UNDEFINED if value is None else value
+
+    def get_reg(self, name: RegisterName, index: int) -> Optional[int]:
+        """Get the value of register `index` of group `name`."""
+        return self._to_value(self._reg_buffer[name.value, index])
+
+    def set_reg(self, name: RegisterName, index: int, value: Optional[int]) -> None:
+        """Set the value of register `index` of group `name`."""
+        self._reg_buffer[name.value, index] = self._to_buffer_value(value)
+
+    def set_reg_value(self, register: Union[str, operand.Register], value: int) -> None:
+        if isinstance(register, str):
+            name, index = RegisterMeta.parse(register)
+        else:
+            name, index = register.name, register.index
+        self._reg_buffer[name.value, index] = self._to_buffer_value(value)
+
+    def get_reg_value(self, register: Union[str, operand.Register]) -> int:
+        if isinstance(register, str):
+            name, index = RegisterMeta.parse(register)
+        else:
+            name, index = register.name, register.index
+        return self._to_value(self._reg_buffer[name.value, index])
+
+    def init_new_array(self, address: int, length: int) -> None:
+        self._array_buffers[address] = np.full(length, self.UNDEFINED, dtype=np.int64)
+
+    def _get_array_buffer(self, address: int) -> np.ndarray:
+        try:
+            return self._array_buffers[address]
+        except KeyError:
+            raise IndexError(f"No array with address {address}")
+
+    def get_array(self, address: int) -> List[Optional[int]]:
+        return self._to_values(self._get_array_buffer(address))
+
+    def read_array(
+        self, address: int, start: int = 0, stop: Optional[int] = None
+    ) -> np.ndarray:
+        """Get a copy of (a slice of) the buffer of an array. Undefined values
+        are `UNDEFINED`.
+
+        :param address: address of the array
+        :param start: index of the first value, defaults to 0
+        :param stop: index after the last value, defaults to the array length
+        :return: the values
+        """
+        return self._get_array_buffer(address)[start:stop].copy()
+
+    def write_array(self, address: int, start: int, values: np.ndarray) -> None:
+        """Write values into an array, starting at index `start`. Undefined values
+        must be given as `UNDEFINED`.
+
+        :param address: address of the array
+        :param start: index at which the first value is written
+        :param values: the values
+        """
+        buffer = self._get_array_buffer(address)
+        if start < 0 or start + len(values) > len(buffer):
+            raise IndexError(
+                f"values of length {len(values)} do not fit at index {start} "
+                f"of array with address {address}"
+            )
+        buffer[start : start + len(values)] = values
+
+    def _get_index(self, index: Union[int, operand.Register]) -> int:
+        if isinstance(index, int):
+            return index
+        value = self.get_reg_value(register=index)
+        if value is None:
+            raise RuntimeError(
+                f"Trying to use register {index} to index an array but its value is None"
+            )
+        return value
+
+    def get_array_entry(self, array_entry: operand.ArrayEntry) -> Optional[int]:
+        return self.get_array_value(
+            array_entry.address.address, self._get_index(array_entry.index)
+        )
+
+    def get_array_value(self, addr: int, offset: int) -> Optional[int]:
+        buffer = self._get_array_buffer(addr)
+        try:
+            return self._to_value(buffer[offset])
+        except IndexError:
+            raise IndexError(
+                f"index {offset} is out of range for array with address {addr}"
+            )
+
+    def get_array_values(
+        self, addr: int, start_offset: int, end_offset
+    ) -> List[Optional[int]]:
+        return self._to_values(self._get_array_buffer(addr)[start_offset:end_offset])
+
+    def set_array_entry(
+        self, array_entry: operand.ArrayEntry, value: Optional[int]
+    ) -> None:
+        self.set_array_value(
+            array_entry.address.address, self._get_index(array_entry.index), value
+        )
+
+    def set_array_value(self, addr: int, offset: int, value: Optional[int]) -> None:
+        buffer = self._get_array_buffer(addr)
+        try:
+            buffer[offset] = self._to_buffer_value(value)
+        except IndexError:
+            raise IndexError(
+                f"index {offset} is out of range for array with address {addr}"
+            )
+
+    def get_array_slice(
+        self, array_slice: operand.ArraySlice
+    ) -> Optional[List[Optional[int]]]:
+        address = array_slice.address.address
+        if address not in self._array_buffers:
+            return None
+        return self.get_array_values(
+            address,
+            self._get_index(array_slice.start),
+            self._get_index(array_slice.stop),
+        )
+
+
 @dataclass
 class NetstackCreateRequest:
     app_id: int
@@ -343,6 +547,15 @@ class NetstackReceiveRequest:
     result_array_addr: int
 
 
+@dataclass
+class SubroutineDone:
+    """Message from the processor to the handler that a subroutine of an
+    application has finished, when subroutines are interleaved (see
+    `Processor.interleave_subroutines`)."""
+
+    app_id: int
+
+
 @dataclass
 class NetstackBreakpointCreateRequest:
     app_id: int
@@ -357,6 +570,20 @@ class AllocError(Exception):
     pass
 
 
+def get_only_peer(peers: List[str], owner: str) -> str:
+    """Get the name of the only peer of a component. Used by the port properties
+    that predate networks with more than two nodes.
+
+    :param peers: names of the peers of the component
+    :param owner: name of the component, for the error message
+    """
+    if len(peers) != 1:
+        raise ValueError(
+            f"{owner} has {len(peers)} peers, so the peer must be specified"
+        )
+    return peers[0]
+
+
 class PhysicalQuantumMemory:
     def __init__(self, qubit_count: int) -> None:
         self._qubit_count = qubit_count
@@ -371,6 +598,16 @@ class PhysicalQuantumMemory:
     def comm_qubit_count(self) -> int:
         return len(self._comm_qubit_ids)
 
+    @property
+    def comm_qubit_ids(self) -> List[int]:
+        """IDs of the communication qubits, in increasing order."""
+        return sorted(self._comm_qubit_ids)
+
+    @property
+    def free_comm_qubit_count(self) -> int:
+        """Number of communication qubits that are not allocated."""
+        return len(self._comm_qubit_ids - self._allocated_ids)
+
     def allocate(self) -> int:
         """Allocate a qubit (communcation or memory)."""
         for i in range(self._qubit_count):
@@ -395,6 +632,12 @@ class PhysicalQuantumMemory:
                 return i
         raise AllocError("No more mem qubits available")
 
+    def allocate_id(self, id: int) -> None:
+        """Allocate a specific qubit."""
+        if id in self._allocated_ids:
+            raise AllocError(f"Qubit {id} is already allocated")
+        self._allocated_ids.add(id)
+
     def free(self, id: int) -> None:
         self._allocated_ids.remove(id)
 
@@ -402,7 +645,7 @@ class PhysicalQuantumMemory:
         return id in self._allocated_ids
 
     def clear(self) -> None:
-        self._allocated_ids = {}
+        self._allocated_ids = set()
 
 
 class NVPhysicalQuantumMemory(PhysicalQuantumMemory):
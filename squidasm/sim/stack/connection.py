@@ -104,7 +104,7 @@ class QnosConnection(BaseNetQASMConnection):
             callback=callback,
         )
 
-        result = yield from self._host.receive_qnos_msg()
+        result = yield from self._host.receive_qnos_msg(self._app_id)
         self._shared_memory = result
 
     def flush(
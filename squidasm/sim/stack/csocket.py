@@ -25,14 +25,15 @@ class ClassicalSocket(Socket):
             app_name=app_name, remote_app_name=remote_app_name, socket_id=socket_id
         )
         self._host = host
+        self._remote_app_name = remote_app_name
 
     def send(self, msg: str) -> None:
         """Sends a string message to the remote node."""
-        self._host.send_peer_msg(msg)
+        self._host.send_peer_msg(msg, self._remote_app_name)
 
     def recv(self) -> Generator[EventExpression, None, str]:
         """Receive a string message to the remote node."""
-        return (yield from self._host.receive_peer_msg())
+        return (yield from self._host.receive_peer_msg(self._remote_app_name))
 
     def send_int(self, value: int) -> None:
         """Send an integer value to the remote node."""
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Set
 
 from netqasm.backend.messages import (
     InitNewAppMessage,
@@ -19,9 +19,11 @@ from netsquid.nodes import Node
 from pydynaa import EventExpression
 from squidasm.sim.stack.common import (
     AppMemory,
+    CompactAppMemory,
     ComponentProtocol,
     PhysicalQuantumMemory,
     PortListener,
+    SubroutineDone,
 )
 from squidasm.sim.stack.netstack import Netstack, NetstackComponent
 from squidasm.sim.stack.signals import SIGNAL_HOST_HAND_MSG, SIGNAL_PROC_HAND_MSG
@@ -97,6 +99,10 @@ class RunningApp:
     def add_subroutine(self, subroutine: Subroutine) -> None:
         self._pending_subroutines.append(subroutine)
 
+    @property
+    def has_pending_subroutines(self) -> bool:
+        return len(self._pending_subroutines) > 0
+
     def next_subroutine(self) -> Optional[Subroutine]:
         if len(self._pending_subroutines) > 0:
             return self._pending_subroutines.pop()
@@ -143,6 +149,9 @@ class Handler(ComponentProtocol):
         # application finishes.
         self._should_clear_memory: bool = True
 
+        # Whether applications get a `CompactAppMemory` instead of an `AppMemory`.
+        self._compact_app_memory: bool = False
+
         # Set the expected flavour such that Host messages are deserialized correctly.
         if qdevice_type == "nv":
             self._flavour: Optional[flavour.Flavour] = flavour.NVFlavour()
@@ -167,6 +176,16 @@ class Handler(ComponentProtocol):
     def should_clear_memory(self, value: bool) -> None:
         self._should_clear_memory = value
 
+    @property
+    def compact_app_memory(self) -> bool:
+        """Whether new applications get a `CompactAppMemory`, which stores
+        registers and arrays in NumPy buffers, instead of an `AppMemory`."""
+        return self._compact_app_memory
+
+    @compact_app_memory.setter
+    def compact_app_memory(self, value: bool) -> None:
+        self._compact_app_memory = value
+
     @property
     def flavour(self) -> Optional[flavour.Flavour]:
         return self._flavour
@@ -196,21 +215,30 @@ class Handler(ComponentProtocol):
         return self.qnos.netstack
 
     def _next_app(self) -> Optional[RunningApp]:
+        """Get the first application that has pending subroutines, if any."""
         for app in self._applications.values():
-            return app
+            if app.has_pending_subroutines:
+                return app
         return None
 
     def init_new_app(self, max_qubits: int) -> int:
         app_id = self._app_counter
         self._app_counter += 1
-        self.app_memories[app_id] = AppMemory(app_id, self.physical_memory.qubit_count)
+        memory_class = CompactAppMemory if self._compact_app_memory else AppMemory
+        self.app_memories[app_id] = memory_class(
+            app_id, self.physical_memory.qubit_count
+        )
         self._applications[app_id] = RunningApp(app_id)
         self._logger.debug(f"registered app with ID {app_id}")
         return app_id
 
-    def open_epr_socket(self, app_id: int, socket_id: int, remote_id: int) -> None:
-        self._logger.debug(f"Opening EPR socket ({socket_id}, {remote_id})")
-        self.netstack.open_epr_socket(app_id, socket_id, remote_id)
+    def open_epr_socket(
+        self, app_id: int, socket_id: int, remote_id: int, remote_socket_id: int = 0
+    ) -> None:
+        self._logger.debug(
+            f"Opening EPR socket ({socket_id}, {remote_id}, {remote_socket_id})"
+        )
+        self.netstack.open_epr_socket(app_id, socket_id, remote_id, remote_socket_id)
 
     def add_subroutine(self, app_id: int, subroutine: Subroutine) -> None:
         self._applications[app_id].add_subroutine(subroutine)
@@ -235,6 +263,11 @@ class Handler(ComponentProtocol):
         else:
             self._logger.info(f"NOT clearing qubits for application with ID {app_id}")
 
+    def reset_state(self) -> None:
+        super().reset_state()
+        self._app_counter = 0
+        self._applications = {}
+
     def assign_processor(
         self, app_id: int, subroutine: Subroutine
     ) -> Generator[EventExpression, None, AppMemory]:
@@ -256,7 +289,12 @@ class Handler(ComponentProtocol):
             app_id = self.init_new_app(msg.max_qubits)
             self._send_host_msg(app_id)
         elif isinstance(msg, OpenEPRSocketMessage):
-            self.open_epr_socket(msg.app_id, msg.epr_socket_id, msg.remote_node_id)
+            self.open_epr_socket(
+                msg.app_id,
+                msg.epr_socket_id,
+                msg.remote_node_id,
+                msg.remote_epr_socket_id,
+            )
         elif isinstance(msg, SubroutineMessage):
             subroutine = self._deserialize_subroutine(msg)
             self.add_subroutine(subroutine.app_id, subroutine)
@@ -265,6 +303,9 @@ class Handler(ComponentProtocol):
 
     def run(self) -> Generator[EventExpression, None, None]:
         """Run this protocol. Automatically called by NetSquid during simulation."""
+        if self.qnos.processor.interleave_subroutines:
+            yield from self._run_interleaved()
+            return
 
         # Loop forever acting on messages from the Host.
         while True:
@@ -277,13 +318,48 @@ class Handler(ComponentProtocol):
             # add a pending subroutine for an application.
             self.msg_from_host(msg)
 
-            # Get the next application that needs work.
+            # Flush all pending subroutines, one application at a time. Other
+            # applications may run concurrently on the Host (see
+            # `Host.enqueue_program`) and have subroutines pending as well.
             app = self._next_app()
-            if app is not None:
-                # Flush all pending subroutines for this app.
+            while app is not None:
                 while True:
                     subrt = app.next_subroutine()
                     if subrt is None:
                         break
                     app_mem = yield from self.assign_processor(app.id, subrt)
                     self._send_host_msg(app_mem)
+                app = self._next_app()
+
+    def _run_interleaved(self) -> Generator[EventExpression, None, None]:
+        """Run this protocol when the processor interleaves subroutines (see
+        `Processor.interleave_subroutines`).
+
+        Messages from the Host are handled while subroutines are executed, and
+        the next subroutine of each application is sent to the processor as soon
+        as the previous subroutine of that application has finished, such that
+        the processor can execute it while other subroutines are suspended."""
+        wake_up_signals = {
+            "processor": SIGNAL_PROC_HAND_MSG,
+            "host": SIGNAL_HOST_HAND_MSG,
+        }
+        # Applications that have a subroutine at the processor.
+        busy: Set[int] = set()
+        while True:
+            source, msg = yield from self._receive_any_msg(wake_up_signals)
+            if source == "processor":
+                assert isinstance(msg, SubroutineDone)
+                self._logger.debug(f"subroutine of app ID {msg.app_id} done")
+                busy.discard(msg.app_id)
+                self._send_host_msg(self.app_memories[msg.app_id])
+            else:
+                self._logger.debug(f"received new msg from host: {msg}")
+                self.msg_from_host(deserialize_host_msg(msg))
+
+            for app in list(self._applications.values()):
+                if app.id in busy:
+                    continue
+                subrt = app.next_subroutine()
+                if subrt is not None:
+                    busy.add(app.id)
+                    self._send_processor_msg(subrt)
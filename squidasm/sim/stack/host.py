@@ -1,6 +1,21 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Generator, List, Optional, Type
+import itertools
+from collections import deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+)
 
 from netqasm.backend.messages import (
     InitNewAppMessage,
@@ -11,9 +26,15 @@ from netqasm.sdk.epr_socket import EPRSocket
 from netqasm.sdk.transpile import NVSubroutineTranspiler, SubroutineTranspiler
 from netsquid.components.component import Component, Port
 from netsquid.nodes import Node
+from netsquid.protocols import Protocol, Signals
 
 from pydynaa import EventExpression
-from squidasm.sim.stack.common import ComponentProtocol, PortListener
+from squidasm.sim.stack.common import (
+    AppMemory,
+    ComponentProtocol,
+    PortListener,
+    get_only_peer,
+)
 from squidasm.sim.stack.connection import QnosConnection
 from squidasm.sim.stack.context import NetSquidContext
 from squidasm.sim.stack.csocket import ClassicalSocket
@@ -26,6 +47,10 @@ class HostComponent(Component):
 
     Subcomponent of a ProcessingNode.
 
+    Has a pair of ports for communicating with the Host of each peer node that
+    programs on this node have classical sockets with. These ports are only
+    created when connecting to a peer, see `add_peer_ports`.
+
     This is a static container for Host-related components and ports. Behavior
     of a Host is modeled in the `Host` class, which is a subclass of `Protocol`.
     """
@@ -33,7 +58,7 @@ class HostComponent(Component):
     def __init__(self, node: Node) -> None:
         super().__init__(f"{node.name}_host")
         self.add_ports(["qnos_in", "qnos_out"])
-        self.add_ports(["peer_in", "peer_out"])
+        self._peers: List[str] = []
 
     @property
     def qnos_in_port(self) -> Port:
@@ -43,13 +68,38 @@ class HostComponent(Component):
     def qnos_out_port(self) -> Port:
         return self.ports["qnos_out"]
 
+    @property
+    def peers(self) -> List[str]:
+        """Names of the peer nodes for which this component has ports."""
+        return self._peers
+
+    def add_peer_ports(self, peer: str) -> None:
+        """Add ports for communicating with the Host of a peer node.
+
+        :param peer: name of the peer node
+        """
+        if peer in self._peers:
+            return
+        self.add_ports([f"peer_in_{peer}", f"peer_out_{peer}"])
+        self._peers.append(peer)
+
+    def get_peer_in_port(self, peer: str) -> Port:
+        return self.ports[f"peer_in_{peer}"]
+
+    def get_peer_out_port(self, peer: str) -> Port:
+        return self.ports[f"peer_out_{peer}"]
+
     @property
     def peer_in_port(self) -> Port:
-        return self.ports["peer_in"]
+        """Input port from the Host of the only peer node. Use `get_peer_in_port`
+        if there are several peers."""
+        return self.get_peer_in_port(get_only_peer(self._peers, self.name))
 
     @property
     def peer_out_port(self) -> Port:
-        return self.ports["peer_out"]
+        """Output port to the Host of the only peer node. Use `get_peer_out_port`
+        if there are several peers."""
+        return self.get_peer_out_port(get_only_peer(self._peers, self.name))
 
 
 class Host(ComponentProtocol):
@@ -68,10 +118,6 @@ class Host(ComponentProtocol):
             "qnos",
             PortListener(self._comp.ports["qnos_in"], SIGNAL_HAND_HOST_MSG),
         )
-        self.add_listener(
-            "peer",
-            PortListener(self._comp.ports["peer_in"], SIGNAL_HOST_HOST_MSG),
-        )
 
         if qdevice_type == "nv":
             self._compiler: Optional[
@@ -82,15 +128,28 @@ class Host(ComponentProtocol):
         else:
             raise ValueError
 
-        # Program that is currently being executed.
-        self._program: Optional[Program] = None
+        # Queue of programs that still need to be run. Each entry is an iterator
+        # over programs, which are run one after the other. A sequence of programs
+        # in place of a program is run concurrently (see `enqueue_program`).
+        self._program_queue: Deque[
+            Iterator[Union[Program, Sequence[Program]]]
+        ] = deque()
 
-        # Number of times the current program still needs to be run.
-        self._num_pending: int = 0
+        # Protocols running the programs that currently run concurrently.
+        self._concurrent_runs: List[_ConcurrentProgram] = []
 
         # Results of program runs so far.
         self._program_results: List[Dict[str, Any]] = []
 
+        # Name of the program of each result in `_program_results`.
+        self._result_program_names: List[str] = []
+
+        # Function that is called with the result of each program run.
+        self._result_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+
+        # Whether results of program runs are kept in `_program_results`.
+        self._retain_results: bool = True
+
     @property
     def compiler(self) -> Optional[Type[SubroutineTranspiler]]:
         return self._compiler
@@ -99,91 +158,289 @@ class Host(ComponentProtocol):
     def compiler(self, typ: Optional[Type[SubroutineTranspiler]]) -> None:
         self._compiler = typ
 
+    @property
+    def result_callback(self) -> Optional[Callable[[Dict[str, Any]], None]]:
+        """Function that is called with the result of each program run, as soon as
+        that run has finished."""
+        return self._result_callback
+
+    @result_callback.setter
+    def result_callback(
+        self, callback: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> None:
+        self._result_callback = callback
+
+    @property
+    def retain_results(self) -> bool:
+        """Whether the results of program runs are kept, such that they can be
+        retrieved with `get_results`. If False, results are only passed to the
+        result callback."""
+        return self._retain_results
+
+    @retain_results.setter
+    def retain_results(self, retain: bool) -> None:
+        self._retain_results = retain
+
     def send_qnos_msg(self, msg: bytes) -> None:
         self._comp.qnos_out_port.tx_output(msg)
 
-    def receive_qnos_msg(self) -> Generator[EventExpression, None, str]:
-        return (yield from self._receive_msg("qnos", SIGNAL_HAND_HOST_MSG))
+    def receive_qnos_msg(
+        self, app_id: Optional[int] = None
+    ) -> Generator[EventExpression, None, str]:
+        """Receive a message from QNodeOS. Block until there is at least one
+        message.
+
+        :param app_id: if given, receive the oldest message for this application
+            (i.e. its application memory after a subroutine has finished), and
+            block until there is such a message. Messages for other applications,
+            which run concurrently, are kept for later.
+        """
+        if app_id is None:
+            return (yield from self._receive_msg("qnos", SIGNAL_HAND_HOST_MSG))
+        return (
+            yield from self._receive_qnos_msg(
+                lambda msg: isinstance(msg, AppMemory) and msg.app_id == app_id
+            )
+        )
+
+    def _receive_qnos_msg(
+        self, match: Callable[[Any], bool]
+    ) -> Generator[EventExpression, None, Any]:
+        """Receive the oldest message from QNodeOS for which `match` is True."""
+        listener = self._listeners["qnos"]
+        while True:
+            for i, msg in enumerate(listener.buffer):
+                if match(msg):
+                    return listener.buffer.pop(i)
+            yield self.await_signal(sender=listener, signal_label=SIGNAL_HAND_HOST_MSG)
+
+    def _get_peer(self, remote: Optional[str]) -> str:
+        if remote is not None:
+            return remote
+        if len(self._comp.peers) != 1:
+            raise ValueError(
+                f"Host of {self._comp.name} has {len(self._comp.peers)} peers, "
+                "so the remote node must be specified"
+            )
+        return self._comp.peers[0]
+
+    def send_peer_msg(self, msg: str, remote: Optional[str] = None) -> None:
+        """Send a message to the Host of a peer node.
 
-    def send_peer_msg(self, msg: str) -> None:
-        self._comp.peer_out_port.tx_output(msg)
+        :param msg: message to send
+        :param remote: name of the peer node. May be omitted if there is only one
+        """
+        self._comp.get_peer_out_port(self._get_peer(remote)).tx_output(msg)
 
-    def receive_peer_msg(self) -> Generator[EventExpression, None, str]:
-        return (yield from self._receive_msg("peer", SIGNAL_HOST_HOST_MSG))
+    def receive_peer_msg(
+        self, remote: Optional[str] = None
+    ) -> Generator[EventExpression, None, str]:
+        """Receive a message from the Host of a peer node. Block until there is at
+        least one message.
+
+        :param remote: name of the peer node. May be omitted if there is only one
+        """
+        peer = self._get_peer(remote)
+        return (yield from self._receive_msg(f"peer_{peer}", SIGNAL_HOST_HOST_MSG))
+
+    def start(self) -> None:
+        # Peer ports may have been added after this protocol was created.
+        for peer in self._comp.peers:
+            if f"peer_{peer}" not in self._listeners:
+                self.add_listener(
+                    f"peer_{peer}",
+                    PortListener(
+                        self._comp.get_peer_in_port(peer), SIGNAL_HOST_HOST_MSG
+                    ),
+                )
+        super().start()
 
     def run(self) -> Generator[EventExpression, None, None]:
         """Run this protocol. Automatically called by NetSquid during simulation."""
 
-        # Run a single program as many times as requested.
-        while self._num_pending > 0:
-            self._logger.info(f"num pending: {self._num_pending}")
-            self._num_pending -= 1
-
-            assert self._program is not None
-            prog_meta = self._program.meta
+        # Run all queued programs back to back.
+        while len(self._program_queue) > 0:
+            programs = self._program_queue.popleft()
+            for program in programs:
+                if isinstance(program, Program):
+                    yield from self._run_program(program)
+                else:
+                    yield from self._run_concurrently(program)
+
+    def _run_concurrently(
+        self, programs: Sequence[Program]
+    ) -> Generator[EventExpression, None, None]:
+        """Run several programs once, at the same time, and wait until they have
+        all finished."""
+        self._concurrent_runs = [
+            _ConcurrentProgram(self, prog, i) for i, prog in enumerate(programs)
+        ]
+        for run in self._concurrent_runs:
+            run.start()
+        for run in self._concurrent_runs:
+            if not run.finished:
+                yield self.await_signal(sender=run, signal_label=Signals.FINISHED)
+        self._stop_concurrent_runs()
+
+    def _stop_concurrent_runs(self) -> None:
+        for run in self._concurrent_runs:
+            run.stop()
+        self._concurrent_runs = []
+
+    def _run_program(
+        self, program: Program, epr_socket_id: int = 0
+    ) -> Generator[EventExpression, None, None]:
+        """Run a single program once.
+
+        :param program: program to run
+        :param epr_socket_id: ID of the EPR sockets of the program, which is also
+            the ID of the EPR sockets of the peer programs it shares pairs with
+        """
+        prog_meta = program.meta
+        self._logger.info(f"running program {prog_meta.name}")
+
+        # Register the new program (called 'application' by QNodeOS) with QNodeOS.
+        # The reply is the only message from QNodeOS that is not an application
+        # memory. If programs run concurrently, they may get each other's IDs,
+        # which does not matter since none of them has used its ID yet.
+        self.send_qnos_msg(bytes(InitNewAppMessage(max_qubits=prog_meta.max_qubits)))
+        app_id = yield from self._receive_qnos_msg(lambda msg: isinstance(msg, int))
+        self._logger.debug(f"got app id from qnos: {app_id}")
+
+        # Set up the Connection object to be used by the program SDK code.
+        conn = QnosConnection(
+            self,
+            app_id,
+            prog_meta.name,
+            max_qubits=prog_meta.max_qubits,
+            compiler=self._compiler,
+        )
 
-            # Register the new program (called 'application' by QNodeOS) with QNodeOS.
+        # Create EPR sockets that can be used by the program SDK code.
+        epr_sockets: Dict[int, EPRSocket] = {}
+        for remote_name in prog_meta.epr_sockets:
+            remote_id = None
+            nodes = NetSquidContext.get_nodes()
+            for id, name in nodes.items():
+                if name == remote_name:
+                    remote_id = id
+            assert remote_id is not None
             self.send_qnos_msg(
-                bytes(InitNewAppMessage(max_qubits=prog_meta.max_qubits))
+                bytes(
+                    OpenEPRSocketMessage(
+                        app_id, epr_socket_id, remote_id, epr_socket_id
+                    )
+                )
             )
-            app_id = yield from self.receive_qnos_msg()
-            self._logger.debug(f"got app id from qnos: {app_id}")
-
-            # Set up the Connection object to be used by the program SDK code.
-            conn = QnosConnection(
-                self,
-                app_id,
-                prog_meta.name,
-                max_qubits=prog_meta.max_qubits,
-                compiler=self._compiler,
+            epr_sockets[remote_name] = EPRSocket(
+                remote_name, epr_socket_id, epr_socket_id
             )
-
-            # Create EPR sockets that can be used by the program SDK code.
-            epr_sockets: Dict[int, EPRSocket] = {}
-            for i, remote_name in enumerate(prog_meta.epr_sockets):
-                remote_id = None
-                nodes = NetSquidContext.get_nodes()
-                for id, name in nodes.items():
-                    if name == remote_name:
-                        remote_id = id
-                assert remote_id is not None
-                self.send_qnos_msg(bytes(OpenEPRSocketMessage(app_id, i, remote_id)))
-                epr_sockets[remote_name] = EPRSocket(remote_name, i)
-                epr_sockets[remote_name].conn = conn
-
-            # Create classical sockets that can be used by the program SDK code.
-            classical_sockets: Dict[int, ClassicalSocket] = {}
-            for i, remote_name in enumerate(prog_meta.csockets):
-                remote_id = None
-                nodes = NetSquidContext.get_nodes()
-                for id, name in nodes.items():
-                    if name == remote_name:
-                        remote_id = id
-                assert remote_id is not None
-                classical_sockets[remote_name] = ClassicalSocket(
-                    self, prog_meta.name, remote_name
-                )
-
-            context = ProgramContext(
-                netqasm_connection=conn,
-                csockets=classical_sockets,
-                epr_sockets=epr_sockets,
-                app_id=app_id,
+            epr_sockets[remote_name].conn = conn
+
+        # Create classical sockets that can be used by the program SDK code.
+        classical_sockets: Dict[int, ClassicalSocket] = {}
+        for i, remote_name in enumerate(prog_meta.csockets):
+            remote_id = None
+            nodes = NetSquidContext.get_nodes()
+            for id, name in nodes.items():
+                if name == remote_name:
+                    remote_id = id
+            assert remote_id is not None
+            classical_sockets[remote_name] = ClassicalSocket(
+                self, prog_meta.name, remote_name
             )
 
-            # Run the program by evaluating its run() method.
-            result = yield from self._program.run(context)
+        context = ProgramContext(
+            netqasm_connection=conn,
+            csockets=classical_sockets,
+            epr_sockets=epr_sockets,
+            app_id=app_id,
+        )
+
+        # Run the program by evaluating its run() method.
+        result = yield from program.run(context)
+        if self._result_callback is not None:
+            self._result_callback(result)
+        if self._retain_results:
             self._program_results.append(result)
+            self._result_program_names.append(prog_meta.name)
 
-            # Tell QNodeOS the program has finished.
-            self.send_qnos_msg(bytes(StopAppMessage(app_id)))
+        # Tell QNodeOS the program has finished.
+        self.send_qnos_msg(bytes(StopAppMessage(app_id)))
 
-    def enqueue_program(self, program: Program, num_times: int = 1):
+    def enqueue_program(
+        self, program: Union[Program, Sequence[Program]], num_times: int = 1
+    ) -> None:
         """Queue a program to be run the given number of times.
 
-        NOTE: At the moment, only a single program can be queued at a time."""
+        Programs are run in the order in which they were queued, after all
+        programs that were queued before them have finished. Queueing several
+        (different) programs allows running a mixed workload in a single
+        simulation.
+
+        A sequence of programs is run concurrently, as separate applications on
+        QNodeOS, and is run again once all of them have finished. Programs that
+        run concurrently must not have classical sockets with the same peer node,
+        since messages from that node's Host cannot be told apart. The EPR sockets
+        of the `i`-th program have ID `i`, so a program only shares entanglement
+        with the program at the same position of the peer node's sequence.
+
+        :param program: program to run, or programs to run concurrently
+        :param num_times: number of times to run the program, defaults to 1
+        """
+        self._program_queue.append(itertools.repeat(program, num_times))
+
+    def enqueue_programs(self, programs: Iterable[Program]) -> None:
+        """Queue a sequence of programs, each to be run once, in order.
+
+        `programs` may be a generator, in which case the next program is only
+        created once the previous one has finished.
+
+        :param programs: programs to run
+        """
+        self._program_queue.append(iter(programs))
+
+    def get_results(self, program_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the results of the program runs so far, in the order in which the
+        programs were run.
+
+        :param program_name: if given, only get the results of programs with
+            this name (see `ProgramMeta.name`)
+        """
+        if program_name is None:
+            return self._program_results
+        return [
+            result
+            for name, result in zip(self._result_program_names, self._program_results)
+            if name == program_name
+        ]
+
+    def get_result_program_names(self) -> List[str]:
+        """Get the name of the program of each result in `get_results()`."""
+        return self._result_program_names
+
+    def stop(self) -> None:
+        self._stop_concurrent_runs()
+        super().stop()
+
+    def reset_state(self) -> None:
+        super().reset_state()
+        self._program_queue = deque()
+        self._program_results = []
+        self._result_program_names = []
+
+
+class _ConcurrentProgram(Protocol):
+    """Protocol running a single program of a Host, while the Host runs other
+    programs at the same time (see `Host.enqueue_program`)."""
+
+    def __init__(self, host: Host, program: Program, epr_socket_id: int) -> None:
+        super().__init__(f"{host.name}_{program.meta.name}")
+        self._host = host
         self._program = program
-        self._num_pending = num_times
+        self._epr_socket_id = epr_socket_id
+        self.finished = False
 
-    def get_results(self) -> List[Dict[str, Any]]:
-        return self._program_results
+    def run(self) -> Generator[EventExpression, None, None]:
+        yield from self._host._run_program(self._program, self._epr_socket_id)
+        self.finished = True
@@ -1,8 +1,20 @@
 from __future__ import annotations
 
+import dataclasses
 import math
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Dict, Generator, List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 import netsquid as ns
 from netqasm.sdk.build_epr import (
@@ -20,6 +32,7 @@ from netsquid.components.component import Component, Port
 from netsquid.components.instructions import INSTR_ROT_X, INSTR_ROT_Z
 from netsquid.components.qprogram import QuantumProgram
 from netsquid.nodes import Node
+from netsquid.protocols import Protocol
 from netsquid.qubits.ketstates import BellIndex
 from netsquid_magic.link_layer import MagicLinkLayerProtocolWithSignaling
 from netsquid_magic.magic_distributor import DoubleClickMagicDistributor
@@ -28,6 +41,7 @@ from qlink_interface import (
     ReqCreateBase,
     ReqMeasureDirectly,
     ReqReceive,
+    ReqStopReceive,
     ResCreateAndKeep,
     ResMeasureDirectly,
 )
@@ -46,8 +60,13 @@ from squidasm.sim.stack.common import (
     PortListener,
 )
 from squidasm.sim.stack.egp import EgpProtocol
+from squidasm.sim.stack.profiling import Profiler
+from squidasm.sim.stack.qprogram_cache import QuantumProgramCache
 from squidasm.sim.stack.signals import (
+    SIGNAL_MEMORY_ALLOCATED,
     SIGNAL_MEMORY_FREED,
+    SIGNAL_NSTK_BUFFER,
+    SIGNAL_NSTK_PEER_REQ,
     SIGNAL_PEER_NSTK_MSG,
     SIGNAL_PROC_NSTK_MSG,
 )
@@ -58,6 +77,29 @@ if TYPE_CHECKING:
 PI = math.pi
 PI_OVER_2 = math.pi / 2
 
+BUFFER_PURPOSE_ID = 2**16 - 1
+"""Purpose ID of the link layer requests of `EntanglementBuffer`s, which differs
+from the purpose IDs of application requests (see `Netstack.get_purpose_id`)."""
+
+
+def _is_breakpoint_msg(msg: Any) -> bool:
+    """Whether a peer message belongs to the breakpoint synchronization, as
+    opposed to an entanglement request that may be in flight at the same time."""
+    return msg in ("breakpoint start", "breakpoint end")
+
+
+def _build_bell_correction(bell_state: BellIndex) -> QuantumProgram:
+    """Template of the correction on qubit 0 that turns the given Bell state into
+    Phi+ (i.e. B00)."""
+    if bell_state == BellIndex.B00:
+        raise ValueError("Phi+ (B00) does not need a correction")
+    prog = QuantumProgram(num_qubits=1)
+    if bell_state in (BellIndex.B01, BellIndex.B11):
+        prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=PI)
+    if bell_state in (BellIndex.B10, BellIndex.B11):
+        prog.apply(INSTR_ROT_Z, qubit_indices=[0], angle=PI)
+    return prog
+
 
 class NetstackComponent(Component):
     """NetSquid component representing the network stack in QNodeOS.
@@ -66,8 +108,9 @@ class NetstackComponent(Component):
 
     Has communications ports with
      - the processor component of this QNodeOS
-     - the netstack compmonent of the remote node
-        NOTE: at this moment only a single other node is supported in the network
+     - the netstack compmonent of each peer node that this node has a link with.
+       These ports are only created when connecting to a peer, see
+       `add_peer_ports`.
 
     This is a static container for network-stack-related components and ports.
     Behavior of a QNodeOS network stack is modeled in the `NetStack` class,
@@ -78,7 +121,7 @@ class NetstackComponent(Component):
         super().__init__(f"{node.name}_netstack")
         self._node = node
         self.add_ports(["proc_out", "proc_in"])
-        self.add_ports(["peer_out", "peer_in"])
+        self._peers: Dict[int, str] = {}  # node ID -> node name
 
     @property
     def processor_in_port(self) -> Port:
@@ -89,12 +132,26 @@ class NetstackComponent(Component):
         return self.ports["proc_out"]
 
     @property
-    def peer_in_port(self) -> Port:
-        return self.ports["peer_in"]
+    def peers(self) -> Dict[int, str]:
+        """IDs and names of the peer nodes for which this component has ports."""
+        return self._peers
 
-    @property
-    def peer_out_port(self) -> Port:
-        return self.ports["peer_out"]
+    def add_peer_ports(self, peer_id: int, peer_name: str) -> None:
+        """Add ports for communicating with the network stack of a peer node.
+
+        :param peer_id: ID of the peer node
+        :param peer_name: name of the peer node
+        """
+        if peer_id in self._peers:
+            return
+        self.add_ports([f"peer_out_{peer_name}", f"peer_in_{peer_name}"])
+        self._peers[peer_id] = peer_name
+
+    def get_peer_in_port(self, peer_name: str) -> Port:
+        return self.ports[f"peer_in_{peer_name}"]
+
+    def get_peer_out_port(self, peer_name: str) -> Port:
+        return self.ports[f"peer_out_{peer_name}"]
 
     @property
     def node(self) -> Node:
@@ -111,6 +168,650 @@ class EprSocket:
 
     socket_id: int
     remote_id: int
+    remote_socket_id: int = 0
+    """ID of the EPR socket of the remote node that this socket shares pairs
+    with."""
+
+
+@dataclass
+class ArrayWatch:
+    """Slice of an array that the processor waits for to be fully written."""
+
+    start: int
+    end: int
+    remaining: int
+    """Number of entries of the slice that are not yet defined."""
+
+
+@dataclass
+class PeerCreateRequest:
+    """Message from the network stack that creates entanglement to the one that
+    receives it, announcing a request."""
+
+    request_id: int
+    """ID of the request, unique for the sending network stack."""
+    app_id: int
+    """ID of the application that issued the request on the sending node."""
+    epr_socket_id: int
+    """ID of the EPR socket of the request on the sending node. The request is
+    handled by the receive request of the EPR socket whose remote socket ID is
+    this ID."""
+    request: ReqCreateBase
+    """Link layer request object."""
+
+
+@dataclass
+class PeerAck:
+    """Message from the network stack that receives entanglement to the one that
+    creates it, acknowledging that it handles the request with the given ID."""
+
+    request_id: int
+
+
+class EgpResultListener(Protocol):
+    """Collects the results of a single type that an EGP delivers, such that no
+    result is lost when the network stack is not awaiting it at the time of
+    delivery. Analogous to `PortListener`."""
+
+    def __init__(self, egp: EgpProtocol, result_type: Type) -> None:
+        super().__init__()
+        self._egp = egp
+        self._label = result_type.__name__
+        self._buffer: List[Any] = []
+        self.add_signal(self._label)
+
+    @property
+    def buffer(self) -> List[Any]:
+        return self._buffer
+
+    def clear_buffer(self) -> None:
+        self._buffer.clear()
+
+    def run(self) -> Generator[EventExpression, None, None]:
+        while True:
+            yield self.await_signal(sender=self._egp, signal_label=self._label)
+            result = self._egp.get_signal_result(self._label, receiver=self)
+            self._buffer.append(result)
+            self.send_signal(self._label)
+
+
+NetstackRequest = Union[NetstackCreateRequest, NetstackReceiveRequest]
+
+
+def _socket_key(req: NetstackRequest) -> Tuple[int, int]:
+    return req.app_id, req.epr_socket_id
+
+
+class SchedulingPolicy:
+    """Policy deciding which of the outstanding requests with a remote node is
+    handled next, and which of the requests that are being handled gets the next
+    free communication qubit. The default policy serves requests in the order in
+    which the processor issued them."""
+
+    def select(
+        self, requests: List[NetstackRequest], served: Dict[Tuple[int, int], int]
+    ) -> int:
+        """Select the next request to serve.
+
+        :param requests: requests that may be served next, oldest first
+        :param served: number of requests handled so far, by application ID and EPR
+            socket ID
+        :return: index of the selected request in `requests`
+        """
+        return 0
+
+
+class RoundRobinPolicy(SchedulingPolicy):
+    """Handle the requests of the EPR sockets of all applications in turn, such that
+    a socket with many outstanding requests does not block the requests of
+    others."""
+
+    def select(
+        self, requests: List[NetstackRequest], served: Dict[Tuple[int, int], int]
+    ) -> int:
+        return min(
+            range(len(requests)),
+            key=lambda i: (served.get(_socket_key(requests[i]), 0), i),
+        )
+
+
+class PriorityPolicy(SchedulingPolicy):
+    """Handle the requests of the application with the highest priority first.
+    Requests of applications with the same priority are handled in order."""
+
+    def __init__(self, priorities: Dict[int, int], default: int = 0) -> None:
+        """
+        :param priorities: priority by application ID
+        :param default: priority of applications not in `priorities`
+        """
+        self._priorities = priorities
+        self._default = default
+
+    def select(
+        self, requests: List[NetstackRequest], served: Dict[Tuple[int, int], int]
+    ) -> int:
+        return min(
+            range(len(requests)),
+            key=lambda i: (-self._priorities.get(requests[i].app_id, self._default), i),
+        )
+
+
+class _RequestRun(Protocol):
+    """Protocol handling a single request of a `PeerRequestQueue`, while the queue
+    handles the requests of other EPR sockets at the same time."""
+
+    def __init__(
+        self, queue: PeerRequestQueue, req: NetstackRequest, purpose_id: int
+    ) -> None:
+        super().__init__(name=f"{queue.name}_purpose_{purpose_id}")
+        self._queue = queue
+        self._req = req
+        self.purpose_id = purpose_id
+
+    def run(self) -> Generator[EventExpression, None, None]:
+        netstack = self._queue.netstack
+        if isinstance(self._req, NetstackCreateRequest):
+            yield from netstack.handle_create_request(self._req)
+        else:
+            yield from netstack.handle_receive_request(self._req)
+        self._queue.finish(self)
+
+
+class PeerRequestQueue(Protocol):
+    """Queue of the entanglement requests of a network stack with a single remote
+    node.
+
+    The link layer requests of a request carry the ID of the EPR socket of the
+    creating node as purpose ID, such that the results of the EGP are told apart by
+    it. Requests with different purpose IDs, i.e. of different pairs of EPR
+    sockets, are handled concurrently and share the EGP. Requests with the same
+    purpose ID are handled one at a time, in the order in which they were issued,
+    since the remote node handles them in the order in which they are announced.
+
+    The scheduling policy of the network stack decides which request is started
+    first, and which of the requests that are being handled gets the next free
+    communication qubit. Each remote node has its own queue, such that requests
+    with different remote nodes are handled concurrently as well.
+    """
+
+    def __init__(self, netstack: Netstack, remote_id: int) -> None:
+        """
+        :param netstack: network stack that handles the requests
+        :param remote_id: ID of the remote node
+        """
+        super().__init__(name=f"{netstack.name}_peer_{remote_id}")
+        self._netstack = netstack
+        self._remote_id = remote_id
+        self._requests: List[NetstackRequest] = []
+        # (app ID, EPR socket ID) -> number of handled requests
+        self._served: Dict[Tuple[int, int], int] = {}
+        # Requests that are being handled, by purpose ID.
+        self._active: Dict[int, _RequestRun] = {}
+        # Requests that are being handled and wait for a communication qubit,
+        # oldest first.
+        self._comm_waiting: List[NetstackRequest] = []
+        # Communication qubits allocated for pairs that are outstanding at the
+        # EGP, by purpose ID.
+        self._pending_comm: Dict[int, List[int]] = {}
+        self.add_signal(SIGNAL_NSTK_PEER_REQ)
+
+    @property
+    def netstack(self) -> Netstack:
+        return self._netstack
+
+    @property
+    def requests(self) -> List[NetstackRequest]:
+        """Outstanding requests that have not been started, oldest first."""
+        return self._requests
+
+    def put(self, req: NetstackRequest) -> None:
+        """Add a request to the queue."""
+        self._requests.append(req)
+        self.send_signal(SIGNAL_NSTK_PEER_REQ)
+
+    def clear(self) -> None:
+        for request_run in self._active.values():
+            request_run.stop()
+        self._active.clear()
+        self._requests.clear()
+        self._served.clear()
+        self._comm_waiting.clear()
+        self._pending_comm.clear()
+
+    def pop_next(self) -> Optional[NetstackRequest]:
+        """Remove the next request to start from the queue and return it, or return
+        None if each outstanding request waits for an earlier request with the same
+        purpose ID."""
+        # Only the oldest request of each purpose ID may be started next.
+        candidates = []
+        purpose_ids = set(self._active)
+        for req in self._requests:
+            purpose_id = self._netstack.get_purpose_id(req)
+            if purpose_id not in purpose_ids:
+                purpose_ids.add(purpose_id)
+                candidates.append(req)
+        if len(candidates) == 0:
+            return None
+
+        req = candidates[
+            self._netstack.scheduling_policy.select(candidates, self._served)
+        ]
+        self._requests.remove(req)
+        key = _socket_key(req)
+        self._served[key] = self._served.get(key, 0) + 1
+        return req
+
+    def finish(self, request_run: _RequestRun) -> None:
+        """Called by a request run when it has handled its request."""
+        del self._active[request_run.purpose_id]
+        self.send_signal(SIGNAL_NSTK_PEER_REQ)
+
+    def get_pending_comm(self, purpose_id: int) -> List[int]:
+        """Get the communication qubits allocated for the outstanding pairs of the
+        request with the given purpose ID, in the order in which they were
+        allocated. The list may be modified."""
+        return self._pending_comm.setdefault(purpose_id, [])
+
+    def allocate_comm(self, req: NetstackRequest) -> Optional[int]:
+        """Allocate a communication qubit for a pair of a request that is being
+        handled. Return None if no qubit is free, or if the scheduling policy
+        prefers another request that waits for a qubit, in which case `req` waits
+        for a qubit too (see `await_comm`)."""
+        waiting = self._comm_waiting
+        candidates = waiting if req in waiting else waiting + [req]
+        policy = self._netstack.scheduling_policy
+        if candidates[policy.select(candidates, self._served)] is req:
+            try:
+                phys_id = self._netstack.physical_memory.allocate_comm()
+            except AllocError:
+                pass
+            else:
+                if req in waiting:
+                    waiting.remove(req)
+                # Other waiting requests may get a qubit now, and an entanglement
+                # buffer stops receiving pairs while the qubit is empty.
+                self.send_signal(SIGNAL_NSTK_PEER_REQ)
+                return phys_id
+        if req not in waiting:
+            waiting.append(req)
+        return None
+
+    def await_comm(self) -> EventExpression:
+        """Event expression for waiting until a communication qubit may be
+        allocated again, after `allocate_comm` returned None."""
+        return self.await_signal(
+            sender=self._netstack._qnos.processor, signal_label=SIGNAL_MEMORY_FREED
+        ) | self.await_signal(sender=self, signal_label=SIGNAL_NSTK_PEER_REQ)
+
+    def swap_pending_comm(self, pending: List[int], phys_id: int) -> bool:
+        """If a qubit holding a pair was allocated for an outstanding pair other
+        than the ones `pending` was allocated for, give that pair the first qubit
+        of `pending` instead (or none, if `pending` is empty, in which case a new
+        one is allocated for it). Besides the pairs of the requests that are being
+        handled, this includes the pairs that the entanglement buffer with the
+        remote node reserved qubits for.
+
+        :param pending: qubits allocated for the outstanding pairs of the owner
+            of the pair, which is modified
+        :param phys_id: qubit holding the pair
+        :return: whether the qubit was allocated for another outstanding pair
+        """
+        others = list(self._pending_comm.values())
+        buffer = self._netstack.get_buffer(self._remote_id)
+        if buffer is not None:
+            others.append(buffer.reserved)
+        for other in others:
+            if other is not pending and phys_id in other:
+                if len(pending) > 0:
+                    other[other.index(phys_id)] = pending.pop(0)
+                else:
+                    other.remove(phys_id)
+                    self.send_signal(SIGNAL_NSTK_PEER_REQ)
+                return True
+        return False
+
+    def take_pending_comm(
+        self, req: NetstackRequest, purpose_id: int, phys_id: int
+    ) -> None:
+        """Remove the qubit holding a pair that the EGP produced for a request from
+        the qubits allocated for its outstanding pairs.
+
+        The EGP chooses the qubit, so it may be a qubit that was allocated for a
+        pair of another request, or reserved by the entanglement buffer. That
+        request or buffer then gets one of the qubits allocated for this request
+        instead (see `swap_pending_comm`). The creating node may put its request to
+        the EGP before the receiving node handles its receive request, so the
+        receiving node may also get a pair in a qubit that is not allocated at all,
+        which it then allocates.
+
+        :param req: request the pair was produced for
+        :param purpose_id: purpose ID of the request
+        :param phys_id: qubit holding the pair
+        """
+        pending = self.get_pending_comm(purpose_id)
+        if phys_id in pending:
+            pending.remove(phys_id)
+            return
+        if self.swap_pending_comm(pending, phys_id):
+            return
+        memory = self._netstack.physical_memory
+        if isinstance(req, NetstackReceiveRequest) and not memory.is_allocated(phys_id):
+            memory.allocate_id(phys_id)
+            if len(pending) > 0:
+                memory.free(pending.pop())
+            return
+        raise RuntimeError(
+            f"EGP produced a pair in qubit {phys_id}, which was not allocated for "
+            f"any outstanding request (allocated: {self._pending_comm})"
+        )
+
+    def release_comm(self, req: NetstackRequest, purpose_id: int) -> None:
+        """Called when a request has got all of its pairs. Stop waiting for a
+        communication qubit and free the qubits that are still allocated for it."""
+        if req in self._comm_waiting:
+            self._comm_waiting.remove(req)
+            self.send_signal(SIGNAL_NSTK_PEER_REQ)
+        for phys_id in self._pending_comm.pop(purpose_id, []):
+            self._netstack.physical_memory.free(phys_id)
+
+    def run(self) -> Generator[EventExpression, None, None]:
+        while True:
+            req = self.pop_next()
+            if req is None:
+                yield self.await_signal(sender=self, signal_label=SIGNAL_NSTK_PEER_REQ)
+                continue
+            request_run = _RequestRun(self, req, self._netstack.get_purpose_id(req))
+            self._active[request_run.purpose_id] = request_run
+            Profiler.instrument(
+                request_run, f"{self._netstack.name}.peer_{self._remote_id}"
+            )
+            request_run.start()
+
+    def stop(self) -> None:
+        for request_run in self._active.values():
+            request_run.stop()
+        super().stop()
+
+
+@dataclass
+class BufferedPair:
+    """Entangled pair held by an `EntanglementBuffer`."""
+
+    phys_id: int
+    """Physical qubit holding the local half of the pair."""
+    result: ResCreateAndKeep
+    """Result of the EGP for the pair."""
+    time: float
+    """Simulation time (in nanoseconds) at which the pair was delivered."""
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        """Identifies the pair on both nodes."""
+        return self.result.create_id, self.result.sequence_number
+
+
+@dataclass
+class BufferedPairs:
+    """Message from the network stack that created buffered pairs to the one that
+    received them, telling which pairs are handed to a request."""
+
+    request_id: int
+    """ID of the request, see `PeerCreateRequest`."""
+    keys: List[Tuple[int, int]]
+
+
+class EntanglementBuffer(Protocol):
+    """Buffer of entangled pairs with a single remote node, generated before an
+    application asks for them.
+
+    Both nodes of a link run a buffer. The node with the lowest ID creates pairs,
+    into free communication qubits, until `size` pairs are buffered or being
+    generated. It only requests pairs while the QDevice is idle. The other node
+    receives them, into communication qubits that it reserved for the buffer
+    beforehand. It only accepts pairs (i.e. has a receive request outstanding at
+    the EGP) while one of these qubits is free, and while applications and other
+    requests do not hold an empty communication qubit, in which the EGP could
+    otherwise deliver a pair. Both nodes always leave one communication qubit free
+    for other requests, such as Measure Directly requests. Create and Keep
+    requests with the remote node are then served from the buffer, without
+    waiting for the link.
+
+    The creating node decides which pairs are handed to a request and tells the
+    receiving node (see `BufferedPairs`). If
+    `max_age` is set, it discards pairs that are older than `max_age` when
+    serving a request, and the receiving node discards them as soon as it learns
+    that younger pairs were handed out.
+    """
+
+    def __init__(
+        self,
+        netstack: Netstack,
+        remote_id: int,
+        size: int,
+        max_age: Optional[float] = None,
+    ) -> None:
+        """
+        :param netstack: network stack that owns the buffer
+        :param remote_id: ID of the remote node
+        :param size: number of pairs to keep buffered
+        :param max_age: age (in nanoseconds) after which a buffered pair is stale,
+            or None if pairs do not become stale
+        """
+        super().__init__(name=f"{netstack.name}_buffer_{remote_id}")
+        self._netstack = netstack
+        self._remote_id = remote_id
+        self._size = size
+        self._max_age = max_age
+        self._pairs: List[BufferedPair] = []  # oldest first
+        self._reserved: List[int] = []
+        self.add_signal(SIGNAL_NSTK_BUFFER)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def max_age(self) -> Optional[float]:
+        return self._max_age
+
+    @property
+    def pairs(self) -> List[BufferedPair]:
+        """Buffered pairs, oldest first."""
+        return self._pairs
+
+    @property
+    def reserved(self) -> List[int]:
+        """Communication qubits that the receiving node reserved for pairs that
+        have not arrived yet. The list may be modified."""
+        return self._reserved
+
+    @property
+    def is_creator(self) -> bool:
+        """Whether this node creates the pairs (instead of receiving them)."""
+        return self._netstack._comp.node.ID < self._remote_id
+
+    def clear(self) -> None:
+        self._pairs.clear()
+        self._reserved.clear()
+
+    def _discard(self, pair: BufferedPair) -> None:
+        self._netstack.physical_memory.free(pair.phys_id)
+        self._netstack.qdevice.mem_positions[pair.phys_id].in_use = False
+
+    def discard_stale(self) -> None:
+        """Discard the pairs that are older than `max_age`."""
+        if self._max_age is None:
+            return
+        now = ns.sim_time()
+        stale = [pair for pair in self._pairs if now - pair.time > self._max_age]
+        if len(stale) == 0:
+            return
+        for pair in stale:
+            self._discard(pair)
+        self._pairs = [pair for pair in self._pairs if pair not in stale]
+        self.send_signal(SIGNAL_NSTK_BUFFER)
+
+    def take(self, number: int) -> List[BufferedPair]:
+        """Remove up to `number` of the oldest pairs from the buffer and return
+        them. Used by the creating node."""
+        pairs = self._pairs[:number]
+        del self._pairs[:number]
+        self.send_signal(SIGNAL_NSTK_BUFFER)
+        return pairs
+
+    def has_pairs(self, keys: List[Tuple[int, int]]) -> bool:
+        """Whether all pairs with the given keys are buffered."""
+        buffered = {pair.key for pair in self._pairs}
+        return all(key in buffered for key in keys)
+
+    def take_pairs(self, keys: List[Tuple[int, int]]) -> List[BufferedPair]:
+        """Remove the pairs with the given keys from the buffer and return them, in
+        the order of `keys`. Older pairs are discarded, since the creating node
+        discarded them. Used by the receiving node."""
+        by_key = {pair.key: pair for pair in self._pairs}
+        pairs = [by_key[key] for key in keys]
+        last = max(self._pairs.index(pair) for pair in pairs)
+        for pair in self._pairs[:last]:
+            if pair not in pairs:
+                self._discard(pair)
+        del self._pairs[: last + 1]
+        self.send_signal(SIGNAL_NSTK_BUFFER)
+        return pairs
+
+    def run(self) -> Generator[EventExpression, None, None]:
+        egp = self._netstack._get_egp(self._remote_id)
+        if self.is_creator:
+            yield from self._run_create(egp)
+        else:
+            yield from self._run_receive(egp)
+
+    def _run_create(self, egp: EgpProtocol) -> Generator[EventExpression, None, None]:
+        request = ReqCreateAndKeep(
+            remote_node_id=self._remote_id, purpose_id=BUFFER_PURPOSE_ID, number=1
+        )
+        memory = self._netstack.physical_memory
+        qdevice = self._netstack.qdevice
+        pending: List[int] = []  # allocated comm qubits, in order of the requests
+        while True:
+            # Pairs are only requested while applications do not use the QDevice,
+            # and one communication qubit is left free.
+            while (
+                not qdevice.busy
+                and len(self._pairs) + len(pending) < self._size
+                and memory.free_comm_qubit_count > 1
+            ):
+                pending.append(memory.allocate_comm())
+                egp.put(request)
+
+            if len(pending) == 0:
+                # Wait until pairs are taken from the buffer, a qubit is freed or
+                # the QDevice becomes idle.
+                expr = self.await_signal(
+                    sender=self, signal_label=SIGNAL_NSTK_BUFFER
+                ) | self.await_signal(
+                    sender=self._netstack._qnos.processor,
+                    signal_label=SIGNAL_MEMORY_FREED,
+                )
+                if qdevice.busy:
+                    expr = expr | self.await_program(qdevice)
+                yield expr
+                continue
+
+            result: ResCreateAndKeep = yield from self._netstack._receive_egp_result(
+                self._remote_id, ResCreateAndKeep, BUFFER_PURPOSE_ID
+            )
+            phys_id = result.logical_qubit_id
+            if phys_id not in pending:
+                raise RuntimeError(
+                    f"EGP produced a pair in qubit {phys_id}, which was not "
+                    f"allocated for any outstanding request (allocated: {pending})"
+                )
+            pending.remove(phys_id)
+
+            yield from self._netstack._correct_bell_state(egp, phys_id, result)
+            self._pairs.append(BufferedPair(phys_id, result, ns.sim_time()))
+            self.send_signal(SIGNAL_NSTK_BUFFER)
+
+    def _can_receive(self) -> bool:
+        """Whether the receiving node can accept a pair: a reserved qubit is free
+        for it, and every other communication qubit that the EGP may deliver a
+        pair in (i.e. that is empty) is not allocated."""
+        if len(self._reserved) == 0:
+            return False
+        memory = self._netstack.physical_memory
+        qdevice = self._netstack.qdevice
+        for phys_id in memory.comm_qubit_ids:
+            if (
+                memory.is_allocated(phys_id)
+                and phys_id not in self._reserved
+                and not qdevice.mem_positions[phys_id].in_use
+            ):
+                return False
+        return True
+
+    def _run_receive(self, egp: EgpProtocol) -> Generator[EventExpression, None, None]:
+        memory = self._netstack.physical_memory
+        processor = self._netstack._qnos.processor
+        queue = self._netstack._get_queue(self._remote_id)
+        receiving = False
+        while True:
+            # Reserve qubits for the pairs, leaving one communication qubit free.
+            while (
+                len(self._pairs) + len(self._reserved) < self._size
+                and memory.free_comm_qubit_count > 1
+            ):
+                self._reserved.append(memory.allocate_comm())
+
+            # Only accept pairs that cannot end up in a qubit that is not ours.
+            can_receive = self._can_receive()
+            if can_receive and not receiving:
+                egp.put(
+                    ReqReceive(
+                        remote_node_id=self._remote_id, purpose_id=BUFFER_PURPOSE_ID
+                    )
+                )
+                receiving = True
+            elif not can_receive and receiving:
+                egp.put(
+                    ReqStopReceive(
+                        remote_node_id=self._remote_id, purpose_id=BUFFER_PURPOSE_ID
+                    )
+                )
+                receiving = False
+
+            result: Optional[ResCreateAndKeep] = self._netstack._poll_egp_result(
+                self._remote_id, ResCreateAndKeep, BUFFER_PURPOSE_ID
+            )
+            if result is None:
+                # Wait until a pair arrives, pairs are taken from the buffer, or
+                # an application or request allocates or frees a qubit.
+                yield (
+                    self._netstack._await_egp_result(self._remote_id, ResCreateAndKeep)
+                    | self.await_signal(sender=self, signal_label=SIGNAL_NSTK_BUFFER)
+                    | self.await_signal(
+                        sender=processor, signal_label=SIGNAL_MEMORY_ALLOCATED
+                    )
+                    | queue.await_comm()
+                )
+                continue
+
+            phys_id = result.logical_qubit_id
+            if phys_id in self._reserved:
+                self._reserved.remove(phys_id)
+            elif queue.swap_pending_comm(self._reserved, phys_id):
+                # The pair arrived in a qubit allocated for a request's pair.
+                pass
+            elif not memory.is_allocated(phys_id) and len(self._reserved) > 0:
+                # The pair arrived in another free qubit, which is reserved instead.
+                memory.allocate_id(phys_id)
+                memory.free(self._reserved.pop())
+            else:
+                raise RuntimeError(
+                    f"EGP delivered a buffered pair in qubit {phys_id}, which was "
+                    f"not reserved for the buffer (reserved: {self._reserved})"
+                )
+            self._pairs.append(BufferedPair(phys_id, result, ns.sim_time()))
+            self.send_signal(SIGNAL_NSTK_BUFFER)
 
 
 class Netstack(ComponentProtocol):
@@ -131,32 +832,159 @@ class Netstack(ComponentProtocol):
             "processor",
             PortListener(self._comp.processor_in_port, SIGNAL_PROC_NSTK_MSG),
         )
-        self.add_listener(
-            "peer",
-            PortListener(self._comp.peer_in_port, SIGNAL_PEER_NSTK_MSG),
-        )
 
-        self._egp: Optional[EgpProtocol] = None
+        self._egps: Dict[Optional[int], EgpProtocol] = {}  # remote node ID -> EGP
+        # Listeners for the results of each EGP, by result type name.
+        self._egp_listeners: Dict[Optional[int], Dict[str, EgpResultListener]] = {}
+
+        # ID of the next request that is announced to a peer.
+        self._next_request_id = 0
+
+        # Templates of the Bell state corrections, by Bell index.
+        self._programs = QuantumProgramCache()
         self._epr_sockets: Dict[int, List[EprSocket]] = {}  # app ID -> [socket]
 
-    def assign_ll_protocol(self, prot: MagicLinkLayerProtocolWithSignaling) -> None:
+        # Array slices the processor is waiting for, by app ID and array address.
+        self._array_watches: Dict[Tuple[int, int], ArrayWatch] = {}
+
+        self._max_pairs_in_flight: Optional[int] = 1
+
+        # Request queues, by remote node ID. Created when this protocol is started.
+        self._queues: Dict[int, PeerRequestQueue] = {}
+        self._scheduling_policy = SchedulingPolicy()
+
+        # Entanglement buffers, by remote node ID.
+        self._buffers: Dict[int, EntanglementBuffer] = {}
+
+    def assign_ll_protocol(
+        self, prot: MagicLinkLayerProtocolWithSignaling, remote_id: Optional[int] = None
+    ) -> None:
         """Set the magic link layer protocol that this network stack uses to produce
-        entangled pairs with the remote node.
+        entangled pairs with a remote node.
 
         :param prot: link layer protocol instance
+        :param remote_id: ID of the remote node at the other end of the link. If
+            None, the protocol is used for all remote nodes that do not have a link
+            layer protocol of their own.
+        """
+        egp = EgpProtocol(self._comp.node, prot)
+        self._egps[remote_id] = egp
+        self._egp_listeners[remote_id] = {
+            typ.__name__: EgpResultListener(egp, typ)
+            for typ in [ResCreateAndKeep, ResMeasureDirectly]
+        }
+
+    def _get_egp_key(self, remote_id: int) -> Optional[int]:
+        """Get the key of the EGP with a remote node in `_egps`."""
+        if remote_id in self._egps:
+            return remote_id
+        if None in self._egps:
+            return None
+        raise RuntimeError(
+            f"{self._comp.node.name} has no link with node with ID {remote_id}"
+        )
+
+    def _get_egp(self, remote_id: int) -> EgpProtocol:
+        """Get the EGP that produces entangled pairs with a remote node."""
+        return self._egps[self._get_egp_key(remote_id)]
+
+    def _get_egp_listener(self, remote_id: int, result_type: Type) -> EgpResultListener:
+        return self._egp_listeners[self._get_egp_key(remote_id)][result_type.__name__]
+
+    def _poll_egp_result(
+        self, remote_id: int, result_type: Type, purpose_id: Optional[int] = None
+    ) -> Optional[Any]:
+        """Take the oldest result of a given type from the EGP with a remote node,
+        or return None if there is no such result.
+
+        :param remote_id: ID of the remote node
+        :param result_type: type of the result, e.g. `ResCreateAndKeep`
+        :param purpose_id: if given, only take a result with this purpose ID
         """
-        self._egp = EgpProtocol(self._comp.node, prot)
+        listener = self._get_egp_listener(remote_id, result_type)
+        for i, result in enumerate(listener.buffer):
+            if purpose_id is None or result.purpose_id == purpose_id:
+                return listener.buffer.pop(i)
+        return None
+
+    def _await_egp_result(self, remote_id: int, result_type: Type) -> EventExpression:
+        """Event expression for waiting until the EGP with a remote node delivers
+        the next result of a given type."""
+        return self.await_signal(
+            sender=self._get_egp_listener(remote_id, result_type),
+            signal_label=result_type.__name__,
+        )
 
-    def open_epr_socket(self, app_id: int, socket_id: int, remote_node_id: int) -> None:
+    def _receive_egp_result(
+        self, remote_id: int, result_type: Type, purpose_id: Optional[int] = None
+    ) -> Generator[EventExpression, None, Any]:
+        """Receive the next result of a given type from the EGP with a remote node.
+        Block until there is such a result.
+
+        :param remote_id: ID of the remote node
+        :param result_type: type of the result, e.g. `ResCreateAndKeep`
+        :param purpose_id: if given, receive the oldest result with this purpose
+            ID. Other results are kept for later.
+        """
+        while True:
+            result = self._poll_egp_result(remote_id, result_type, purpose_id)
+            if result is not None:
+                return result
+            yield self._await_egp_result(remote_id, result_type)
+
+    def open_epr_socket(
+        self,
+        app_id: int,
+        socket_id: int,
+        remote_node_id: int,
+        remote_socket_id: int = 0,
+    ) -> None:
         """Create a new EPR socket with the specified remote node.
 
         :param app_id: ID of the application that creates this EPR socket
         :param socket_id: ID of the socket
         :param remote_node_id: ID of the remote node
+        :param remote_socket_id: ID of the socket of the remote node that this
+            socket shares pairs with
         """
         if app_id not in self._epr_sockets:
             self._epr_sockets[app_id] = []
-        self._epr_sockets[app_id].append(EprSocket(socket_id, remote_node_id))
+        self._epr_sockets[app_id].append(
+            EprSocket(socket_id, remote_node_id, remote_socket_id)
+        )
+
+    def enable_buffer(
+        self, remote_id: int, size: int, max_age: Optional[float] = None
+    ) -> None:
+        """Keep entangled pairs with a remote node buffered, such that Create and
+        Keep requests with that node are served without waiting for the link. The
+        buffer must be enabled on both nodes, before they are started, and needs
+        at least two communication qubits, since one is always left free. See
+        `EntanglementBuffer`.
+
+        :param remote_id: ID of the remote node
+        :param size: number of pairs to keep buffered
+        :param max_age: age (in nanoseconds) after which a buffered pair is
+            discarded instead of handed out, or None if pairs are never discarded
+        """
+        if size < 1:
+            raise ValueError("buffer size must be at least 1")
+        if self.physical_memory.comm_qubit_count < 2:
+            raise ValueError("buffering pairs needs at least 2 communication qubits")
+        self._buffers[remote_id] = EntanglementBuffer(self, remote_id, size, max_age)
+
+    def get_buffer(self, remote_id: int) -> Optional[EntanglementBuffer]:
+        """Get the entanglement buffer with a remote node, or None if pairs with
+        the node are not buffered."""
+        return self._buffers.get(remote_id)
+
+    def _get_queue(self, remote_id: int) -> PeerRequestQueue:
+        """Get the queue of the requests with a remote node."""
+        if remote_id not in self._queues:
+            raise RuntimeError(
+                f"{self._comp.node.name} has no link with node with ID {remote_id}"
+            )
+        return self._queues[remote_id]
 
     def _send_processor_msg(self, msg: str) -> None:
         """Send a message to the processor."""
@@ -167,44 +995,181 @@ class Netstack(ComponentProtocol):
         message."""
         return (yield from self._receive_msg("processor", SIGNAL_PROC_NSTK_MSG))
 
-    def _send_peer_msg(self, msg: str) -> None:
-        """Send a message to the network stack of the other node.
-
-        NOTE: for now we assume there is only one other node, which is 'the' peer."""
-        self._comp.peer_out_port.tx_output(msg)
+    def _get_peer(self, remote_id: Optional[int]) -> str:
+        """Get the name of a peer node. If `remote_id` is None, there must be
+        exactly one peer."""
+        if remote_id is None:
+            if len(self._comp.peers) != 1:
+                raise ValueError(
+                    f"{self._comp.name} has {len(self._comp.peers)} peers, "
+                    "so the remote node must be specified"
+                )
+            return next(iter(self._comp.peers.values()))
+        return self._comp.peers[remote_id]
+
+    def _send_peer_msg(self, msg: str, remote_id: Optional[int] = None) -> None:
+        """Send a message to the network stack of a peer node.
+
+        :param msg: message to send
+        :param remote_id: ID of the peer node. May be omitted if there is only one
+        """
+        self._comp.get_peer_out_port(self._get_peer(remote_id)).tx_output(msg)
 
-    def _receive_peer_msg(self) -> Generator[EventExpression, None, str]:
-        """Receive a message from the network stack of the other node. Block until
+    def _receive_peer_msg(
+        self,
+        remote_id: Optional[int] = None,
+        match: Optional[Callable[[Any], bool]] = None,
+    ) -> Generator[EventExpression, None, Any]:
+        """Receive a message from the network stack of a peer node. Block until
         there is at least one message.
 
-        NOTE: for now we assume there is only one other node, which is 'the' peer."""
-        return (yield from self._receive_msg("peer", SIGNAL_PEER_NSTK_MSG))
+        :param remote_id: ID of the peer node. May be omitted if there is only one
+        :param match: if given, receive the oldest message for which `match` is
+            True, and block until there is such a message. Other messages are kept
+            for later.
+        """
+        peer = self._get_peer(remote_id)
+        if match is None:
+            return (yield from self._receive_msg(f"peer_{peer}", SIGNAL_PEER_NSTK_MSG))
+
+        while True:
+            msg = self._poll_peer_msg(remote_id, match)
+            if msg is not None:
+                return msg
+            yield self._await_peer_msg(remote_id)
+
+    def _poll_peer_msg(
+        self, remote_id: Optional[int], match: Callable[[Any], bool]
+    ) -> Optional[Any]:
+        """Take the oldest message from the network stack of a peer node for which
+        `match` is True, or return None if there is no such message."""
+        listener = self._listeners[f"peer_{self._get_peer(remote_id)}"]
+        for i, msg in enumerate(listener.buffer):
+            if match(msg):
+                return listener.buffer.pop(i)
+        return None
+
+    def _await_peer_msg(self, remote_id: Optional[int]) -> EventExpression:
+        """Event expression for waiting until the network stack of a peer node
+        sends the next message."""
+        listener = self._listeners[f"peer_{self._get_peer(remote_id)}"]
+        return self.await_signal(sender=listener, signal_label=SIGNAL_PEER_NSTK_MSG)
 
     def start(self) -> None:
         """Start this protocol. The NetSquid simulator will call and yield on the
-        `run` method. Also start the underlying EGP protocol."""
+        `run` method. Also start the underlying EGP protocols."""
+        # Peer ports may have been added after this protocol was created.
+        for peer in self._comp.peers.values():
+            if f"peer_{peer}" not in self._listeners:
+                self.add_listener(
+                    f"peer_{peer}",
+                    PortListener(
+                        self._comp.get_peer_in_port(peer), SIGNAL_PEER_NSTK_MSG
+                    ),
+                )
+        for remote_id in self._comp.peers:
+            if remote_id not in self._queues:
+                self._queues[remote_id] = PeerRequestQueue(self, remote_id)
         super().start()
-        if self._egp:
-            self._egp.start()
+        for egp in self._egps.values():
+            egp.start()
+        for listeners in self._egp_listeners.values():
+            for listener in listeners.values():
+                listener.start()
+        for remote_id, queue in self._queues.items():
+            Profiler.instrument(queue, f"{self.name}.peer_{remote_id}")
+            queue.start()
+        for remote_id, buffer in self._buffers.items():
+            Profiler.instrument(buffer, f"{self.name}.buffer_{remote_id}")
+            buffer.start()
 
     def stop(self) -> None:
         """Stop this protocol. The NetSquid simulator will stop calling `run`.
-        Also stop the underlying EGP protocol."""
-        if self._egp:
-            self._egp.stop()
+        Also stop the underlying EGP protocols."""
+        for queue in self._queues.values():
+            queue.stop()
+        for buffer in self._buffers.values():
+            buffer.stop()
+        for listeners in self._egp_listeners.values():
+            for listener in listeners.values():
+                listener.stop()
+        for egp in self._egps.values():
+            egp.stop()
         super().stop()
 
+    def reset_state(self) -> None:
+        super().reset_state()
+        self._epr_sockets = {}
+        self._array_watches = {}
+        for queue in self._queues.values():
+            queue.clear()
+        for buffer in self._buffers.values():
+            buffer.clear()
+        for listeners in self._egp_listeners.values():
+            for listener in listeners.values():
+                listener.clear_buffer()
+        self._next_request_id = 0
+
+    def watch_array(self, app_id: int, addr: int, start: int, end: int) -> bool:
+        """Watch a slice of an array until all of its entries are defined.
+
+        If entries are still undefined, a single "wrote to array" message is sent
+        to the processor as soon as the netstack has written the last of them.
+        Only one slice per array can be watched at a time.
+
+        :param app_id: ID of the application the array belongs to
+        :param addr: address of the array
+        :param start: index of the first entry of the slice
+        :param end: index after the last entry of the slice
+        :return: whether all entries are already defined, in which case no
+            message is sent
+        """
+        values = self.app_memories[app_id].get_array_values(addr, start, end)
+        remaining = sum(1 for v in values if v is None)
+        if remaining == 0:
+            return True
+        self._array_watches[(app_id, addr)] = ArrayWatch(start, end, remaining)
+        return False
+
+    def is_watching(self, app_id: int, addr: int) -> bool:
+        """Whether a slice of an array is watched that is not yet fully written,
+        see `watch_array`."""
+        return (app_id, addr) in self._array_watches
+
+    def _write_array_values(
+        self, app_id: int, addr: int, start: int, values: List[int]
+    ) -> None:
+        """Write values to consecutive entries of an array, starting at index
+        `start`, and notify the processor if this completes a watched slice."""
+        app_mem = self.app_memories[app_id]
+        watch = self._array_watches.get((app_id, addr))
+        for index, value in enumerate(values, start):
+            if (
+                watch is not None
+                and watch.start <= index < watch.end
+                and app_mem.get_array_value(addr, index) is None
+            ):
+                watch.remaining -= 1
+            app_mem.set_array_value(addr, index, value)
+
+        if watch is not None and watch.remaining == 0:
+            del self._array_watches[(app_id, addr)]
+            self._send_processor_msg("wrote to array")
+
     def _read_request_args_array(self, app_id: int, array_addr: int) -> List[int]:
         app_mem = self.app_memories[app_id]
         app_mem.get_array(array_addr)
         return app_mem.get_array(array_addr)
 
-    def _construct_request(self, remote_id: int, args: List[int]) -> ReqCreateBase:
+    def _construct_request(
+        self, remote_id: int, args: List[int], purpose_id: int = 0
+    ) -> ReqCreateBase:
         """Construct a link layer request from application request info.
 
         :param remote_id: ID of remote node
         :param args: NetQASM array elements from the arguments array specified by the
             application
+        :param purpose_id: purpose ID of the request, see `get_purpose_id`
         :return: link layer request object
         """
         typ = args[SER_CREATE_IDX_TYPE]
@@ -218,18 +1183,21 @@ class Netstack(ComponentProtocol):
         if typ == 0:
             request = ReqCreateAndKeep(
                 remote_node_id=remote_id,
+                purpose_id=purpose_id,
                 number=num_pairs,
                 minimum_fidelity=MINIMUM_FIDELITY,
             )
         elif typ == 1:
             request = ReqMeasureDirectly(
                 remote_node_id=remote_id,
+                purpose_id=purpose_id,
                 number=num_pairs,
                 minimum_fidelity=MINIMUM_FIDELITY,
             )
         elif typ == 2:
             request = ReqRemoteStatePrep(
                 remote_node_id=remote_id,
+                purpose_id=purpose_id,
                 number=num_pairs,
                 minimum_fidelity=MINIMUM_FIDELITY,
             )
@@ -249,6 +1217,52 @@ class Netstack(ComponentProtocol):
     def qdevice(self) -> QuantumProcessor:
         return self._comp.node.qdevice
 
+    @property
+    def max_pairs_in_flight(self) -> Optional[int]:
+        """Maximal number of single-pair Create and Keep requests of a single
+        application request that are outstanding at the EGP at the same time.
+
+        Each outstanding pair holds a communication qubit, so fewer pairs are in
+        flight if fewer communication qubits are free. If None, the number of
+        outstanding pairs is only limited by the free communication qubits.
+        Defaults to 1, i.e. the next pair is only requested after the previous pair
+        has been delivered.
+        """
+        return self._max_pairs_in_flight
+
+    @max_pairs_in_flight.setter
+    def max_pairs_in_flight(self, max_pairs: Optional[int]) -> None:
+        if max_pairs is not None and max_pairs < 1:
+            raise ValueError("max_pairs_in_flight must be at least 1 or None")
+        self._max_pairs_in_flight = max_pairs
+
+    @property
+    def scheduling_policy(self) -> SchedulingPolicy:
+        """Policy deciding which of the outstanding requests with a remote node is
+        handled next. Defaults to handling requests in the order in which they were
+        issued."""
+        return self._scheduling_policy
+
+    @scheduling_policy.setter
+    def scheduling_policy(self, policy: SchedulingPolicy) -> None:
+        self._scheduling_policy = policy
+
+    def get_outstanding_requests(self, remote_id: int) -> List[NetstackRequest]:
+        """Get the requests with a remote node that have not been handled yet,
+        oldest first. Requests that are being handled are not included."""
+        return list(self._get_queue(remote_id).requests)
+
+    def get_purpose_id(self, req: NetstackRequest) -> int:
+        """Get the purpose ID of the link layer requests of a request, which is the
+        ID of the EPR socket of the node that creates the pairs. It is the same on
+        both nodes, and tells the requests of different pairs of EPR sockets with
+        the same remote node apart."""
+        if isinstance(req, NetstackCreateRequest):
+            return req.epr_socket_id
+        socket = self.find_epr_socket(req.app_id, req.epr_socket_id, req.remote_node_id)
+        assert socket is not None
+        return socket.remote_socket_id
+
     def find_epr_socket(
         self, app_id: int, sck_id: int, rem_id: int
     ) -> Optional[EprSocket]:
@@ -266,6 +1280,158 @@ class Netstack(ComponentProtocol):
                 return sck
         return None
 
+    def _allocate_comm(
+        self, req: NetstackRequest
+    ) -> Generator[EventExpression, None, int]:
+        """Allocate a communication qubit for a pair of a request, and block until
+        one is free. See `PeerRequestQueue.allocate_comm`."""
+        queue = self._get_queue(req.remote_node_id)
+        while True:
+            phys_id = queue.allocate_comm(req)
+            if phys_id is not None:
+                return phys_id
+            self._logger.info("no comm qubit available, waiting...")
+            yield queue.await_comm()
+
+    def _create_ck_pairs(
+        self,
+        req: NetstackRequest,
+        purpose_id: int,
+        num_pairs: int,
+        put: Callable[[], None],
+        deliver: Callable[
+            [int, int, ResCreateAndKeep], Generator[EventExpression, None, None]
+        ],
+    ) -> Generator[EventExpression, None, None]:
+        """Produce Create and Keep pairs one single-pair request at a time, keeping
+        up to `max_pairs_in_flight` requests outstanding at the EGP.
+
+        A communication qubit is allocated for each pair before its request is put
+        to the EGP, see `PeerRequestQueue.allocate_comm`. Results are delivered in
+        the order in which the EGP produces them.
+
+        :param req: request the pairs are produced for
+        :param purpose_id: purpose ID of the single-pair requests, by which the
+            results of the EGP are matched with the request
+        :param num_pairs: number of pairs to produce
+        :param put: function putting a single-pair request to the EGP
+        :param deliver: generator function handling a produced pair, given the pair
+            index, the physical qubit holding the pair and the EGP result
+        """
+        remote_id = req.remote_node_id
+        queue = self._get_queue(remote_id)
+        # Allocated comm qubits, in order of the requests. Shared with the other
+        # requests with the remote node, see `PeerRequestQueue.take_pending_comm`.
+        pending = queue.get_pending_comm(purpose_id)
+        delivered = 0
+        while delivered < num_pairs:
+            while delivered + len(pending) < num_pairs and (
+                self._max_pairs_in_flight is None
+                or len(pending) < self._max_pairs_in_flight
+            ):
+                pair_index = delivered + len(pending)
+                self._logger.info(
+                    f"trying to allocate comm qubit for pair {pair_index}"
+                )
+                phys_id = queue.allocate_comm(req)
+                if phys_id is None:
+                    break
+                pending.append(phys_id)
+                self._logger.info(f"putting CK request for pair {pair_index}")
+                put()
+
+            result: Optional[ResCreateAndKeep] = self._poll_egp_result(
+                remote_id, ResCreateAndKeep, purpose_id
+            )
+            if result is None:
+                self._logger.info(f"waiting for result for pair {delivered}")
+                if len(pending) == 0:
+                    # Wait for a signal indicating the communication qubit might be
+                    # free again. A receiving node may also get the pair before it
+                    # has a qubit for it.
+                    self._logger.info("no comm qubit available, waiting...")
+                    yield queue.await_comm() | self._await_egp_result(
+                        remote_id, ResCreateAndKeep
+                    )
+                else:
+                    yield self._await_egp_result(remote_id, ResCreateAndKeep)
+                continue
+            self._logger.info(f"got result for pair {delivered}: {result}")
+
+            phys_id = result.logical_qubit_id
+            queue.take_pending_comm(req, purpose_id, phys_id)
+
+            yield from deliver(delivered, phys_id, result)
+            delivered += 1
+
+        queue.release_comm(req, purpose_id)
+
+    def _correct_bell_state(
+        self, egp: EgpProtocol, phys_id: int, result: ResCreateAndKeep
+    ) -> Generator[EventExpression, None, None]:
+        """Apply local gates to the qubit holding a produced pair, such that the
+        pair is in the Phi+ state."""
+        # This code is commented out for a hotfix as it was found that heralded link did not return
+        # Phi+ bell state. The issue needs to be investigated.
+        if isinstance(egp._ll_prot._magic_distributor, DoubleClickMagicDistributor):
+            return
+        # Bell state corrections. Resulting state is always Phi+ (i.e. B00).
+        if result.bell_state == BellIndex.B00:
+            return
+        prog = self._programs.get(
+            result.bell_state, lambda: _build_bell_correction(result.bell_state)
+        )
+        # Pairs with other remote nodes may be corrected at the same time.
+        while self.qdevice.busy:
+            yield self.await_program(self.qdevice)
+        yield self.qdevice.execute_program(prog, qubit_mapping=[phys_id])
+
+    def _deliver_ck_pair(
+        self,
+        req: Union[NetstackCreateRequest, NetstackReceiveRequest],
+        pair_index: int,
+        phys_id: int,
+        result: ResCreateAndKeep,
+        start_time: float,
+    ) -> None:
+        """Map the virtual qubit of a produced Create and Keep pair to the physical
+        qubit holding it, and write the result of the pair to the result array."""
+        app_mem = self.app_memories[req.app_id]
+        virt_id = app_mem.get_array_value(req.qubit_array_addr, pair_index)
+        app_mem.map_virt_id(virt_id, phys_id)
+        self._logger.info(
+            f"mapping virtual qubit {virt_id} to physical qubit {phys_id}"
+        )
+
+        gen_duration_ns_float = ns.sim_time() - start_time
+        gen_duration_us_int = int(gen_duration_ns_float / 1000)
+        self._logger.info(f"gen duration (us): {gen_duration_us_int}")
+
+        # Length of response array slice for a single pair.
+        slice_len = SER_RESPONSE_KEEP_LEN
+
+        # Populate results array.
+        values = []
+        for i in range(slice_len):
+            # Write -1 to unused array elements.
+            value = -1
+
+            # Write corresponding result value to the other array elements.
+            if i == SER_RESPONSE_KEEP_IDX_GOODNESS:
+                value = gen_duration_us_int
+            if i == SER_RESPONSE_KEEP_IDX_BELL_STATE:
+                value = result.bell_state.value
+
+            values.append(value)
+
+        self._write_array_values(
+            req.app_id, req.result_array_addr, slice_len * pair_index, values
+        )
+        self._logger.debug(
+            f"wrote to @{req.result_array_addr}[{slice_len * pair_index}:"
+            f"{slice_len * pair_index + slice_len}] for app ID {req.app_id}"
+        )
+
     def handle_create_ck_request(
         self, req: NetstackCreateRequest, request: ReqCreateAndKeep
     ) -> Generator[EventExpression, None, None]:
@@ -278,6 +1444,9 @@ class Netstack(ComponentProtocol):
         local gates are applied to do a correction, such that the final
         delivered pair is always Phi+.
 
+        The request is split into single-pair requests, of which up to
+        `max_pairs_in_flight` are outstanding at the EGP at the same time.
+
         The method can however yield (i.e. give control back to the simulator
         scheduler) in the following cases: - no communication qubit is
         available; this method will resume when a
@@ -293,6 +1462,7 @@ class Netstack(ComponentProtocol):
         :param req: application request info (app ID and NetQASM array IDs)
         :param request: link layer request object
         """
+        egp = self._get_egp(req.remote_node_id)
         num_pairs = request.number
 
         app_mem = self.app_memories[req.app_id]
@@ -301,99 +1471,66 @@ class Netstack(ComponentProtocol):
         self._logger.info(f"putting CK request to EGP for {num_pairs} pairs")
         self._logger.info(f"qubit IDs specified by application: {qubit_ids}")
         self._logger.info(f"splitting request into {num_pairs} 1-pair requests")
-        request.number = 1
+        # The request object is shared with the remote node, so it is not modified.
+        single_pair_request = dataclasses.replace(request, number=1)
 
         start_time = ns.sim_time()
 
-        for pair_index in range(num_pairs):
-            self._logger.info(f"trying to allocate comm qubit for pair {pair_index}")
-            while True:
-                try:
-                    phys_id = self.physical_memory.allocate_comm()
-                    break
-                except AllocError:
-                    self._logger.info("no comm qubit available, waiting...")
-
-                    # Wait for a signal indicating the communication qubit might be free
-                    # again.
-                    yield self.await_signal(
-                        sender=self._qnos.processor, signal_label=SIGNAL_MEMORY_FREED
-                    )
-                    self._logger.info(
-                        "a 'free' happened, trying again to allocate comm qubit..."
-                    )
-
-            # Put the request to the EGP.
-            self._logger.info(f"putting CK request for pair {pair_index}")
-            self._egp.put(request)
-
-            # Wait for a signal from the EGP.
-            self._logger.info(f"waiting for result for pair {pair_index}")
-            yield self.await_signal(
-                sender=self._egp, signal_label=ResCreateAndKeep.__name__
-            )
-            # Get the EGP's result.
-            result: ResCreateAndKeep = self._egp.get_signal_result(
-                ResCreateAndKeep.__name__, receiver=self
-            )
-            self._logger.info(f"got result for pair {pair_index}: {result}")
-
-            # This code is commented out for a hotfix as it was found that heralded link did not return
-            # Phi+ bell state. The issue needs to be investigated.
-            if isinstance(
-                self._egp._ll_prot._magic_distributor, DoubleClickMagicDistributor
-            ):
-                pass
-            # Bell state corrections. Resulting state is always Phi+ (i.e. B00).
-            elif result.bell_state == BellIndex.B00:
-                pass
-            elif result.bell_state == BellIndex.B01:
-                prog = QuantumProgram()
-                prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=PI)
-                yield self.qdevice.execute_program(prog)
-            elif result.bell_state == BellIndex.B10:
-                prog = QuantumProgram()
-                prog.apply(INSTR_ROT_Z, qubit_indices=[0], angle=PI)
-                yield self.qdevice.execute_program(prog)
-            elif result.bell_state == BellIndex.B11:
-                prog = QuantumProgram()
-                prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=PI)
-                prog.apply(INSTR_ROT_Z, qubit_indices=[0], angle=PI)
-                yield self.qdevice.execute_program(prog)
-
-            virt_id = app_mem.get_array_value(req.qubit_array_addr, pair_index)
-            app_mem.map_virt_id(virt_id, phys_id)
-            self._logger.info(
-                f"mapping virtual qubit {virt_id} to physical qubit {phys_id}"
-            )
-
-            gen_duration_ns_float = ns.sim_time() - start_time
-            gen_duration_us_int = int(gen_duration_ns_float / 1000)
-            self._logger.info(f"gen duration (us): {gen_duration_us_int}")
+        def deliver(
+            pair_index: int, phys_id: int, result: ResCreateAndKeep
+        ) -> Generator[EventExpression, None, None]:
+            yield from self._correct_bell_state(egp, phys_id, result)
+            self._deliver_ck_pair(req, pair_index, phys_id, result, start_time)
+
+        yield from self._create_ck_pairs(
+            req,
+            request.purpose_id,
+            num_pairs,
+            lambda: egp.put(single_pair_request),
+            deliver,
+        )
 
-            # Length of response array slice for a single pair.
-            slice_len = SER_RESPONSE_KEEP_LEN
+    def handle_buffered_create_ck_request(
+        self,
+        req: NetstackCreateRequest,
+        request: ReqCreateAndKeep,
+        buffer: EntanglementBuffer,
+        request_id: int,
+    ) -> Generator[EventExpression, None, None]:
+        """Handle a Create and Keep request as the initiator/creator by handing out
+        buffered pairs, until all pairs have been delivered.
 
-            # Populate results array.
-            for i in range(slice_len):
-                # Write -1 to unused array elements.
-                value = -1
+        Stale pairs are discarded first. For each batch of pairs that is handed
+        out, the remote node is told which pairs it should hand to its receive
+        request. This method yields when no pair is buffered, until the next pair
+        has been generated.
 
-                # Write corresponding result value to the other array elements.
-                if i == SER_RESPONSE_KEEP_IDX_GOODNESS:
-                    value = gen_duration_us_int
-                if i == SER_RESPONSE_KEEP_IDX_BELL_STATE:
-                    value = result.bell_state
-
-                # Calculate array element location.
-                arr_index = slice_len * pair_index + i
-
-                app_mem.set_array_value(req.result_array_addr, arr_index, value)
-            self._logger.debug(
-                f"wrote to @{req.result_array_addr}[{slice_len * pair_index}:"
-                f"{slice_len * pair_index + slice_len}] for app ID {req.app_id}"
+        :param req: application request info (app ID and NetQASM array IDs)
+        :param request: link layer request object
+        :param buffer: buffer of pairs with the remote node
+        :param request_id: ID under which the request was announced to the remote
+            node
+        """
+        start_time = ns.sim_time()
+        delivered = 0
+        while delivered < request.number:
+            buffer.discard_stale()
+            if len(buffer.pairs) == 0:
+                self._logger.info("entanglement buffer empty, waiting...")
+                yield self.await_signal(sender=buffer, signal_label=SIGNAL_NSTK_BUFFER)
+                continue
+
+            pairs = buffer.take(request.number - delivered)
+            self._send_peer_msg(
+                BufferedPairs(request_id, [pair.key for pair in pairs]),
+                req.remote_node_id,
             )
-            self._send_processor_msg("wrote to array")
+            for pair in pairs:
+                self._logger.info(f"handing out buffered pair {pair.key}")
+                self._deliver_ck_pair(
+                    req, delivered, pair.phys_id, pair.result, start_time
+                )
+                delivered += 1
 
     def handle_create_md_request(
         self, req: NetstackCreateRequest, request: ReqMeasureDirectly
@@ -421,9 +1558,10 @@ class Netstack(ComponentProtocol):
         :param req: application request info (app ID and NetQASM array IDs)
         :param request: link layer request object
         """
+        egp = self._get_egp(req.remote_node_id)
 
         # Put the reqeust to the EGP.
-        self._egp.put(request)
+        egp.put(request)
 
         results: List[ResMeasureDirectly] = []
 
@@ -433,24 +1571,20 @@ class Netstack(ComponentProtocol):
         # expected to finish in a short time anyway. However, writing results for a
         # pair as soon as they are done may be implemented in the future.
         for _ in range(request.number):
-            phys_id = self.physical_memory.allocate_comm()
+            phys_id = yield from self._allocate_comm(req)
 
-            yield self.await_signal(
-                sender=self._egp, signal_label=ResMeasureDirectly.__name__
-            )
-            result: ResMeasureDirectly = self._egp.get_signal_result(
-                ResMeasureDirectly.__name__, receiver=self
+            result: ResMeasureDirectly = yield from self._receive_egp_result(
+                req.remote_node_id, ResMeasureDirectly, request.purpose_id
             )
             self._logger.debug(f"bell index: {result.bell_state}")
             results.append(result)
             self.physical_memory.free(phys_id)
 
-        app_mem = self.app_memories[req.app_id]
-
         # Length of response array slice for a single pair.
         slice_len = SER_RESPONSE_MEASURE_LEN
 
         # Populate results array.
+        values = []
         for pair_index in range(request.number):
             result = results[pair_index]
 
@@ -466,12 +1600,9 @@ class Netstack(ComponentProtocol):
                 elif i == SER_RESPONSE_KEEP_IDX_BELL_STATE:
                     value = result.bell_state.value
 
-                # Calculate array element location.
-                arr_index = slice_len * pair_index + i
+                values.append(value)
 
-                app_mem.set_array_value(req.result_array_addr, arr_index, value)
-
-        self._send_processor_msg("wrote to array")
+        self._write_array_values(req.app_id, req.result_array_addr, 0, values)
 
     def handle_create_request(
         self, req: NetstackCreateRequest
@@ -491,15 +1622,35 @@ class Netstack(ComponentProtocol):
         args = self._read_request_args_array(req.app_id, req.arg_array_addr)
 
         # Create the link layer request object.
-        request = self._construct_request(req.remote_node_id, args)
+        request = self._construct_request(
+            req.remote_node_id, args, self.get_purpose_id(req)
+        )
 
-        # Send it to the receiver node and wait for an acknowledgement.
-        self._send_peer_msg(request)
-        peer_msg = yield from self._receive_peer_msg()
-        self._logger.debug(f"received peer msg: {peer_msg}")
+        # Announce it to the receiver node.
+        request_id = self._next_request_id
+        self._next_request_id += 1
+        self._send_peer_msg(
+            PeerCreateRequest(request_id, req.app_id, req.epr_socket_id, request),
+            req.remote_node_id,
+        )
+
+        # Wait for the acknowledgement of the receiver node, which handles its
+        # receive request (and puts it to its EGP) before acknowledging. Hence
+        # our request never reaches the EGP before the receive request does,
+        # whichever link layer is used.
+        ack = yield from self._receive_peer_msg(
+            req.remote_node_id,
+            lambda msg: isinstance(msg, PeerAck) and msg.request_id == request_id,
+        )
+        self._logger.debug(f"received peer msg: {ack}")
 
         # Handle the request.
-        if isinstance(request, ReqCreateAndKeep):
+        buffer = self._buffers.get(req.remote_node_id)
+        if isinstance(request, ReqCreateAndKeep) and buffer is not None:
+            yield from self.handle_buffered_create_ck_request(
+                req, request, buffer, request_id
+            )
+        elif isinstance(request, ReqCreateAndKeep):
             yield from self.handle_create_ck_request(req, request)
         elif isinstance(request, ReqMeasureDirectly):
             yield from self.handle_create_md_request(req, request)
@@ -531,6 +1682,7 @@ class Netstack(ComponentProtocol):
         :param req: application request info (app ID and NetQASM array IDs)
         :param request: link layer request object
         """
+        egp = self._get_egp(req.remote_node_id)
         assert isinstance(request, ReqCreateAndKeep)
 
         num_pairs = request.number
@@ -540,72 +1692,60 @@ class Netstack(ComponentProtocol):
 
         start_time = ns.sim_time()
 
-        for pair_index in range(num_pairs):
-            self._logger.info(f"trying to allocate comm qubit for pair {pair_index}")
-            while True:
-                try:
-                    phys_id = self.physical_memory.allocate_comm()
-                    break
-                except AllocError:
-                    self._logger.info("no comm qubit available, waiting...")
+        def deliver(
+            pair_index: int, phys_id: int, result: ResCreateAndKeep
+        ) -> Generator[EventExpression, None, None]:
+            self._deliver_ck_pair(req, pair_index, phys_id, result, start_time)
+            return
+            yield
 
-                    # Wait for a signal indicating the communication qubit might be free
-                    # again.
-                    yield self.await_signal(
-                        sender=self._qnos.processor, signal_label=SIGNAL_MEMORY_FREED
-                    )
-                    self._logger.info(
-                        "a 'free' happened, trying again to allocate comm qubit..."
-                    )
+        receive_request = ReqReceive(
+            remote_node_id=req.remote_node_id, purpose_id=request.purpose_id
+        )
+        yield from self._create_ck_pairs(
+            req,
+            request.purpose_id,
+            num_pairs,
+            lambda: egp.put(receive_request),
+            deliver,
+        )
 
-            # Put the request to the EGP.
-            self._logger.info(f"putting CK request for pair {pair_index}")
-            self._egp.put(ReqReceive(remote_node_id=req.remote_node_id))
-            self._logger.info(f"waiting for result for pair {pair_index}")
+    def handle_buffered_receive_ck_request(
+        self,
+        req: NetstackReceiveRequest,
+        request: ReqCreateAndKeep,
+        buffer: EntanglementBuffer,
+        request_id: int,
+    ) -> Generator[EventExpression, None, None]:
+        """Handle a Create and Keep request as the receiver by handing out the
+        buffered pairs chosen by the remote node, until all pairs have been
+        delivered.
 
-            # Wait for a signal from the EGP.
-            yield self.await_signal(
-                sender=self._egp, signal_label=ResCreateAndKeep.__name__
-            )
-            # Get the EGP's result.
-            result: ResCreateAndKeep = self._egp.get_signal_result(
-                ResCreateAndKeep.__name__, receiver=self
-            )
-            self._logger.info(f"got result for pair {pair_index}: {result}")
+        This method yields when waiting for the remote node to tell which pairs to
+        hand out, and when these pairs have not yet arrived in the buffer.
 
-            app_mem = self.app_memories[req.app_id]
-            virt_id = app_mem.get_array_value(req.qubit_array_addr, pair_index)
-            app_mem.map_virt_id(virt_id, phys_id)
-            self._logger.info(
-                f"mapping virtual qubit {virt_id} to physical qubit {phys_id}"
+        :param req: application request info (app ID and NetQASM array IDs)
+        :param request: link layer request object
+        :param buffer: buffer of pairs with the remote node
+        :param request_id: ID under which the remote node announced the request
+        """
+        start_time = ns.sim_time()
+        delivered = 0
+        while delivered < request.number:
+            msg = yield from self._receive_peer_msg(
+                req.remote_node_id,
+                lambda msg: isinstance(msg, BufferedPairs)
+                and msg.request_id == request_id,
             )
+            while not buffer.has_pairs(msg.keys):
+                yield self.await_signal(sender=buffer, signal_label=SIGNAL_NSTK_BUFFER)
 
-            gen_duration_ns_float = ns.sim_time() - start_time
-            gen_duration_us_int = int(gen_duration_ns_float / 1000)
-            self._logger.info(f"gen duration (us): {gen_duration_us_int}")
-
-            # Length of response array slice for a single pair.
-            slice_len = SER_RESPONSE_KEEP_LEN
-
-            for i in range(slice_len):
-                # Write -1 to unused array elements.
-                value = -1
-
-                # Write corresponding result value to the other array elements.
-                if i == SER_RESPONSE_KEEP_IDX_GOODNESS:
-                    value = gen_duration_us_int
-                if i == SER_RESPONSE_KEEP_IDX_BELL_STATE:
-                    value = result.bell_state.value
-
-                # Calculate array element location.
-                arr_index = slice_len * pair_index + i
-
-                app_mem.set_array_value(req.result_array_addr, arr_index, value)
-            self._logger.debug(
-                f"wrote to @{req.result_array_addr}[{slice_len * pair_index}:"
-                f"{slice_len * pair_index + slice_len}] for app ID {req.app_id}"
-            )
-            self._send_processor_msg("wrote to array")
+            for pair in buffer.take_pairs(msg.keys):
+                self._logger.info(f"handing out buffered pair {pair.key}")
+                self._deliver_ck_pair(
+                    req, delivered, pair.phys_id, pair.result, start_time
+                )
+                delivered += 1
 
     def handle_receive_md_request(
         self, req: NetstackReceiveRequest, request: ReqMeasureDirectly
@@ -636,29 +1776,24 @@ class Netstack(ComponentProtocol):
         """
         assert isinstance(request, ReqMeasureDirectly)
 
-        self._egp.put(ReqReceive(remote_node_id=req.remote_node_id))
-
+        # The receive request was put to the EGP by `handle_receive_request`.
         results: List[ResMeasureDirectly] = []
 
         for _ in range(request.number):
-            phys_id = self.physical_memory.allocate_comm()
+            phys_id = yield from self._allocate_comm(req)
 
-            yield self.await_signal(
-                sender=self._egp, signal_label=ResMeasureDirectly.__name__
-            )
-            result: ResMeasureDirectly = self._egp.get_signal_result(
-                ResMeasureDirectly.__name__, receiver=self
+            result: ResMeasureDirectly = yield from self._receive_egp_result(
+                req.remote_node_id, ResMeasureDirectly, request.purpose_id
             )
             results.append(result)
 
             self.physical_memory.free(phys_id)
 
-        app_mem = self.app_memories[req.app_id]
-
         # Length of response array slice for a single pair.
         slice_len = SER_RESPONSE_MEASURE_LEN
 
         # Populate results array.
+        values = []
         for pair_index in range(request.number):
             result = results[pair_index]
 
@@ -674,12 +1809,9 @@ class Netstack(ComponentProtocol):
                 elif i == SER_RESPONSE_KEEP_IDX_BELL_STATE:
                     value = result.bell_state.value
 
-                # Calculate array element location.
-                arr_index = slice_len * pair_index + i
+                values.append(value)
 
-                app_mem.set_array_value(req.result_array_addr, arr_index, value)
-
-            self._send_processor_msg("wrote to array")
+        self._write_array_values(req.app_id, req.result_array_addr, 0, values)
 
     def handle_receive_request(
         self, req: NetstackReceiveRequest
@@ -690,28 +1822,42 @@ class Netstack(ComponentProtocol):
         """
 
         # EPR socket should exist.
-        assert (
-            self.find_epr_socket(req.app_id, req.epr_socket_id, req.remote_node_id)
-            is not None
-        )
+        socket = self.find_epr_socket(req.app_id, req.epr_socket_id, req.remote_node_id)
+        assert socket is not None
 
         # Wait for the network stack in the remote node to get the corresponding
-        # 'create' request from its local application and send it to us.
-        # NOTE: we do not check if the request from the other node matches our own
-        # request. Also, we simply block until synchronizing with the other node,
-        # and then fully handle the request. There is no support for queueing
-        # and/or interleaving multiple different requests.
-        create_request = yield from self._receive_peer_msg()
-        self._logger.debug(f"received {create_request} from peer")
-
-        # Acknowledge to the remote node that we received the request and we will
-        # start handling it.
-        self._logger.debug("sending 'ready' to peer")
-        self._send_peer_msg("ready")
+        # 'create' request from its local application and announce it to us. Only
+        # requests of the remote socket of our socket match; these are announced
+        # one at a time, in the order in which they are handled.
+        peer_request = yield from self._receive_peer_msg(
+            req.remote_node_id,
+            lambda msg: isinstance(msg, PeerCreateRequest)
+            and msg.epr_socket_id == socket.remote_socket_id,
+        )
+        self._logger.debug(f"received {peer_request} from peer")
+        create_request = peer_request.request
+
+        # Accept the pairs of the request at the EGP, unless they are taken from
+        # the entanglement buffer, and only then acknowledge to the remote node
+        # that we will handle the request. The remote node waits for this before
+        # it puts its request to the EGP.
+        buffer = self._buffers.get(req.remote_node_id)
+        if not (isinstance(create_request, ReqCreateAndKeep) and buffer is not None):
+            self._get_egp(req.remote_node_id).put(
+                ReqReceive(
+                    remote_node_id=req.remote_node_id,
+                    purpose_id=create_request.purpose_id,
+                )
+            )
+        self._send_peer_msg(PeerAck(peer_request.request_id), req.remote_node_id)
 
         # Handle the request, based on the type that we now know because of the
         # other node.
-        if isinstance(create_request, ReqCreateAndKeep):
+        if isinstance(create_request, ReqCreateAndKeep) and buffer is not None:
+            yield from self.handle_buffered_receive_ck_request(
+                req, create_request, buffer, peer_request.request_id
+            )
+        elif isinstance(create_request, ReqCreateAndKeep):
             yield from self.handle_receive_ck_request(req, create_request)
         elif isinstance(create_request, ReqMeasureDirectly):
             yield from self.handle_receive_md_request(req, create_request)
@@ -721,7 +1867,7 @@ class Netstack(ComponentProtocol):
     ) -> Generator[EventExpression, None, None]:
         # Synchronize with the remote node.
         self._send_peer_msg("breakpoint start")
-        response = yield from self._receive_peer_msg()
+        response = yield from self._receive_peer_msg(match=_is_breakpoint_msg)
         assert response == "breakpoint start"
 
         # Remote node is now ready. Notify the processor.
@@ -735,7 +1881,7 @@ class Netstack(ComponentProtocol):
         self._send_peer_msg("breakpoint end")
 
         # Wait for the remote node to have finsihed as well.
-        response = yield from self._receive_peer_msg()
+        response = yield from self._receive_peer_msg(match=_is_breakpoint_msg)
         assert response == "breakpoint end"
 
         # Notify the processor that we are done.
@@ -745,7 +1891,7 @@ class Netstack(ComponentProtocol):
         self,
     ) -> Generator[EventExpression, None, None]:
         # Synchronize with the remote node.
-        msg = yield from self._receive_peer_msg()
+        msg = yield from self._receive_peer_msg(match=_is_breakpoint_msg)
         assert msg == "breakpoint start"
         self._send_peer_msg("breakpoint start")
 
@@ -757,7 +1903,7 @@ class Netstack(ComponentProtocol):
         assert processor_msg == "breakpoint end"
 
         # Wait for the remote node to finish and tell it we are finished as well.
-        peer_msg = yield from self._receive_peer_msg()
+        peer_msg = yield from self._receive_peer_msg(match=_is_breakpoint_msg)
         assert peer_msg == "breakpoint end"
         self._send_peer_msg("breakpoint end")
 
@@ -771,13 +1917,10 @@ class Netstack(ComponentProtocol):
             msg = yield from self._receive_processor_msg()
             self._logger.debug(f"received new msg from processor: {msg}")
 
-            # Handle it.
-            if isinstance(msg, NetstackCreateRequest):
-                yield from self.handle_create_request(msg)
-                self._logger.debug("create request done")
-            elif isinstance(msg, NetstackReceiveRequest):
-                yield from self.handle_receive_request(msg)
-                self._logger.debug("receive request done")
+            # Handle it. Entanglement requests are queued per remote node, such
+            # that requests with different remote nodes are handled concurrently.
+            if isinstance(msg, (NetstackCreateRequest, NetstackReceiveRequest)):
+                self._get_queue(msg.remote_node_id).put(msg)
             elif isinstance(msg, NetstackBreakpointCreateRequest):
                 yield from self.handle_breakpoint_create_request()
                 self._logger.debug("breakpoint create request done")
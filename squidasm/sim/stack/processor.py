@@ -1,7 +1,19 @@
 from __future__ import annotations
 
+import logging
 import math
-from typing import TYPE_CHECKING, Dict, Generator, Optional, Union
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 import netsquid as ns
 from netqasm.lang.instr import NetQASMInstruction, core, nv, vanilla
@@ -31,6 +43,7 @@ from netsquid.nodes import Node
 from netsquid.qubits import qubitapi
 
 from pydynaa import EventExpression
+from squidasm.sim.stack.codegen import CompiledSubroutine, compile_subroutine
 from squidasm.sim.stack.common import (
     AllocError,
     AppMemory,
@@ -41,10 +54,14 @@ from squidasm.sim.stack.common import (
     NetstackReceiveRequest,
     PhysicalQuantumMemory,
     PortListener,
+    SubroutineDone,
 )
 from squidasm.sim.stack.globals import GlobalSimData
+from squidasm.sim.stack.profiling import Profiler
+from squidasm.sim.stack.qprogram_cache import QuantumProgramCache
 from squidasm.sim.stack.signals import (
     SIGNAL_HAND_PROC_MSG,
+    SIGNAL_MEMORY_ALLOCATED,
     SIGNAL_MEMORY_FREED,
     SIGNAL_NSTK_PROC_MSG,
 )
@@ -55,6 +72,80 @@ if TYPE_CHECKING:
 PI = math.pi
 PI_OVER_2 = math.pi / 2
 
+# Function interpreting a single instruction, called with the app ID and the
+# instruction. Returns a generator if the instruction needs to wait for events.
+InstrHandler = Callable[
+    [int, NetQASMInstruction], Optional[Generator[EventExpression, None, None]]
+]
+
+# Sequence of the instruction types of a subroutine.
+SubroutineShape = Tuple[Type[NetQASMInstruction], ...]
+
+# Entry of a decoded subroutine: the handler of an instruction, whether the
+# instruction is a branch (which sets the program counter itself) and whether the
+# instruction is classical (its handler never returns a generator).
+DecodedInstr = Tuple[InstrHandler, bool, bool]
+
+_BRANCH_INSTRUCTIONS = (
+    core.JmpInstruction,
+    core.BranchUnaryInstruction,
+    core.BranchBinaryInstruction,
+)
+
+
+# Instructions that only operate on classical memory and never wait for events.
+_CLASSICAL_INSTRUCTIONS = _BRANCH_INSTRUCTIONS + (
+    core.SetInstruction,
+    core.StoreInstruction,
+    core.LoadInstruction,
+    core.LeaInstruction,
+    core.UndefInstruction,
+    core.ArrayInstruction,
+    core.RetRegInstruction,
+    core.RetArrInstruction,
+    core.ClassicalOpInstruction,
+    core.ClassicalOpModInstruction,
+)
+
+
+class _Suspend:
+    """Yielded by a subroutine to suspend its execution until the netstack has
+    written the array slice it waits for, see `Processor.interleave_subroutines`."""
+
+    def __init__(self, addr: int) -> None:
+        self.addr = addr
+
+
+def _build_measure() -> QuantumProgram:
+    """Template measuring qubit 0."""
+    prog = QuantumProgram(num_qubits=1)
+    prog.apply(INSTR_MEASURE, qubit_indices=[0])
+    return prog
+
+
+def _build_move_carbon_to_electron() -> QuantumProgram:
+    """Template moving the state of a carbon (qubit 1) to the electron (qubit 0),
+    such that it can be measured."""
+    prog = QuantumProgram(num_qubits=2)
+    prog.apply(INSTR_INIT, qubit_indices=[0])
+    prog.apply(INSTR_ROT_Y, qubit_indices=[0], angle=PI_OVER_2)
+    prog.apply(INSTR_CYDIR, qubit_indices=[0, 1], angle=-PI_OVER_2)
+    prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=-PI_OVER_2)
+    prog.apply(INSTR_CXDIR, qubit_indices=[0, 1], angle=PI_OVER_2)
+    prog.apply(INSTR_ROT_Y, qubit_indices=[0], angle=-PI_OVER_2)
+    return prog
+
+
+def _build_move_electron_to_carbon() -> QuantumProgram:
+    """Template moving the state of the electron (qubit 0) to a carbon (qubit 1)."""
+    prog = QuantumProgram(num_qubits=2)
+    prog.apply(INSTR_INIT, qubit_indices=[1])
+    prog.apply(INSTR_ROT_Y, qubit_indices=[0], angle=PI_OVER_2)
+    prog.apply(INSTR_CYDIR, qubit_indices=[0, 1], angle=-PI_OVER_2)
+    prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=-PI_OVER_2)
+    prog.apply(INSTR_CXDIR, qubit_indices=[0, 1], angle=PI_OVER_2)
+    return prog
+
 
 class ProcessorComponent(Component):
     """NetSquid component representing a QNodeOS processor.
@@ -104,6 +195,14 @@ class ProcessorComponent(Component):
 class Processor(ComponentProtocol):
     """NetSquid protocol representing a QNodeOS processor."""
 
+    # Types of the quantum instructions that can be fused into a single
+    # `QuantumProgram`, see `fuse_gates`.
+    _FUSIBLE_INSTRUCTIONS: Tuple[Type[NetQASMInstruction], ...] = ()
+
+    # Maximal number of compiled subroutines that are cached, see
+    # `compile_subroutines`.
+    _MAX_COMPILED_SUBROUTINES = 1024
+
     def __init__(self, comp: ProcessorComponent, qnos: Qnos) -> None:
         """Processor protocol constructor. Typically created indirectly through
         constructing a `Qnos` instance.
@@ -125,6 +224,56 @@ class Processor(ComponentProtocol):
         )
 
         self.add_signal(SIGNAL_MEMORY_FREED)
+        self.add_signal(SIGNAL_MEMORY_ALLOCATED)
+
+        # Handler of each instruction type, see `_resolve_handler`.
+        self._handlers: Dict[Type[NetQASMInstruction], DecodedInstr] = {}
+
+        # Decoded subroutines, keyed by the types of their instructions. Since
+        # dispatching only depends on the instruction types, subroutines of the
+        # same shape (e.g. of each iteration of a loop in a program) share an entry.
+        # Operands are still resolved by the handlers, see `_decode`.
+        self._decoded: Dict[SubroutineShape, List[DecodedInstr]] = {}
+
+        # Whether consecutive quantum instructions are executed as one program.
+        self._fuse_gates: bool = False
+
+        # Whether gates on disjoint qubits are executed at the same time.
+        self._parallel_gates: bool = False
+
+        # For each instruction of a subroutine shape, the index after the end of
+        # the block of fusible instructions that starts at that instruction.
+        self._fused_block_ends: Dict[SubroutineShape, List[int]] = {}
+
+        # Templates of the fixed gate sequences this processor executes.
+        self._programs = QuantumProgramCache()
+
+        # Whether subroutines are compiled to Python instead of interpreted.
+        self._compile_subroutines: bool = False
+
+        # Compiled subroutines, keyed by the serialized subroutine and whether
+        # instructions are fused, least recently used first.
+        self._compiled: OrderedDict[
+            Tuple[bytes, bool], CompiledSubroutine
+        ] = OrderedDict()
+        # Whether the compiled subroutines count their instructions.
+        self._compiled_profiled: bool = False
+
+        # Whether other subroutines are executed while a subroutine waits for
+        # the netstack.
+        self._interleave_subroutines: bool = False
+
+        # Suspended subroutines, by app ID, with their instructions and the
+        # address of the array they wait for.
+        self._suspended: Dict[
+            int,
+            Tuple[
+                Generator[EventExpression, None, None], List[NetQASMInstruction], int
+            ],
+        ] = {}
+
+        # Instructions of the subroutine that is currently being executed.
+        self._current_instructions: List[NetQASMInstruction] = []
 
     @property
     def app_memories(self) -> Dict[int, AppMemory]:
@@ -141,6 +290,71 @@ class Processor(ComponentProtocol):
         """Get the NetSquid `QuantumProcessor` object of this node."""
         return self._comp.qdevice
 
+    @property
+    def fuse_gates(self) -> bool:
+        """Whether blocks of consecutive quantum instructions (such as gates and
+        qubit initializations) are executed as a single `QuantumProgram`, instead
+        of one program per instruction. Since the instructions of a program are
+        executed one after the other, the simulated timing is the same, but far
+        fewer simulator events are needed."""
+        return self._fuse_gates
+
+    @fuse_gates.setter
+    def fuse_gates(self, fuse: bool) -> None:
+        self._fuse_gates = fuse
+
+    @property
+    def parallel_gates(self) -> bool:
+        """Whether blocks of consecutive quantum instructions are scheduled such
+        that instructions on disjoint qubits are executed at the same time. This
+        requires the physical instructions of the QDevice to be parallel (see
+        `GenericQDeviceConfig.parallel_gates`).
+
+        Each instruction of a block is placed in the earliest layer after the
+        previous instructions on the same qubits. The instructions of a layer are
+        executed in parallel, and a layer starts when the previous layer has
+        finished."""
+        return self._parallel_gates
+
+    @parallel_gates.setter
+    def parallel_gates(self, parallel: bool) -> None:
+        self._parallel_gates = parallel
+
+    @property
+    def compile_subroutines(self) -> bool:
+        """Whether subroutines are translated into Python generator functions
+        (see `squidasm.sim.stack.codegen`) instead of being interpreted.
+
+        Registers are kept in local variables and classical instructions and
+        branches are executed as Python code. Other instructions are handed to
+        the same methods the interpreter uses. A subroutine is compiled the first
+        time it is executed, and the result is cached by its serialized bytes,
+        such that a subroutine that is sent again (e.g. in every iteration of a
+        program) is not translated again.
+
+        The classical instructions of compiled subroutines are not logged."""
+        return self._compile_subroutines
+
+    @compile_subroutines.setter
+    def compile_subroutines(self, enable: bool) -> None:
+        self._compile_subroutines = enable
+
+    @property
+    def interleave_subroutines(self) -> bool:
+        """Whether a subroutine that waits for entanglement (in `wait_all`) is
+        suspended, such that subroutines of other applications can be executed in
+        the meantime. The subroutine is resumed when the netstack has written
+        all results it waits for.
+
+        Since the handler must then be able to have subroutines of several
+        applications in flight, it reads this setting too. Finished subroutines
+        are reported to the handler with a `SubroutineDone` message."""
+        return self._interleave_subroutines
+
+    @interleave_subroutines.setter
+    def interleave_subroutines(self, interleave: bool) -> None:
+        self._interleave_subroutines = interleave
+
     def _send_handler_msg(self, msg: str) -> None:
         self._comp.handler_out_port.tx_output(msg)
 
@@ -153,11 +367,39 @@ class Processor(ComponentProtocol):
     def _receive_netstack_msg(self) -> Generator[EventExpression, None, str]:
         return (yield from self._receive_msg("netstack", SIGNAL_NSTK_PROC_MSG))
 
-    def _flush_netstack_msgs(self) -> None:
-        self._listeners["netstack"].buffer.clear()
+    def _execute_program(
+        self, prog: QuantumProgram, qubit_mapping: Optional[List[int]] = None
+    ) -> Generator[EventExpression, None, None]:
+        """Execute a program on the QDevice once it is idle. The netstack may be
+        correcting the state of a pair at the same time (see
+        `Netstack.enable_buffer`), and other applications may have programs
+        running when subroutines are interleaved."""
+        while self.qdevice.busy:
+            yield self.await_program(self.qdevice)
+        yield self.qdevice.execute_program(prog, qubit_mapping=qubit_mapping)
+
+    def start(self) -> None:
+        # Handlers are resolved again, since they may be instrumented differently
+        # (see `Profiler`).
+        self._handlers = {}
+        self._decoded = {}
+        self._fused_block_ends = {}
+        # So are compiled subroutines, but only when profiling was switched.
+        if Profiler.is_enabled() != self._compiled_profiled:
+            self._compiled.clear()
+            self._compiled_profiled = Profiler.is_enabled()
+        super().start()
+
+    def reset_state(self) -> None:
+        super().reset_state()
+        self._suspended = {}
 
     def run(self) -> Generator[EventExpression, None, None]:
         """Run this protocol. Automatically called by NetSquid during simulation."""
+        if self._interleave_subroutines:
+            yield from self._run_interleaved()
+            return
+
         while True:
             subroutine = yield from self._receive_handler_msg()
             # assert isinstance(subroutine, Subroutine)
@@ -167,6 +409,54 @@ class Processor(ComponentProtocol):
 
             self._send_handler_msg("subroutine done")
 
+    def _run_interleaved(self) -> Generator[EventExpression, None, None]:
+        """Execute subroutines from the handler, and resume suspended subroutines
+        when the netstack has written the results they wait for."""
+        wake_up_signals = {
+            "netstack": SIGNAL_NSTK_PROC_MSG,
+            "handler": SIGNAL_HAND_PROC_MSG,
+        }
+        while True:
+            source, msg = yield from self._receive_any_msg(wake_up_signals)
+            if source == "handler":
+                self._logger.debug(f"received new subroutine from handler: {msg}")
+                yield from self._drive_subroutine(
+                    msg.app_id, self.execute_subroutine(msg)
+                )
+                continue
+
+            # The netstack completed an array slice that a subroutine waits for.
+            netstack = self._qnos.netstack
+            for app_id, (subroutine, instructions, addr) in list(
+                self._suspended.items()
+            ):
+                if not netstack.is_watching(app_id, addr):
+                    self._logger.debug(f"resuming subroutine of app ID {app_id}")
+                    del self._suspended[app_id]
+                    self._current_instructions = instructions
+                    yield from self._drive_subroutine(app_id, subroutine)
+
+    def _drive_subroutine(
+        self, app_id: int, subroutine: Generator[EventExpression, None, None]
+    ) -> Generator[EventExpression, None, None]:
+        """Run a (possibly resumed) subroutine until it finishes or suspends."""
+        value = None
+        while True:
+            try:
+                expr = subroutine.send(value)
+            except StopIteration:
+                self._send_handler_msg(SubroutineDone(app_id))
+                return
+            if isinstance(expr, _Suspend):
+                self._logger.debug(f"suspending subroutine of app ID {app_id}")
+                self._suspended[app_id] = (
+                    subroutine,
+                    self._current_instructions,
+                    expr.addr,
+                )
+                return
+            value = yield expr
+
     def execute_subroutine(
         self, subroutine: Subroutine
     ) -> Generator[EventExpression, None, None]:
@@ -174,74 +464,280 @@ class Processor(ComponentProtocol):
         app_id = subroutine.app_id
         assert app_id in self.app_memories
         app_mem = self.app_memories[app_id]
-        app_mem.set_prog_counter(0)
-        while app_mem.prog_counter < len(subroutine.instructions):
-            instr = subroutine.instructions[app_mem.prog_counter]
-            self._logger.debug(
-                f"{ns.sim_time()} interpreting instruction {instr} at line {app_mem.prog_counter}"
-            )
+        instructions = subroutine.instructions
+        self._current_instructions = instructions
+        shape = tuple(type(instr) for instr in instructions)
+        decoded = self._decode(shape)
+        if self._compile_subroutines:
+            compiled = self._get_compiled(subroutine)
+            yield from compiled(self, app_id, app_mem, instructions, decoded)
+            return
+
+        block_ends = None
+        if self._fuse_gates or self._parallel_gates:
+            block_ends = self._get_fused_block_ends(shape)
+        debug = self._logger.isEnabledFor(logging.DEBUG)
+
+        # The program counter is kept in a local variable, and only written to
+        # the app memory before handing control to an instruction that may yield.
+        pc = 0
+        app_mem.set_prog_counter(pc)
+        while pc < len(instructions):
+            if block_ends is not None and block_ends[pc] > pc + 1:
+                yield from self._execute_fused(
+                    app_id, instructions[pc : block_ends[pc]]
+                )
+                pc = block_ends[pc]
+                app_mem.set_prog_counter(pc)
+                continue
 
-            if (
-                isinstance(instr, core.JmpInstruction)
-                or isinstance(instr, core.BranchUnaryInstruction)
-                or isinstance(instr, core.BranchBinaryInstruction)
-            ):
-                self._interpret_branch_instr(app_id, instr)
+            if decoded[pc][2]:
+                pc = self._execute_classical(app_id, instructions, decoded, pc, debug)
+                app_mem.set_prog_counter(pc)
+                continue
+
+            instr = instructions[pc]
+            if debug:
+                self._logger.debug(
+                    f"{ns.sim_time()} interpreting instruction {instr} at line {pc}"
+                )
+            generator = decoded[pc][0](app_id, instr)
+            if generator:
+                yield from generator
+            pc += 1
+            app_mem.set_prog_counter(pc)
+
+    def _execute_classical(
+        self,
+        app_id: int,
+        instructions: List[NetQASMInstruction],
+        decoded: List[DecodedInstr],
+        pc: int,
+        debug: bool,
+    ) -> int:
+        """Execute classical instructions, starting at `pc`, up to the next
+        instruction that is not classical (or the end of the subroutine).
+
+        Since classical instructions never wait for events, they are executed in
+        a plain loop, without going through the generator machinery.
+
+        :return: the program counter of the first instruction that was not executed
+        """
+        app_mem = self.app_memories[app_id]
+        num_instrs = len(instructions)
+        while pc < num_instrs:
+            handler, is_branch, is_classical = decoded[pc]
+            if not is_classical:
+                break
+            instr = instructions[pc]
+            if debug:
+                self._logger.debug(
+                    f"{ns.sim_time()} interpreting instruction {instr} at line {pc}"
+                )
+            if is_branch:
+                app_mem.set_prog_counter(pc)
+                handler(app_id, instr)
+                pc = app_mem.prog_counter
             else:
-                generator = self._interpret_instruction(app_id, instr)
-                if generator:
-                    yield from generator
-                app_mem.increment_prog_counter()
+                handler(app_id, instr)
+                pc += 1
+        return pc
+
+    def _decode(self, shape: SubroutineShape) -> List[DecodedInstr]:
+        """Get the handler of each instruction of a subroutine.
+
+        The result is cached per subroutine shape, i.e. per sequence of
+        instruction types. Only dispatching is cached: the handlers resolve the
+        operands of an instruction each time they execute it, since the values
+        of its registers and array entries change between executions. Subroutines
+        with their operand accesses specialized per subroutine are what
+        `compile_subroutines` provides."""
+        decoded = self._decoded.get(shape)
+        if decoded is None:
+            decoded = [self._get_handler(typ) for typ in shape]
+            self._decoded[shape] = decoded
+        return decoded
+
+    def _get_compiled(self, subroutine: Subroutine) -> CompiledSubroutine:
+        """Get the compiled version of a subroutine, compiling it if it is not
+        cached."""
+        fuse = self._fuse_gates or self._parallel_gates
+        key = (bytes(subroutine), fuse)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+        else:
+            if len(self._compiled) >= self._MAX_COMPILED_SUBROUTINES:
+                # Evict the least recently used subroutine.
+                self._compiled.popitem(last=False)
+            compiled = self._compile(
+                subroutine.instructions, self._FUSIBLE_INSTRUCTIONS if fuse else ()
+            )
+            self._compiled[key] = compiled
+        return compiled
+
+    def _compile(
+        self,
+        instructions: List[NetQASMInstruction],
+        fusible: Tuple[Type[NetQASMInstruction], ...],
+        count: Optional[Callable[[str], None]] = None,
+    ) -> CompiledSubroutine:
+        """Compile the instructions of a subroutine, see `compile_subroutine`."""
+        return compile_subroutine(instructions, fusible, count)
+
+    def _get_fused_block_ends(self, shape: SubroutineShape) -> List[int]:
+        """Find the blocks of consecutive fusible instructions of a subroutine.
+
+        :return: for each instruction, the index after the end of the block of
+            fusible instructions starting at that instruction. For instructions
+            that are not fusible this is their own index.
+        """
+        block_ends = self._fused_block_ends.get(shape)
+        if block_ends is None:
+            block_ends = [0] * len(shape)
+            end = len(shape)
+            for i in reversed(range(len(shape))):
+                if not issubclass(shape[i], self._FUSIBLE_INSTRUCTIONS):
+                    end = i
+                block_ends[i] = end
+            self._fused_block_ends[shape] = block_ends
+        return block_ends
+
+    def _execute_fused(
+        self, app_id: int, instrs: List[NetQASMInstruction]
+    ) -> Generator[EventExpression, None, None]:
+        """Execute a block of consecutive fusible instructions (see `fuse_gates`
+        and `parallel_gates`)."""
+        self._logger.debug(f"Executing {len(instrs)} fused instructions")
+        yield from self._execute_gates(app_id, instrs)
 
-    def _interpret_instruction(
+    def _execute_gates(
+        self, app_id: int, instrs: List[NetQASMInstruction]
+    ) -> Generator[EventExpression, None, None]:
+        """Execute quantum instructions on the QDevice, as a single program, or
+        as one parallel program per layer if `parallel_gates` is enabled."""
+        if not self._parallel_gates or len(instrs) == 1:
+            prog = QuantumProgram()
+            for instr in instrs:
+                self._apply_gate(app_id, instr, prog)
+            yield from self._execute_program(prog)
+            return
+
+        for layer in self._schedule_layers(app_id, instrs):
+            prog = QuantumProgram(parallel=True)
+            for instr in layer:
+                self._apply_gate(app_id, instr, prog)
+            yield from self._execute_program(prog)
+
+    def _schedule_layers(
+        self, app_id: int, instrs: List[NetQASMInstruction]
+    ) -> List[List[NetQASMInstruction]]:
+        """Split quantum instructions into layers of instructions on disjoint
+        qubits, respecting the order of the instructions on each qubit."""
+        layers: List[List[NetQASMInstruction]] = []
+        # Index of the first layer in which a qubit is free.
+        free_from: Dict[Optional[int], int] = {}
+        for instr in instrs:
+            qubits = self._gate_qubits(app_id, instr)
+            index = max(free_from.get(q, 0) for q in qubits)
+            if index == len(layers):
+                layers.append([])
+            layers[index].append(instr)
+            for q in qubits:
+                free_from[q] = index + 1
+        return layers
+
+    def _gate_qubits(
         self, app_id: int, instr: NetQASMInstruction
-    ) -> Optional[Generator[EventExpression, None, None]]:
-        if isinstance(instr, core.SetInstruction):
-            return self._interpret_set(app_id, instr)
-        elif isinstance(instr, core.QAllocInstruction):
-            return self._interpret_qalloc(app_id, instr)
-        elif isinstance(instr, core.QFreeInstruction):
-            return self._interpret_qfree(app_id, instr)
-        elif isinstance(instr, core.StoreInstruction):
-            return self._interpret_store(app_id, instr)
-        elif isinstance(instr, core.LoadInstruction):
-            return self._interpret_load(app_id, instr)
-        elif isinstance(instr, core.LeaInstruction):
-            return self._interpret_lea(app_id, instr)
-        elif isinstance(instr, core.UndefInstruction):
-            return self._interpret_undef(app_id, instr)
-        elif isinstance(instr, core.ArrayInstruction):
-            return self._interpret_array(app_id, instr)
-        elif isinstance(instr, core.InitInstruction):
-            return self._interpret_init(app_id, instr)
-        elif isinstance(instr, core.MeasInstruction):
-            return self._interpret_meas(app_id, instr)
-        elif isinstance(instr, core.CreateEPRInstruction):
-            return self._interpret_create_epr(app_id, instr)
-        elif isinstance(instr, core.RecvEPRInstruction):
-            return self._interpret_recv_epr(app_id, instr)
-        elif isinstance(instr, core.WaitAllInstruction):
-            return self._interpret_wait_all(app_id, instr)
-        elif isinstance(instr, core.RetRegInstruction):
-            pass
-        elif isinstance(instr, core.RetArrInstruction):
-            pass
+    ) -> List[Optional[int]]:
+        """Get the physical IDs of the qubits a quantum instruction acts on."""
+        app_mem = self.app_memories[app_id]
+        if isinstance(
+            instr, (core.TwoQubitInstruction, core.ControlledRotationInstruction)
+        ):
+            regs = [instr.reg0, instr.reg1]
         elif isinstance(instr, core.SingleQubitInstruction):
-            return self._interpret_single_qubit_instr(app_id, instr)
-        elif isinstance(instr, core.TwoQubitInstruction):
-            return self._interpret_two_qubit_instr(app_id, instr)
-        elif isinstance(instr, core.RotationInstruction):
-            return self._interpret_single_rotation_instr(app_id, instr)
-        elif isinstance(instr, core.ControlledRotationInstruction):
-            return self._interpret_controlled_rotation_instr(app_id, instr)
-        elif isinstance(instr, core.ClassicalOpInstruction) or isinstance(
-            instr, core.ClassicalOpModInstruction
+            regs = [instr.qreg]
+        else:
+            regs = [instr.reg]
+        return [app_mem.phys_id_for(app_mem.get_reg_value(reg)) for reg in regs]
+
+    def _apply_gate(
+        self, app_id: int, instr: NetQASMInstruction, prog: QuantumProgram
+    ) -> None:
+        """Add the operations of a (fusible) quantum instruction to a program.
+
+        Only qubit initialization is supported by every QDevice. Subclasses add
+        the gates of their hardware and call this method for other instructions.
+        """
+        if not isinstance(instr, core.InitInstruction):
+            raise RuntimeError(f"Unsupported instruction {instr}")
+        app_mem = self.app_memories[app_id]
+        virt_id = app_mem.get_reg_value(instr.reg)
+        phys_id = app_mem.phys_id_for(virt_id)
+        self._logger.debug(
+            f"Performing {instr} on virtual qubit {virt_id} (physical ID: {phys_id})"
+        )
+        prog.apply(INSTR_INIT, qubit_indices=[phys_id])
+
+    def _get_handler(self, instr_type: Type[NetQASMInstruction]) -> DecodedInstr:
+        handler = self._handlers.get(instr_type)
+        if handler is None:
+            handler = self._resolve_handler(instr_type)
+            self._handlers[instr_type] = handler
+        return handler
+
+    def _resolve_handler(self, instr_type: Type[NetQASMInstruction]) -> DecodedInstr:
+        """Find the method interpreting instructions of the given type."""
+        if issubclass(instr_type, _BRANCH_INSTRUCTIONS):
+            return self._interpret_branch_instr, True, True
+        elif issubclass(instr_type, core.SetInstruction):
+            handler = self._interpret_set
+        elif issubclass(instr_type, core.QAllocInstruction):
+            handler = self._interpret_qalloc
+        elif issubclass(instr_type, core.QFreeInstruction):
+            handler = self._interpret_qfree
+        elif issubclass(instr_type, core.StoreInstruction):
+            handler = self._interpret_store
+        elif issubclass(instr_type, core.LoadInstruction):
+            handler = self._interpret_load
+        elif issubclass(instr_type, core.LeaInstruction):
+            handler = self._interpret_lea
+        elif issubclass(instr_type, core.UndefInstruction):
+            handler = self._interpret_undef
+        elif issubclass(instr_type, core.ArrayInstruction):
+            handler = self._interpret_array
+        elif issubclass(instr_type, core.InitInstruction):
+            handler = self._interpret_init
+        elif issubclass(instr_type, core.MeasInstruction):
+            handler = self._interpret_meas
+        elif issubclass(instr_type, core.CreateEPRInstruction):
+            handler = self._interpret_create_epr
+        elif issubclass(instr_type, core.RecvEPRInstruction):
+            handler = self._interpret_recv_epr
+        elif issubclass(instr_type, core.WaitAllInstruction):
+            handler = self._interpret_wait_all
+        elif issubclass(instr_type, core.RetRegInstruction):
+            handler = self._interpret_ret_reg
+        elif issubclass(instr_type, core.RetArrInstruction):
+            handler = self._interpret_ret_arr
+        elif issubclass(instr_type, core.SingleQubitInstruction):
+            handler = self._interpret_single_qubit_instr
+        elif issubclass(instr_type, core.TwoQubitInstruction):
+            handler = self._interpret_two_qubit_instr
+        elif issubclass(instr_type, core.RotationInstruction):
+            handler = self._interpret_single_rotation_instr
+        elif issubclass(instr_type, core.ControlledRotationInstruction):
+            handler = self._interpret_controlled_rotation_instr
+        elif issubclass(
+            instr_type, (core.ClassicalOpInstruction, core.ClassicalOpModInstruction)
         ):
-            return self._interpret_binary_classical_instr(app_id, instr)
-        elif isinstance(instr, core.BreakpointInstruction):
-            return self._interpret_breakpoint(app_id, instr)
+            handler = self._interpret_binary_classical_instr
+        elif issubclass(instr_type, core.BreakpointInstruction):
+            handler = self._interpret_breakpoint
         else:
-            raise RuntimeError(f"Invalid instruction {instr}")
+            raise RuntimeError(f"Invalid instruction type {instr_type.__name__}")
+        return handler, False, issubclass(instr_type, _CLASSICAL_INSTRUCTIONS)
 
     def _interpret_breakpoint(
         self, app_id: int, instr: core.BreakpointInstruction
@@ -296,6 +792,7 @@ class Processor(ComponentProtocol):
 
         phys_id = self.physical_memory.allocate()
         app_mem.map_virt_id(virt_id, phys_id)
+        self.send_signal(SIGNAL_MEMORY_ALLOCATED)
 
     def _interpret_qfree(self, app_id: int, instr: core.QFreeInstruction) -> None:
         app_mem = self.app_memories[app_id]
@@ -447,12 +944,13 @@ class Processor(ComponentProtocol):
     ) -> Generator[EventExpression, None, None]:
         raise NotImplementedError
 
-    def _do_single_rotation(
+    def _apply_single_rotation(
         self,
         app_id: int,
         instr: core.RotationInstruction,
         ns_instr: NsInstr,
-    ) -> Generator[EventExpression, None, None]:
+        prog: QuantumProgram,
+    ) -> None:
         app_mem = self.app_memories[app_id]
         virt_id = app_mem.get_reg_value(instr.reg)
         phys_id = app_mem.phys_id_for(virt_id)
@@ -464,21 +962,20 @@ class Processor(ComponentProtocol):
             f"Performing {instr} with angle {angle} on virtual qubit "
             f"{virt_id} (physical ID: {phys_id})"
         )
-        prog = QuantumProgram()
         prog.apply(ns_instr, qubit_indices=[phys_id], angle=angle)
-        yield self.qdevice.execute_program(prog)
 
     def _interpret_single_rotation_instr(
         self, app_id: int, instr: nv.RotXInstruction
     ) -> Generator[EventExpression, None, None]:
         raise NotImplementedError
 
-    def _do_controlled_rotation(
+    def _apply_controlled_rotation(
         self,
         app_id: int,
         instr: core.ControlledRotationInstruction,
         ns_instr: NsInstr,
-    ) -> Generator[EventExpression, None, None]:
+        prog: QuantumProgram,
+    ) -> None:
         app_mem = self.app_memories[app_id]
         virt_id0 = app_mem.get_reg_value(instr.reg0)
         phys_id0 = app_mem.phys_id_for(virt_id0)
@@ -492,9 +989,7 @@ class Processor(ComponentProtocol):
             f"Performing {instr} with angle {angle} on virtual qubits "
             f"{virt_id0} and {virt_id1} (physical IDs: {phys_id0} and {phys_id1})"
         )
-        prog = QuantumProgram()
         prog.apply(ns_instr, qubit_indices=[phys_id0, phys_id1], angle=angle)
-        yield self.qdevice.execute_program(prog)
 
     def _interpret_controlled_rotation_instr(
         self, app_id: int, instr: core.ControlledRotationInstruction
@@ -590,18 +1085,17 @@ class Processor(ComponentProtocol):
             f"checking if @{addr}[{start}:{end}] has values for app ID {app_id}"
         )
 
-        while True:
-            values = self.app_memories[app_id].get_array_values(addr, start, end)
-            if any(v is None for v in values):
-                self._logger.debug(
-                    f"waiting for netstack to write to @{addr}[{start}:{end}] "
-                    f"for app ID {app_id}"
-                )
-                yield from self._receive_netstack_msg()
-                self._logger.debug("netstack wrote something")
+        # The netstack tells when the last undefined entry of the slice has been
+        # written, so there is no need to check the slice after each write.
+        if not self._qnos.netstack.watch_array(app_id, addr, start, end):
+            self._logger.debug(
+                f"waiting for netstack to write to @{addr}[{start}:{end}] "
+                f"for app ID {app_id}"
+            )
+            if self._interleave_subroutines:
+                yield _Suspend(addr)
             else:
-                break
-        self._flush_netstack_msgs()
+                yield from self._receive_netstack_msg()
         self._logger.debug("all entries were written")
 
         self._logger.info(f"\nFinished waiting for array slice {instr.slice}")
@@ -626,19 +1120,56 @@ class Processor(ComponentProtocol):
 class GenericProcessor(Processor):
     """A `Processor` for nodes with a generic quantum hardware."""
 
+    _FUSIBLE_INSTRUCTIONS = (
+        core.InitInstruction,
+        core.SingleQubitInstruction,
+        core.TwoQubitInstruction,
+        core.RotationInstruction,
+    )
+
+    def _apply_gate(
+        self, app_id: int, instr: NetQASMInstruction, prog: QuantumProgram
+    ) -> None:
+        app_mem = self.app_memories[app_id]
+        if isinstance(instr, core.SingleQubitInstruction):
+            virt_id = app_mem.get_reg_value(instr.qreg)
+            phys_id = app_mem.phys_id_for(virt_id)
+            if isinstance(instr, vanilla.GateXInstruction):
+                prog.apply(INSTR_X, qubit_indices=[phys_id])
+            elif isinstance(instr, vanilla.GateYInstruction):
+                prog.apply(INSTR_Y, qubit_indices=[phys_id])
+            elif isinstance(instr, vanilla.GateZInstruction):
+                prog.apply(INSTR_Z, qubit_indices=[phys_id])
+            elif isinstance(instr, vanilla.GateHInstruction):
+                prog.apply(INSTR_H, qubit_indices=[phys_id])
+            elif isinstance(instr, vanilla.GateKInstruction):
+                prog.apply(INSTR_K, qubit_indices=[phys_id])
+            else:
+                raise RuntimeError(f"Unsupported instruction {instr}")
+        elif isinstance(instr, core.TwoQubitInstruction):
+            virt_id0 = app_mem.get_reg_value(instr.reg0)
+            phys_id0 = app_mem.phys_id_for(virt_id0)
+            virt_id1 = app_mem.get_reg_value(instr.reg1)
+            phys_id1 = app_mem.phys_id_for(virt_id1)
+            if isinstance(instr, vanilla.CnotInstruction):
+                prog.apply(INSTR_CNOT, qubit_indices=[phys_id0, phys_id1])
+            elif isinstance(instr, vanilla.CphaseInstruction):
+                prog.apply(INSTR_CZ, qubit_indices=[phys_id0, phys_id1])
+            else:
+                raise RuntimeError(f"Unsupported instruction {instr}")
+        elif isinstance(instr, vanilla.RotXInstruction):
+            self._apply_single_rotation(app_id, instr, INSTR_ROT_X, prog)
+        elif isinstance(instr, vanilla.RotYInstruction):
+            self._apply_single_rotation(app_id, instr, INSTR_ROT_Y, prog)
+        elif isinstance(instr, vanilla.RotZInstruction):
+            self._apply_single_rotation(app_id, instr, INSTR_ROT_Z, prog)
+        else:
+            super()._apply_gate(app_id, instr, prog)
+
     def _interpret_init(
         self, app_id: int, instr: core.InitInstruction
     ) -> Generator[EventExpression, None, None]:
-        app_mem = self.app_memories[app_id]
-        virt_id = app_mem.get_reg_value(instr.reg)
-        phys_id = app_mem.phys_id_for(virt_id)
-        self._logger.debug(
-            f"Performing {instr} on virtual qubit "
-            f"{virt_id} (physical ID: {phys_id})"
-        )
-        prog = QuantumProgram()
-        prog.apply(INSTR_INIT, qubit_indices=[phys_id])
-        yield self.qdevice.execute_program(prog)
+        yield from self._execute_gates(app_id, [instr])
 
     def _interpret_meas(
         self, app_id: int, instr: core.MeasInstruction
@@ -652,52 +1183,20 @@ class GenericProcessor(Processor):
             f"placing the outcome in register {instr.creg}"
         )
 
-        prog = QuantumProgram()
-        prog.apply(INSTR_MEASURE, qubit_indices=[phys_id])
-        yield self.qdevice.execute_program(prog)
+        prog = self._programs.get("measure", _build_measure)
+        yield from self._execute_program(prog, qubit_mapping=[phys_id])
         outcome: int = prog.output["last"][0]
         app_mem.set_reg_value(instr.creg, outcome)
 
     def _interpret_single_qubit_instr(
         self, app_id: int, instr: core.SingleQubitInstruction
     ) -> Generator[EventExpression, None, None]:
-        app_mem = self.app_memories[app_id]
-        virt_id = app_mem.get_reg_value(instr.qreg)
-        phys_id = app_mem.phys_id_for(virt_id)
-        if isinstance(instr, vanilla.GateXInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_X, qubit_indices=[phys_id])
-            yield self.qdevice.execute_program(prog)
-        elif isinstance(instr, vanilla.GateYInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_Y, qubit_indices=[phys_id])
-            yield self.qdevice.execute_program(prog)
-        elif isinstance(instr, vanilla.GateZInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_Z, qubit_indices=[phys_id])
-            yield self.qdevice.execute_program(prog)
-        elif isinstance(instr, vanilla.GateHInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_H, qubit_indices=[phys_id])
-            yield self.qdevice.execute_program(prog)
-        elif isinstance(instr, vanilla.GateKInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_K, qubit_indices=[phys_id])
-            yield self.qdevice.execute_program(prog)
-        else:
-            raise RuntimeError(f"Unsupported instruction {instr}")
+        yield from self._execute_gates(app_id, [instr])
 
     def _interpret_single_rotation_instr(
         self, app_id: int, instr: nv.RotXInstruction
     ) -> Generator[EventExpression, None, None]:
-        if isinstance(instr, vanilla.RotXInstruction):
-            yield from self._do_single_rotation(app_id, instr, INSTR_ROT_X)
-        elif isinstance(instr, vanilla.RotYInstruction):
-            yield from self._do_single_rotation(app_id, instr, INSTR_ROT_Y)
-        elif isinstance(instr, vanilla.RotZInstruction):
-            yield from self._do_single_rotation(app_id, instr, INSTR_ROT_Z)
-        else:
-            raise RuntimeError(f"Unsupported instruction {instr}")
+        yield from self._execute_gates(app_id, [instr])
 
     def _interpret_controlled_rotation_instr(
         self, app_id: int, instr: core.ControlledRotationInstruction
@@ -707,26 +1206,108 @@ class GenericProcessor(Processor):
     def _interpret_two_qubit_instr(
         self, app_id: int, instr: core.SingleQubitInstruction
     ) -> Generator[EventExpression, None, None]:
-        app_mem = self.app_memories[app_id]
-        virt_id0 = app_mem.get_reg_value(instr.reg0)
-        phys_id0 = app_mem.phys_id_for(virt_id0)
-        virt_id1 = app_mem.get_reg_value(instr.reg1)
-        phys_id1 = app_mem.phys_id_for(virt_id1)
-        if isinstance(instr, vanilla.CnotInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_CNOT, qubit_indices=[phys_id0, phys_id1])
-            yield self.qdevice.execute_program(prog)
-        elif isinstance(instr, vanilla.CphaseInstruction):
-            prog = QuantumProgram()
-            prog.apply(INSTR_CZ, qubit_indices=[phys_id0, phys_id1])
-            yield self.qdevice.execute_program(prog)
-        else:
-            raise RuntimeError(f"Unsupported instruction {instr}")
+        yield from self._execute_gates(app_id, [instr])
 
 
 class NVProcessor(Processor):
     """A `Processor` for nodes with a NV hardware."""
 
+    _FUSIBLE_INSTRUCTIONS = (
+        core.InitInstruction,
+        core.RotationInstruction,
+        core.ControlledRotationInstruction,
+    )
+
+    def __init__(self, comp: ProcessorComponent, qnos: Qnos) -> None:
+        super().__init__(comp, qnos)
+
+        # Whether qubits are placed on the electron when that avoids moves.
+        self._optimize_placement: bool = False
+
+        # Number of moves between the electron and a carbon so far.
+        self._num_moves: int = 0
+
+        # Number of moves that optimized placement avoided so far.
+        self._num_moves_saved: int = 0
+
+    @property
+    def optimize_placement(self) -> bool:
+        """Whether qubits are placed on the electron instead of on a carbon when
+        a lookahead over the subroutine shows that this avoids moving them to the
+        electron for their measurement.
+
+        A qubit allocated with a virtual ID other than 0 is normally placed on a
+        carbon. With optimized placement it is placed on the electron instead,
+        if the electron is free and, until the qubit is measured and freed, no
+        other instruction needs the electron and the qubit is not the target of
+        a controlled rotation."""
+        return self._optimize_placement
+
+    @optimize_placement.setter
+    def optimize_placement(self, optimize: bool) -> None:
+        self._optimize_placement = optimize
+
+    @property
+    def num_moves(self) -> int:
+        """Number of times a qubit was moved between the electron and a carbon."""
+        return self._num_moves
+
+    @property
+    def num_moves_saved(self) -> int:
+        """Number of moves between the electron and a carbon that optimized
+        placement avoided, by placing qubits on the electron instead of on a
+        carbon. See `_moves_to_measure_carbon`."""
+        return self._num_moves_saved
+
+    def reset_state(self) -> None:
+        super().reset_state()
+        self._num_moves = 0
+        self._num_moves_saved = 0
+
+    def _moves_to_measure_carbon(self) -> int:
+        """Number of moves needed to measure a qubit on a carbon: the qubit is
+        moved to the electron, after moving the qubit on the electron to a free
+        carbon if the electron is occupied."""
+        return 2 if self.physical_memory.is_allocated(0) else 1
+
+    def _can_place_on_electron(self, pc: int, reg: Register) -> bool:
+        """Check whether the qubit allocated at line `pc` into register `reg` can
+        be placed on the electron without causing moves of other qubits.
+
+        Only the straight-line code up to the measurement and freeing of the qubit
+        is considered. Anything the analysis does not understand (such as branches
+        or writes to `reg`) rejects the placement."""
+        if self.physical_memory.is_allocated(0):
+            return False
+        measured = False
+        for instr in self._current_instructions[pc + 1 :]:
+            if isinstance(instr, core.QFreeInstruction) and instr.reg == reg:
+                return measured
+            if isinstance(instr, core.MeasInstruction):
+                if instr.qreg != reg:
+                    return False
+                measured = True
+            elif isinstance(instr, core.ControlledRotationInstruction):
+                # The control is always the electron, the target a carbon.
+                if instr.reg0 != reg:
+                    return False
+            elif isinstance(instr, (core.SetInstruction, core.LoadInstruction)):
+                if instr.reg == reg:
+                    return False
+            elif isinstance(
+                instr,
+                _BRANCH_INSTRUCTIONS
+                + (
+                    core.QAllocInstruction,
+                    core.CreateEPRInstruction,
+                    core.RecvEPRInstruction,
+                    core.WaitAllInstruction,
+                    core.BreakpointInstruction,
+                ),
+            ):
+                return False
+        return False
+
     def _interpret_qalloc(self, app_id: int, instr: core.QAllocInstruction) -> None:
         app_mem = self.app_memories[app_id]
 
@@ -737,54 +1318,69 @@ class NVProcessor(Processor):
 
         # Virtual ID > 0 corresponds to memory qubits
         if virt_id > 0:
-            phys_id = self.physical_memory.allocate_mem()
+            if self._optimize_placement and self._can_place_on_electron(
+                app_mem.prog_counter, instr.reg
+            ):
+                # Until the measurement, nothing else occupies the electron, so
+                # measuring the qubit from a carbon would have needed as many
+                # moves as it needs now.
+                self._num_moves_saved += self._moves_to_measure_carbon()
+                phys_id = self.physical_memory.allocate_comm()
+                self._logger.info(
+                    f"placing virtual qubit {virt_id} on the electron "
+                    f"(total moves saved: {self._num_moves_saved})"
+                )
+            else:
+                phys_id = self.physical_memory.allocate_mem()
         else:
             phys_id = self.physical_memory.allocate_comm()
         app_mem.map_virt_id(virt_id, phys_id)
+        self.send_signal(SIGNAL_MEMORY_ALLOCATED)
+
+    def _apply_gate(
+        self, app_id: int, instr: NetQASMInstruction, prog: QuantumProgram
+    ) -> None:
+        if isinstance(instr, nv.RotXInstruction):
+            self._apply_single_rotation(app_id, instr, INSTR_ROT_X, prog)
+        elif isinstance(instr, nv.RotYInstruction):
+            self._apply_single_rotation(app_id, instr, INSTR_ROT_Y, prog)
+        elif isinstance(instr, nv.RotZInstruction):
+            self._apply_single_rotation(app_id, instr, INSTR_ROT_Z, prog)
+        elif isinstance(instr, nv.ControlledRotXInstruction):
+            self._apply_controlled_rotation(app_id, instr, INSTR_CXDIR, prog)
+        elif isinstance(instr, nv.ControlledRotYInstruction):
+            self._apply_controlled_rotation(app_id, instr, INSTR_CYDIR, prog)
+        else:
+            super()._apply_gate(app_id, instr, prog)
 
     def _interpret_init(
         self, app_id: int, instr: core.InitInstruction
     ) -> Generator[EventExpression, None, None]:
-        app_mem = self.app_memories[app_id]
-        virt_id = app_mem.get_reg_value(instr.reg)
-        phys_id = app_mem.phys_id_for(virt_id)
-        self._logger.debug(
-            f"Performing {instr} on virtual qubit "
-            f"{virt_id} (physical ID: {phys_id})"
-        )
-        prog = QuantumProgram()
-        prog.apply(INSTR_INIT, qubit_indices=[phys_id])
-        yield self.qdevice.execute_program(prog)
+        yield from self._execute_gates(app_id, [instr])
 
     def _measure_electron(self) -> Generator[EventExpression, None, int]:
-        prog = QuantumProgram()
-        prog.apply(INSTR_MEASURE, qubit_indices=[0])
-        yield self.qdevice.execute_program(prog)
+        prog = self._programs.get("measure", _build_measure)
+        yield from self._execute_program(prog, qubit_mapping=[0])
         outcome: int = prog.output["last"][0]
         return outcome
 
     def _move_carbon_to_electron_for_measure(
         self, carbon_id: int
     ) -> Generator[EventExpression, None, None]:
-        prog = QuantumProgram()
-        prog.apply(INSTR_INIT, qubit_indices=[0])
-        prog.apply(INSTR_ROT_Y, qubit_indices=[0], angle=PI_OVER_2)
-        prog.apply(INSTR_CYDIR, qubit_indices=[0, carbon_id], angle=-PI_OVER_2)
-        prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=-PI_OVER_2)
-        prog.apply(INSTR_CXDIR, qubit_indices=[0, carbon_id], angle=PI_OVER_2)
-        prog.apply(INSTR_ROT_Y, qubit_indices=[0], angle=-PI_OVER_2)
-        yield self.qdevice.execute_program(prog)
+        prog = self._programs.get(
+            "move_carbon_to_electron", _build_move_carbon_to_electron
+        )
+        self._num_moves += 1
+        yield from self._execute_program(prog, qubit_mapping=[0, carbon_id])
 
     def _move_electron_to_carbon(
         self, carbon_id: int
     ) -> Generator[EventExpression, None, None]:
-        prog = QuantumProgram()
-        prog.apply(INSTR_INIT, qubit_indices=[carbon_id])
-        prog.apply(INSTR_ROT_Y, qubit_indices=[0], angle=PI_OVER_2)
-        prog.apply(INSTR_CYDIR, qubit_indices=[0, carbon_id], angle=-PI_OVER_2)
-        prog.apply(INSTR_ROT_X, qubit_indices=[0], angle=-PI_OVER_2)
-        prog.apply(INSTR_CXDIR, qubit_indices=[0, carbon_id], angle=PI_OVER_2)
-        yield self.qdevice.execute_program(prog)
+        prog = self._programs.get(
+            "move_electron_to_carbon", _build_move_electron_to_carbon
+        )
+        self._num_moves += 1
+        yield from self._execute_program(prog, qubit_mapping=[0, carbon_id])
 
     def _interpret_meas(
         self, app_id: int, instr: core.MeasInstruction
@@ -855,21 +1451,9 @@ class NVProcessor(Processor):
     def _interpret_single_rotation_instr(
         self, app_id: int, instr: nv.RotXInstruction
     ) -> Generator[EventExpression, None, None]:
-        if isinstance(instr, nv.RotXInstruction):
-            yield from self._do_single_rotation(app_id, instr, INSTR_ROT_X)
-        elif isinstance(instr, nv.RotYInstruction):
-            yield from self._do_single_rotation(app_id, instr, INSTR_ROT_Y)
-        elif isinstance(instr, nv.RotZInstruction):
-            yield from self._do_single_rotation(app_id, instr, INSTR_ROT_Z)
-        else:
-            raise RuntimeError(f"Unsupported instruction {instr}")
+        yield from self._execute_gates(app_id, [instr])
 
     def _interpret_controlled_rotation_instr(
         self, app_id: int, instr: core.ControlledRotationInstruction
     ) -> Generator[EventExpression, None, None]:
-        if isinstance(instr, nv.ControlledRotXInstruction):
-            yield from self._do_controlled_rotation(app_id, instr, INSTR_CXDIR)
-        elif isinstance(instr, nv.ControlledRotYInstruction):
-            yield from self._do_controlled_rotation(app_id, instr, INSTR_CYDIR)
-        else:
-            raise RuntimeError(f"Unsupported instruction {instr}")
+        yield from self._execute_gates(app_id, [instr])
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, DefaultDict, Dict, Generator, List
+
+from netsquid.protocols import Protocol
+
+from pydynaa import EventExpression
+
+# Methods that are replaced by instrumented versions on profiled protocols.
+_INSTRUMENTED = [
+    "run",
+    "send_signal",
+    "_deliver",
+    "_resolve_handler",
+    "_execute_fused",
+    "_compile",
+]
+
+
+@dataclass
+class ProtocolStats:
+    """Profiling counters of a single protocol."""
+
+    time: float = 0.0
+    """Wall-clock time (in seconds) spent inside the `run` generator of the
+    protocol, including the time spent in generators it yields from."""
+    yields: int = 0
+    """Number of times the `run` generator yielded to the simulator."""
+    signals: int = 0
+    """Number of signals sent by the protocol."""
+    messages: DefaultDict[str, int] = field(default_factory=lambda: defaultdict(int))
+    """Number of messages received by the listeners of the protocol, per
+    listener."""
+
+
+@dataclass
+class ProfileReport:
+    """Profiling report of a simulation run."""
+
+    wall_time: float
+    """Total wall-clock time (in seconds) of the run."""
+    protocols: Dict[str, ProtocolStats]
+    """Counters per protocol, by protocol name. Port listeners are named
+    `<protocol name>.<listener name>`."""
+    instructions: Dict[str, int]
+    """Number of interpreted NetQASM instructions, by instruction type."""
+
+    @property
+    def protocol_time(self) -> float:
+        """Wall-clock time spent inside the generators of all protocols."""
+        return sum(stats.time for stats in self.protocols.values())
+
+    @property
+    def netsquid_time(self) -> float:
+        """Wall-clock time not spent inside protocol generators, i.e. in the
+        NetSquid simulator itself (event scheduling, QDevice and link models)."""
+        return self.wall_time - self.protocol_time
+
+    def summary(self) -> str:
+        """Format the report as a human-readable table."""
+        lines = [
+            f"total wall time: {self.wall_time:.4f} s "
+            f"(protocols {self.protocol_time:.4f} s, "
+            f"NetSquid {self.netsquid_time:.4f} s)",
+            "",
+            f"{'protocol':50} {'time [s]':>10} {'yields':>8} "
+            f"{'signals':>8} {'messages':>9}",
+        ]
+        for name, stats in sorted(
+            self.protocols.items(), key=lambda item: -item[1].time
+        ):
+            lines.append(
+                f"{name:50} {stats.time:10.4f} {stats.yields:8} "
+                f"{stats.signals:8} {sum(stats.messages.values()):9}"
+            )
+        lines += ["", f"{'instruction':50} {'count':>10}"]
+        for name, count in sorted(self.instructions.items(), key=lambda i: -i[1]):
+            lines.append(f"{name:50} {count:10}")
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Opt-in instrumentation of the protocols of the stack runtime.
+
+    When enabled, each `ComponentProtocol` (and each of its `PortListener`s) that
+    is started is instrumented: time spent in, and yields of, its `run` generator
+    are measured, and sent signals and received messages are counted. Messages
+    are counted when they arrive at a listener, however the protocol takes them
+    from its listeners. The processor also counts executed instructions by type,
+    for interpreted as well as compiled subroutines.
+
+    Instrumentation is done by wrapping methods on the protocol instances when
+    they are started. When profiling is disabled, these wrappers are removed
+    again, such that disabled profiling does not add any cost.
+    """
+
+    _ENABLED = False
+    _PROTOCOLS: Dict[str, ProtocolStats] = {}
+    _INSTRUCTIONS: DefaultDict[str, int] = defaultdict(int)
+    _START_TIME = 0.0
+
+    @classmethod
+    def enable(cls) -> None:
+        """Enable profiling and clear all counters. Protocols that are started
+        from now on are instrumented."""
+        cls._ENABLED = True
+        cls.reset()
+
+    @classmethod
+    def disable(cls) -> None:
+        """Disable profiling. Protocols that are started from now on are not
+        instrumented."""
+        cls._ENABLED = False
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls._ENABLED
+
+    @classmethod
+    def reset(cls) -> None:
+        """Clear all counters."""
+        cls._PROTOCOLS = {}
+        cls._INSTRUCTIONS = defaultdict(int)
+        cls._START_TIME = time.perf_counter()
+
+    @classmethod
+    def get_report(cls) -> ProfileReport:
+        """Get a report of the counters since profiling was enabled or reset."""
+        return ProfileReport(
+            wall_time=time.perf_counter() - cls._START_TIME,
+            protocols=dict(cls._PROTOCOLS),
+            instructions=dict(cls._INSTRUCTIONS),
+        )
+
+    @classmethod
+    def instrument(cls, protocol: Protocol, name: str) -> None:
+        """Instrument a protocol that is about to be started, or remove the
+        instrumentation if profiling is disabled.
+
+        :param protocol: the protocol
+        :param name: name under which the counters of the protocol are reported
+        """
+        for method in _INSTRUMENTED:
+            protocol.__dict__.pop(method, None)
+        if not cls._ENABLED:
+            return
+
+        stats = cls._PROTOCOLS.setdefault(name, ProtocolStats())
+
+        run = protocol.run
+        protocol.run = lambda: _profile_generator(run(), stats)
+
+        send_signal = protocol.send_signal
+
+        def counting_send_signal(*args: Any, **kwargs: Any) -> Any:
+            stats.signals += 1
+            return send_signal(*args, **kwargs)
+
+        protocol.send_signal = counting_send_signal
+
+        if hasattr(protocol, "_resolve_handler"):
+            protocol._resolve_handler = _count_instructions(protocol._resolve_handler)
+
+        if hasattr(protocol, "_execute_fused"):
+            execute_fused = protocol._execute_fused
+
+            def counting_execute_fused(
+                app_id: int, instrs: List[Any]
+            ) -> Generator[EventExpression, None, None]:
+                for instr in instrs:
+                    Profiler._INSTRUCTIONS[type(instr).__name__] += 1
+                return execute_fused(app_id, instrs)
+
+            protocol._execute_fused = counting_execute_fused
+
+        if hasattr(protocol, "_compile"):
+            compile_ = protocol._compile
+
+            def counting_compile(*args: Any) -> Any:
+                return compile_(*args, count=count_instruction)
+
+            protocol._compile = counting_compile
+
+    @classmethod
+    def instrument_listener(
+        cls, listener: Protocol, protocol_name: str, listener_name: str
+    ) -> None:
+        """Instrument a port listener of a protocol that is about to be started,
+        or remove the instrumentation if profiling is disabled. The messages the
+        listener receives are counted in the counters of the protocol.
+
+        :param listener: the port listener
+        :param protocol_name: name under which the counters of the protocol that
+            owns the listener are reported
+        :param listener_name: name of the listener in that protocol
+        """
+        cls.instrument(listener, f"{protocol_name}.{listener_name}")
+        if not cls._ENABLED:
+            return
+
+        stats = cls._PROTOCOLS.setdefault(protocol_name, ProtocolStats())
+        deliver = listener._deliver
+
+        def counting_deliver(items: List[Any]) -> None:
+            stats.messages[listener_name] += len(items)
+            deliver(items)
+
+        listener._deliver = counting_deliver
+
+
+def count_instruction(name: str) -> None:
+    """Count an executed instruction of compiled subroutines, see
+    `squidasm.sim.stack.codegen`.
+
+    :param name: name of the instruction type
+    """
+    Profiler._INSTRUCTIONS[name] += 1
+
+
+def _count_instructions(resolve: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap the handler resolution of a processor, such that each resolved
+    instruction handler counts the instructions it interprets."""
+
+    def counting_resolve(instr_type: type) -> Any:
+        handler, *flags = resolve(instr_type)
+        name = instr_type.__name__
+
+        def counting_handler(app_id: int, instr: Any) -> Any:
+            Profiler._INSTRUCTIONS[name] += 1
+            return handler(app_id, instr)
+
+        return (counting_handler, *flags)
+
+    return counting_resolve
+
+
+def _profile_generator(
+    generator: Generator[EventExpression, Any, Any], stats: ProtocolStats
+) -> Generator[EventExpression, Any, Any]:
+    """Drive `generator`, measuring the time spent inside it."""
+    value = None
+    while True:
+        start = time.perf_counter()
+        try:
+            expr = generator.send(value)
+        except StopIteration as stop:
+            stats.time += time.perf_counter() - start
+            return stop.value
+        stats.time += time.perf_counter() - start
+        stats.yields += 1
+        value = yield expr
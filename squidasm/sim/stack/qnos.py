@@ -12,6 +12,7 @@ from squidasm.sim.stack.common import (
     AppMemory,
     NVPhysicalQuantumMemory,
     PhysicalQuantumMemory,
+    get_only_peer,
 )
 from squidasm.sim.stack.handler import Handler, HandlerComponent
 from squidasm.sim.stack.netstack import Netstack, NetstackComponent
@@ -43,9 +44,6 @@ class QnosComponent(Component):
         # Ports for communicating with Host
         self.add_ports(["host_out", "host_in"])
 
-        # Ports for communicating with other nodes
-        self.add_ports(["peer_out", "peer_in"])
-
         comp_handler = HandlerComponent(node)
         self.add_subcomponent(comp_handler, "handler")
 
@@ -55,9 +53,6 @@ class QnosComponent(Component):
         comp_netstack = NetstackComponent(node)
         self.add_subcomponent(comp_netstack, "netstack")
 
-        self.netstack_comp.ports["peer_out"].forward_output(self.peer_out_port)
-        self.peer_in_port.forward_input(self.netstack_comp.ports["peer_in"])
-
         self.handler_comp.ports["host_out"].forward_output(self.host_out_port)
         self.host_in_port.forward_input(self.handler_comp.ports["host_in"])
 
@@ -99,13 +94,43 @@ class QnosComponent(Component):
     def host_out_port(self) -> Port:
         return self.ports["host_out"]
 
+    def add_peer_ports(self, peer_id: int, peer_name: str) -> None:
+        """Add ports for communicating with the QNodeOS of a peer node, and forward
+        them to the network stack.
+
+        :param peer_id: ID of the peer node
+        :param peer_name: name of the peer node
+        """
+        if peer_id in self.netstack_comp.peers:
+            return
+        self.netstack_comp.add_peer_ports(peer_id, peer_name)
+        self.add_ports([f"peer_out_{peer_name}", f"peer_in_{peer_name}"])
+        self.netstack_comp.get_peer_out_port(peer_name).forward_output(
+            self.get_peer_out_port(peer_name)
+        )
+        self.get_peer_in_port(peer_name).forward_input(
+            self.netstack_comp.get_peer_in_port(peer_name)
+        )
+
+    def get_peer_in_port(self, peer_name: str) -> Port:
+        return self.ports[f"peer_in_{peer_name}"]
+
+    def get_peer_out_port(self, peer_name: str) -> Port:
+        return self.ports[f"peer_out_{peer_name}"]
+
     @property
     def peer_in_port(self) -> Port:
-        return self.ports["peer_in"]
+        """Input port from the QNodeOS of the only peer node. Use
+        `get_peer_in_port` if there are several peers."""
+        peers = list(self.netstack_comp.peers.values())
+        return self.get_peer_in_port(get_only_peer(peers, self.name))
 
     @property
     def peer_out_port(self) -> Port:
-        return self.ports["peer_out"]
+        """Output port to the QNodeOS of the only peer node. Use
+        `get_peer_out_port` if there are several peers."""
+        peers = list(self.netstack_comp.peers.values())
+        return self.get_peer_out_port(get_only_peer(peers, self.name))
 
     @property
     def node(self) -> Node:
@@ -149,8 +174,10 @@ class Qnos(Protocol):
                 return app_id, virt_id
         raise RuntimeError(f"no virtual ID found for physical ID {phys_id}")
 
-    def assign_ll_protocol(self, prot: MagicLinkLayerProtocolWithSignaling) -> None:
-        self.netstack.assign_ll_protocol(prot)
+    def assign_ll_protocol(
+        self, prot: MagicLinkLayerProtocolWithSignaling, remote_id: Optional[int] = None
+    ) -> None:
+        self.netstack.assign_ll_protocol(prot, remote_id)
 
     @property
     def handler(self) -> Handler:
@@ -184,6 +211,17 @@ class Qnos(Protocol):
     def physical_memory(self) -> PhysicalQuantumMemory:
         return self._physical_memory
 
+    def reset_state(self) -> None:
+        """Clear the simulation state of QNodeOS and its QDevice, such that it can
+        be started again for a new simulation run. Should only be called when
+        stopped."""
+        self._handler.reset_state()
+        self._processor.reset_state()
+        self._netstack.reset_state()
+        self._app_memories.clear()
+        self._physical_memory.clear()
+        self._comp.qdevice.reset()
+
     def start(self) -> None:
         assert self._handler is not None
         assert self._processor is not None
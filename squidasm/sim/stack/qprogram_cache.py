@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Hashable
+
+from netsquid.components.qprogram import QuantumProgram
+
+
+class QuantumProgramCache:
+    """Cache of `QuantumProgram` templates that are executed repeatedly.
+
+    Templates are built once, using program-relative qubit indices, and are
+    executed with a qubit mapping to the actual memory positions, e.g.
+    `qdevice.execute_program(prog, qubit_mapping=[0, carbon_id])`. A single
+    template therefore serves all qubit indices.
+
+    A `QuantumProgram` keeps state (such as its output) while it is executed, so a
+    cache must only be used for a single QDevice, and a template must not be
+    executed again before the previous execution has finished.
+    """
+
+    def __init__(self) -> None:
+        self._programs: Dict[Hashable, QuantumProgram] = {}
+
+    def get(self, key: Hashable, build: Callable[[], QuantumProgram]) -> QuantumProgram:
+        """Get the template with the given key, building it if it is not cached.
+
+        :param key: key identifying the template
+        :param build: function building the template
+        :return: the template
+        """
+        prog = self._programs.get(key)
+        if prog is None:
+            prog = build()
+            self._programs[key] = prog
+        return prog
+
+    def clear(self) -> None:
+        """Remove all templates from the cache."""
+        self._programs = {}
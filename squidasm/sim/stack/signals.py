@@ -6,5 +6,8 @@ SIGNAL_PROC_HAND_MSG = "EvProcHandMsg"
 SIGNAL_PROC_NSTK_MSG = "EvProcNstkMsg"
 SIGNAL_NSTK_PROC_MSG = "EvNstkProcMsg"
 SIGNAL_PEER_NSTK_MSG = "EvPeerNstkMsg"
+SIGNAL_NSTK_PEER_REQ = "EvNstkPeerReq"
+SIGNAL_NSTK_BUFFER = "EvNstkBuffer"
 
 SIGNAL_MEMORY_FREED = "EvMemoryFreed"
+SIGNAL_MEMORY_ALLOCATED = "EvMemoryAllocated"
@@ -12,6 +12,7 @@ from netsquid_magic.link_layer import (
     MagicLinkLayerProtocolWithSignaling,
 )
 
+from squidasm.sim.stack.common import get_only_peer
 from squidasm.sim.stack.host import Host, HostComponent
 from squidasm.sim.stack.qnos import Qnos, QnosComponent
 
@@ -23,11 +24,15 @@ class ProcessingNode(Node):
     This component has two subcomponents: a QnosComponent and a HostComponent.
 
     Has communications ports between
-     - the Host component on this node and the Host component on the peer node
-     - the QNodeOS component on this node and the QNodeOS component on the peer node
+     - the Host component on this node and the Host component on each peer node
+       that programs on this node have classical sockets with
+     - the QNodeOS component on this node and the QNodeOS component on each peer
+       node that this node has a link with
 
-    For now, it is assumed there is only a single other nodes in the network,
-    which is "the" peer.
+    Ports for a peer are only created when connecting to that peer (see
+    `NodeStack.connect_to`), such that the number of ports scales with the number
+    of links and classical connections in the network instead of with the square
+    of the number of nodes.
 
     This is a static container for components and ports.
     Behavior of the node is modeled in the `NodeStack` class, which is a subclass
@@ -54,15 +59,6 @@ class ProcessingNode(Node):
         self.host_comp.ports["qnos_out"].connect(self.qnos_comp.ports["host_in"])
         self.host_comp.ports["qnos_in"].connect(self.qnos_comp.ports["host_out"])
 
-        # Ports for communicating with other nodes
-        self.add_ports(["qnos_peer_out", "qnos_peer_in"])
-        self.add_ports(["host_peer_out", "host_peer_in"])
-
-        self.qnos_comp.peer_out_port.forward_output(self.qnos_peer_out_port)
-        self.qnos_peer_in_port.forward_input(self.qnos_comp.peer_in_port)
-        self.host_comp.peer_out_port.forward_output(self.host_peer_out_port)
-        self.host_peer_in_port.forward_input(self.host_comp.peer_in_port)
-
     @property
     def qnos_comp(self) -> QnosComponent:
         return self.subcomponents["qnos"]
@@ -75,21 +71,76 @@ class ProcessingNode(Node):
     def qdevice(self) -> QuantumProcessor:
         return self.qmemory
 
+    def add_host_peer_ports(self, peer_name: str) -> None:
+        """Add ports for communicating between the Host of this node and the Host
+        of a peer node.
+
+        :param peer_name: name of the peer node
+        """
+        if f"host_peer_in_{peer_name}" in self.ports:
+            return
+        self.host_comp.add_peer_ports(peer_name)
+        self.add_ports([f"host_peer_out_{peer_name}", f"host_peer_in_{peer_name}"])
+        self.host_comp.get_peer_out_port(peer_name).forward_output(
+            self.get_host_peer_out_port(peer_name)
+        )
+        self.get_host_peer_in_port(peer_name).forward_input(
+            self.host_comp.get_peer_in_port(peer_name)
+        )
+
+    def add_qnos_peer_ports(self, peer_id: int, peer_name: str) -> None:
+        """Add ports for communicating between QNodeOS of this node and QNodeOS of
+        a peer node.
+
+        :param peer_id: ID of the peer node
+        :param peer_name: name of the peer node
+        """
+        if f"qnos_peer_in_{peer_name}" in self.ports:
+            return
+        self.qnos_comp.add_peer_ports(peer_id, peer_name)
+        self.add_ports([f"qnos_peer_out_{peer_name}", f"qnos_peer_in_{peer_name}"])
+        self.qnos_comp.get_peer_out_port(peer_name).forward_output(
+            self.get_qnos_peer_out_port(peer_name)
+        )
+        self.get_qnos_peer_in_port(peer_name).forward_input(
+            self.qnos_comp.get_peer_in_port(peer_name)
+        )
+
+    def get_host_peer_in_port(self, peer_name: str) -> Port:
+        return self.ports[f"host_peer_in_{peer_name}"]
+
+    def get_host_peer_out_port(self, peer_name: str) -> Port:
+        return self.ports[f"host_peer_out_{peer_name}"]
+
+    def get_qnos_peer_in_port(self, peer_name: str) -> Port:
+        return self.ports[f"qnos_peer_in_{peer_name}"]
+
+    def get_qnos_peer_out_port(self, peer_name: str) -> Port:
+        return self.ports[f"qnos_peer_out_{peer_name}"]
+
+    # Ports of the only peer node, for networks of two nodes.
+
     @property
     def host_peer_in_port(self) -> Port:
-        return self.ports["host_peer_in"]
+        return self.get_host_peer_in_port(
+            get_only_peer(self.host_comp.peers, self.name)
+        )
 
     @property
     def host_peer_out_port(self) -> Port:
-        return self.ports["host_peer_out"]
+        return self.get_host_peer_out_port(
+            get_only_peer(self.host_comp.peers, self.name)
+        )
 
     @property
     def qnos_peer_in_port(self) -> Port:
-        return self.ports["qnos_peer_in"]
+        peers = list(self.qnos_comp.netstack_comp.peers.values())
+        return self.get_qnos_peer_in_port(get_only_peer(peers, self.name))
 
     @property
     def qnos_peer_out_port(self) -> Port:
-        return self.ports["qnos_peer_out"]
+        peers = list(self.qnos_comp.netstack_comp.peers.values())
+        return self.get_qnos_peer_out_port(get_only_peer(peers, self.name))
 
 
 class NodeStack(Protocol):
@@ -141,12 +192,20 @@ class NodeStack(Protocol):
             self._host = Host(self.host_comp, qdevice_type)
             self._qnos = Qnos(self.qnos_comp, qdevice_type)
 
-    def assign_ll_protocol(self, prot: MagicLinkLayerProtocolWithSignaling) -> None:
+    def assign_ll_protocol(
+        self, prot: MagicLinkLayerProtocolWithSignaling, remote_id: Optional[int] = None
+    ) -> None:
         """Set the link layer protocol to use for entanglement generation.
 
         The same link layer protocol object is used by both nodes sharing a link in
-        the network."""
-        self.qnos.assign_ll_protocol(prot)
+        the network.
+
+        :param prot: link layer protocol instance
+        :param remote_id: ID of the node at the other end of the link. If None, the
+            protocol is used for all remote nodes without a link layer protocol of
+            their own.
+        """
+        self.qnos.assign_ll_protocol(prot, remote_id)
 
     @property
     def node(self) -> ProcessingNode:
@@ -180,13 +239,48 @@ class NodeStack(Protocol):
     def qnos(self, qnos: Qnos) -> None:
         self._qnos = qnos
 
-    def connect_to(self, other: NodeStack) -> None:
+    def connect_to(
+        self, other: NodeStack, host: bool = True, qnos: bool = True
+    ) -> None:
         """Create connections between ports of this NodeStack and those of
-        another NodeStack."""
-        self.node.host_peer_out_port.connect(other.node.host_peer_in_port)
-        self.node.host_peer_in_port.connect(other.node.host_peer_out_port)
-        self.node.qnos_peer_out_port.connect(other.node.qnos_peer_in_port)
-        self.node.qnos_peer_in_port.connect(other.node.qnos_peer_out_port)
+        another NodeStack.
+
+        Ports that are already connected are left as they are.
+
+        :param other: the other NodeStack
+        :param host: whether to connect the Hosts (needed for classical sockets),
+            defaults to True
+        :param qnos: whether to connect the QNodeOS instances (needed for
+            entanglement generation), defaults to True
+        """
+        name, other_name = self.node.name, other.node.name
+        if host:
+            self.node.add_host_peer_ports(other_name)
+            other.node.add_host_peer_ports(name)
+            out_port = self.node.get_host_peer_out_port(other_name)
+            if out_port.connected_port is None:
+                out_port.connect(other.node.get_host_peer_in_port(name))
+                self.node.get_host_peer_in_port(other_name).connect(
+                    other.node.get_host_peer_out_port(name)
+                )
+        if qnos:
+            self.node.add_qnos_peer_ports(other.node.ID, other_name)
+            other.node.add_qnos_peer_ports(self.node.ID, name)
+            out_port = self.node.get_qnos_peer_out_port(other_name)
+            if out_port.connected_port is None:
+                out_port.connect(other.node.get_qnos_peer_in_port(name))
+                self.node.get_qnos_peer_in_port(other_name).connect(
+                    other.node.get_qnos_peer_out_port(name)
+                )
+
+    def reset_state(self) -> None:
+        """Clear the simulation state of the Host, QNodeOS and QDevice of this
+        node, such that it can be started again for a new simulation run.
+        Should only be called when stopped."""
+        assert self._host is not None
+        assert self._qnos is not None
+        self._host.reset_state()
+        self._qnos.reset_state()
 
     def start(self) -> None:
         assert self._host is not None
@@ -1,12 +1,28 @@
 import unittest
+from typing import List, Tuple
 
 import netsquid as ns
 from netqasm.backend.messages import InitNewAppMessage, OpenEPRSocketMessage
+from netsquid.qubits import ketstates, qubitapi
+from netsquid_magic.link_layer import (
+    MagicLinkLayerProtocolWithSignaling,
+    SingleClickTranslationUnit,
+)
+from netsquid_magic.magic_distributor import PerfectStateMagicDistributor
+from qlink_interface import ResCreateAndKeep
 
-from squidasm.run.stack.build import build_nv_qdevice
-from squidasm.run.stack.config import NVQDeviceConfig
+from squidasm.run.stack.build import build_generic_qdevice, build_nv_qdevice
+from squidasm.run.stack.config import GenericQDeviceConfig, NVQDeviceConfig
+from squidasm.sim.stack.common import NetstackCreateRequest, NetstackReceiveRequest
 from squidasm.sim.stack.handler import Handler
-from squidasm.sim.stack.netstack import EprSocket, Netstack
+from squidasm.sim.stack.netstack import (
+    EprSocket,
+    Netstack,
+    NetstackRequest,
+    PeerRequestQueue,
+    PriorityPolicy,
+    RoundRobinPolicy,
+)
 from squidasm.sim.stack.stack import NodeStack
 
 
@@ -32,9 +48,163 @@ class TestHandler(unittest.TestCase):
         assert 0 in self.handler._applications
 
     def test_open_epr_socket(self):
-        self.handler.msg_from_host(OpenEPRSocketMessage(0, 2, 1))
+        self.handler.msg_from_host(OpenEPRSocketMessage(0, 2, 1, 3))
         assert 0 in self.netstack._epr_sockets
-        assert self.netstack._epr_sockets[0][0] == EprSocket(2, 1)
+        assert self.netstack._epr_sockets[0][0] == EprSocket(2, 1, 3)
+
+    def test_scheduling_policy(self):
+        # Each application has its own EPR socket, which shares pairs with the
+        # remote socket with the same ID.
+        for app_id in range(4):
+            self.netstack.open_epr_socket(app_id, app_id, 1, app_id)
+
+        def create(app_id: int) -> NetstackCreateRequest:
+            return NetstackCreateRequest(app_id, 1, app_id, 0, 1, 2)
+
+        def receive(app_id: int) -> NetstackReceiveRequest:
+            return NetstackReceiveRequest(app_id, 1, app_id, 0, 1)
+
+        requests = [create(0), create(0), receive(1), create(2), receive(3)]
+
+        def schedule() -> List[NetstackRequest]:
+            queue = PeerRequestQueue(self.netstack, 1)
+            queue.requests.extend(requests)
+            return [queue.pop_next() for _ in requests]
+
+        assert schedule() == requests
+
+        self.netstack.scheduling_policy = RoundRobinPolicy()
+        order = schedule()
+        assert [req.app_id for req in order] == [0, 1, 2, 3, 0]
+
+        # Requests of the same EPR socket are not reordered with respect to each
+        # other.
+        self.netstack.scheduling_policy = PriorityPolicy({3: 2, 2: 1, 0: -1})
+        order = schedule()
+        assert [req.app_id for req in order] == [3, 2, 1, 0, 0]
+
+
+class TestCreatePairs(unittest.TestCase):
+    def setUp(self) -> None:
+        ns.sim_reset()
+        cfg = GenericQDeviceConfig.perfect_config()
+        cfg.num_qubits = 3
+        qdevice = build_generic_qdevice("generic_qdevice_alice", cfg=cfg)
+        self._node = NodeStack("alice", qdevice_type="generic", qdevice=qdevice)
+        self.netstack.max_pairs_in_flight = 3
+
+    @property
+    def netstack(self) -> Netstack:
+        return self._node.qnos.netstack
+
+    def _create_pairs(self, produced: List[int]) -> List[Tuple[int, int]]:
+        """Create as many pairs as `produced`, where the EGP produces the pairs in
+        the given qubits, and return the pair indices and qubits delivered."""
+        results = iter(produced)
+
+        def poll_egp_result(remote_id, result_type, purpose_id):
+            return ResCreateAndKeep(logical_qubit_id=next(results))
+
+        delivered = []
+
+        def deliver(pair_index, phys_id, result):
+            delivered.append((pair_index, phys_id))
+            yield from []
+
+        self.netstack._poll_egp_result = poll_egp_result
+        self.netstack._queues[1] = PeerRequestQueue(self.netstack, 1)
+        req = NetstackCreateRequest(0, 1, 0, 0, 1, 2)
+        for _ in self.netstack._create_ck_pairs(
+            req, 0, len(produced), lambda: None, deliver
+        ):
+            pass
+        return delivered
+
+    def test_pairs_mapped_to_produced_qubits(self):
+        # All three qubits are requested before any pair is produced, and the
+        # EGP produces the pairs in a different order.
+        assert self._create_pairs([2, 0, 1]) == [(0, 2), (1, 0), (2, 1)]
+
+    def test_pair_in_unallocated_qubit(self):
+        with self.assertRaises(RuntimeError):
+            self._create_pairs([0, 0])
+
+
+class TestEntanglementBuffer(unittest.TestCase):
+    def setUp(self) -> None:
+        ns.sim_reset()
+        self._alice = self._stack("alice", 0)
+        self._bob = self._stack("bob", 1)
+        link_dist = PerfectStateMagicDistributor(
+            nodes=[self._alice.node, self._bob.node], state_delay=1000.0
+        )
+        self._link_prot = MagicLinkLayerProtocolWithSignaling(
+            nodes=[self._alice.node, self._bob.node],
+            magic_distributor=link_dist,
+            translation_unit=SingleClickTranslationUnit(),
+        )
+        for stack, peer in [(self._alice, self._bob), (self._bob, self._alice)]:
+            stack.assign_ll_protocol(self._link_prot, peer.node.ID)
+            stack.qnos.netstack.enable_buffer(peer.node.ID, 2)
+        self._alice.connect_to(self._bob, host=False)
+
+    def _stack(self, name: str, node_id: int) -> NodeStack:
+        cfg = GenericQDeviceConfig.perfect_config()
+        cfg.num_qubits = 4
+        qdevice = build_generic_qdevice(f"qdevice_{name}", cfg=cfg)
+        return NodeStack(name, qdevice_type="generic", qdevice=qdevice, node_id=node_id)
+
+    def _run(self) -> None:
+        self._link_prot.start()
+        self._alice.start()
+        self._bob.start()
+        ns.sim_run(end_time=1e5)
+
+    def test_application_qubit_unchanged(self):
+        # An application on the receiving node holds qubit 0, in state |1>.
+        self._bob.qnos.physical_memory.allocate_id(0)
+        [qubit] = qubitapi.create_qubits(1)
+        qubitapi.operate(qubit, ns.X)
+        self._bob.qdevice.put(qubit, positions=[0])
+        self._run()
+
+        pairs = self._bob.qnos.netstack.get_buffer(0).pairs
+        assert len(pairs) == 2
+        assert all(pair.phys_id != 0 for pair in pairs)
+        [qubit] = self._bob.qdevice.peek(0)
+        assert qubitapi.fidelity(qubit, ketstates.s1) > 0.999
+
+    def test_pause_while_application_holds_empty_qubit(self):
+        # The application allocated qubit 0 but did not initialize it yet, so the
+        # EGP could deliver a pair in it.
+        self._bob.qnos.physical_memory.allocate_id(0)
+        self._run()
+
+        assert len(self._bob.qnos.netstack.get_buffer(0).pairs) == 0
+        assert not self._bob.qdevice.mem_positions[0].in_use
+
+
+class TestNodeStackPorts(unittest.TestCase):
+    def setUp(self) -> None:
+        ns.sim_reset()
+
+    def _stack(self, name: str) -> NodeStack:
+        qdevice = build_nv_qdevice(f"nv_qdevice_{name}", cfg=NVQDeviceConfig())
+        return NodeStack(name, qdevice_type="nv", qdevice=qdevice)
+
+    def test_single_peer_port_aliases(self):
+        alice, bob = self._stack("alice"), self._stack("bob")
+        alice.connect_to(bob)
+
+        node = alice.node
+        assert node.host_peer_out_port is node.get_host_peer_out_port("bob")
+        assert node.host_peer_in_port is node.get_host_peer_in_port("bob")
+        assert node.qnos_peer_out_port is node.get_qnos_peer_out_port("bob")
+        assert node.qnos_peer_in_port is node.get_qnos_peer_in_port("bob")
+
+        alice.connect_to(self._stack("charlie"))
+        with self.assertRaises(ValueError):
+            node.host_peer_out_port
 
 
 if __name__ == "__main__":
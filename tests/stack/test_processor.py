@@ -2,6 +2,7 @@ import unittest
 from typing import Dict, Generator
 
 import netsquid as ns
+import numpy as np
 from netqasm.lang.instr.flavour import NVFlavour
 from netqasm.lang.parsing import parse_text_subroutine
 from netsquid.components import QuantumProcessor
@@ -13,10 +14,12 @@ from netsquid_magic.link_layer import (
 from netsquid_nv.magic_distributor import NVSingleClickMagicDistributor
 
 from pydynaa import EventExpression
-from squidasm.run.stack.build import build_nv_qdevice
-from squidasm.run.stack.config import NVQDeviceConfig
-from squidasm.sim.stack.common import AppMemory
-from squidasm.sim.stack.processor import NVProcessor
+from squidasm.run.stack.build import build_generic_qdevice, build_nv_qdevice
+from squidasm.run.stack.config import GenericQDeviceConfig, NVQDeviceConfig
+from squidasm.sim.stack.common import AppMemory, CompactAppMemory, RegisterMeta
+from squidasm.sim.stack.handler import Handler
+from squidasm.sim.stack.netstack import Netstack
+from squidasm.sim.stack.processor import GenericProcessor, NVProcessor
 from squidasm.sim.stack.qnos import Qnos
 from squidasm.sim.stack.stack import NodeStack
 
@@ -68,7 +71,10 @@ class TestProcessorTwoNodes(unittest.TestCase):
         if self._check_cmem:
             self._check_cmem(self._alice.qnos.app_memories, self._bob.qnos.app_memories)
 
-    def test_entangle_ck(self):
+    def _entangle_ck(self, receive_delay: float = 0) -> None:
+        """Create a pair between alice and bob, where bob issues its receive
+        request `receive_delay` nanoseconds after alice issued her create
+        request."""
         APP_ID = 0
 
         SUBRT_1 = f"""
@@ -102,6 +108,8 @@ class TestProcessorTwoNodes(unittest.TestCase):
 
         class BobProcessor(NVProcessor):
             def run(self) -> Generator[EventExpression, None, None]:
+                if receive_delay > 0:
+                    yield self.await_timer(receive_delay)
                 subroutine = parse_text_subroutine(SUBRT_2)
                 yield from self.execute_subroutine(subroutine)
 
@@ -137,6 +145,13 @@ class TestProcessorTwoNodes(unittest.TestCase):
         self._bob.qnos.app_memories[APP_ID] = AppMemory(APP_ID, 2)
         self._bob.qnos.netstack.open_epr_socket(APP_ID, 0, 0)
 
+    def test_entangle_ck(self):
+        self._entangle_ck()
+
+    def test_entangle_ck_late_receive(self):
+        # Alice's create request waits for bob's receive request to reach the EGP.
+        self._entangle_ck(receive_delay=1e6)
+
 
 class TestProcessorSingleNode(unittest.TestCase):
     def setUp(self) -> None:
@@ -488,6 +503,476 @@ class TestProcessorSingleNode(unittest.TestCase):
             self._alice.qnos_comp.processor_comp, self._alice.qnos
         )
 
+    def test_fused_gates(self):
+        APP_ID = 0
+
+        SUBRT = f"""
+        # NETQASM 1.0
+        # APPID {APP_ID}
+        set Q0 0
+        qalloc Q0
+        init Q0
+        rot_x Q0 8 4
+        rot_x Q0 8 4
+        """
+
+        class AliceProcessor(NVProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(SUBRT, flavour=NVFlavour())
+                yield from self.execute_subroutine(subroutine)
+
+        def check_qmem(qdevice_alice: QuantumProcessor) -> None:
+            [q0] = qdevice_alice.peek(0, skip_noise=True)
+            assert qubitapi.fidelity(q0, ketstates.s1) > 0.99
+            # Fused gates take as long as when they are executed one by one.
+            config = NVQDeviceConfig.perfect_config()
+            assert ns.sim_time() == config.electron_init + 2 * config.electron_rot_x
+
+        self._check_qmem = check_qmem
+        self._check_cmem = None
+
+        self._alice.qnos.app_memories[APP_ID] = AppMemory(APP_ID, 2)
+        self._alice.qnos.processor = AliceProcessor(
+            self._alice.qnos_comp.processor_comp, self._alice.qnos
+        )
+        self._alice.qnos.processor.fuse_gates = True
+
+    def test_classical_loop(self):
+        APP_ID = 0
+
+        SUBRT = f"""
+        # NETQASM 1.0
+        # APPID {APP_ID}
+        set R0 0
+        set R1 5
+        set R2 1
+        beq R0 R1 6
+        add R0 R0 R2
+        jmp 3
+        set Q0 0
+        qalloc Q0
+        init Q0
+        meas Q0 M0
+        """
+
+        class AliceProcessor(NVProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(SUBRT, flavour=NVFlavour())
+                yield from self.execute_subroutine(subroutine)
+
+        def check_cmem(app_mems_alice: Dict[int, AppMemory]) -> None:
+            mem = app_mems_alice[0]
+            assert mem.get_reg_value("R0") == 5
+            assert mem.get_reg_value("M0") == 0
+            assert mem.prog_counter == 10
+
+        self._check_qmem = None
+        self._check_cmem = check_cmem
+
+        self._alice.qnos.app_memories[APP_ID] = AppMemory(APP_ID, 2)
+        self._alice.qnos.processor = AliceProcessor(
+            self._alice.qnos_comp.processor_comp, self._alice.qnos
+        )
+
+    def test_wait_all(self):
+        APP_ID = 0
+
+        SUBRT = f"""
+        # NETQASM 1.0
+        # APPID {APP_ID}
+        set R0 0
+        set R1 4
+        array R1 @0
+        wait_all @0[R0:R1]
+        set R2 1
+        """
+
+        class AliceProcessor(NVProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(SUBRT, flavour=NVFlavour())
+                yield from self.execute_subroutine(subroutine)
+
+        messages = []
+
+        class AliceNetstack(Netstack):
+            def _send_processor_msg(self, msg: str) -> None:
+                messages.append((ns.sim_time(), msg))
+                super()._send_processor_msg(msg)
+
+            def run(self) -> Generator[EventExpression, None, None]:
+                # Write the awaited slice in parts, as for a batch of EPR pairs.
+                for i in range(4):
+                    yield self.await_timer(100)
+                    self._write_array_values(APP_ID, 0, i, [i])
+
+        def check_cmem(app_mems_alice: Dict[int, AppMemory]) -> None:
+            mem = app_mems_alice[APP_ID]
+            assert mem.get_reg_value("R2") == 1
+            assert mem.get_array(0) == [0, 1, 2, 3]
+            # The processor is only woken up when the whole slice is written.
+            assert messages == [(400, "wrote to array")]
+
+        self._check_qmem = None
+        self._check_cmem = check_cmem
+
+        self._alice.qnos.app_memories[APP_ID] = AppMemory(APP_ID, 2)
+        self._alice.qnos.processor = AliceProcessor(
+            self._alice.qnos_comp.processor_comp, self._alice.qnos
+        )
+        self._alice.qnos.netstack = AliceNetstack(
+            self._alice.qnos_comp.netstack_comp, self._alice.qnos
+        )
+
+    def test_interleave_subroutines(self):
+        # App 0 waits for the netstack, app 1 only uses the quantum device.
+        SUBRT_0 = """
+        # NETQASM 1.0
+        # APPID 0
+        set R0 0
+        set R1 1
+        array R1 @0
+        wait_all @0[R0:R1]
+        """
+
+        SUBRT_1 = """
+        # NETQASM 1.0
+        # APPID 1
+        set Q0 0
+        qalloc Q0
+        init Q0
+        """
+
+        done = []
+
+        class AliceHandler(Handler):
+            def run(self) -> Generator[EventExpression, None, None]:
+                for subrt in [SUBRT_0, SUBRT_1]:
+                    subroutine = parse_text_subroutine(subrt, flavour=NVFlavour())
+                    self._send_processor_msg(subroutine)
+                for _ in range(2):
+                    msg = yield from self._receive_processor_msg()
+                    done.append((ns.sim_time(), msg.app_id))
+
+        class AliceNetstack(Netstack):
+            def run(self) -> Generator[EventExpression, None, None]:
+                yield self.await_timer(10_000)
+                self._write_array_values(0, 0, 0, [1])
+
+        def check_cmem(app_mems_alice: Dict[int, AppMemory]) -> None:
+            # App 1 finishes while app 0 waits.
+            init_time = NVQDeviceConfig.perfect_config().electron_init
+            assert done == [(init_time, 1), (10_000, 0)]
+
+        self._check_qmem = None
+        self._check_cmem = check_cmem
+
+        qnos = self._alice.qnos
+        for app_id in [0, 1]:
+            qnos.app_memories[app_id] = AppMemory(app_id, 2)
+        qnos.handler = AliceHandler(self._alice.qnos_comp.handler_comp, qnos)
+        qnos.netstack = AliceNetstack(self._alice.qnos_comp.netstack_comp, qnos)
+        qnos.processor.interleave_subroutines = True
+
+    def _measure_memory_qubit(self, optimize_placement: bool) -> None:
+        APP_ID = 0
+
+        SUBRT = f"""
+        # NETQASM 1.0
+        # APPID {APP_ID}
+        set Q0 1
+        qalloc Q0
+        init Q0
+        rot_x Q0 16 4
+        meas Q0 M0
+        qfree Q0
+        """
+
+        class AliceProcessor(NVProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(SUBRT, flavour=NVFlavour())
+                yield from self.execute_subroutine(subroutine)
+
+        self._alice.qnos.app_memories[APP_ID] = AppMemory(APP_ID, 2)
+        self._alice.qnos.processor = AliceProcessor(
+            self._alice.qnos_comp.processor_comp, self._alice.qnos
+        )
+        self._alice.qnos.processor.optimize_placement = optimize_placement
+
+    def test_optimize_placement(self):
+        def check_cmem(app_mems_alice: Dict[int, AppMemory]) -> None:
+            mem = app_mems_alice[0]
+            assert mem.get_reg_value("M0") == 1
+            # The qubit was placed on the electron, so it was never moved.
+            processor = self._alice.qnos.processor
+            assert processor.num_moves_saved == 1
+            assert processor.num_moves == 0
+            config = NVQDeviceConfig.perfect_config()
+            assert ns.sim_time() == (
+                config.electron_init + config.electron_rot_x + config.measure
+            )
+
+        self._check_qmem = None
+        self._check_cmem = check_cmem
+        self._measure_memory_qubit(optimize_placement=True)
+
+    def test_no_optimize_placement(self):
+        def check_cmem(app_mems_alice: Dict[int, AppMemory]) -> None:
+            mem = app_mems_alice[0]
+            assert mem.get_reg_value("M0") == 1
+            # The qubit was placed on a carbon and moved to the electron for its
+            # measurement, which is the move that optimized placement saves.
+            processor = self._alice.qnos.processor
+            assert processor.num_moves_saved == 0
+            assert processor.num_moves == 1
+
+        self._check_qmem = None
+        self._check_cmem = check_cmem
+        self._measure_memory_qubit(optimize_placement=False)
+
+
+class TestGenericProcessorParallelGates(unittest.TestCase):
+    SUBRT = """
+    # NETQASM 1.0
+    # APPID 0
+    set Q0 0
+    set Q1 1
+    qalloc Q0
+    qalloc Q1
+    init Q0
+    init Q1
+    h Q0
+    h Q1
+    z Q0
+    """
+
+    def _run(self, parallel: bool) -> float:
+        ns.sim_reset()
+        config = GenericQDeviceConfig.perfect_config()
+        config.parallel_gates = parallel
+        qdevice = build_generic_qdevice("qdevice_alice", cfg=config)
+        alice = NodeStack("alice", qdevice_type="generic", qdevice=qdevice, node_id=0)
+        alice.qnos = Qnos(alice.qnos_comp)
+
+        subrt = self.SUBRT
+
+        class AliceProcessor(GenericProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(subrt)
+                yield from self.execute_subroutine(subroutine)
+
+        alice.qnos.app_memories[0] = AppMemory(0, 2)
+        alice.qnos.processor = AliceProcessor(
+            alice.qnos_comp.processor_comp, alice.qnos
+        )
+        alice.qnos.processor.parallel_gates = parallel
+        alice.qnos.start()
+        ns.sim_run()
+
+        [q0] = qdevice.peek(0, skip_noise=True)
+        [q1] = qdevice.peek(1, skip_noise=True)
+        assert qubitapi.fidelity(q0, ketstates.h1) > 0.99
+        assert qubitapi.fidelity(q1, ketstates.h0) > 0.99
+        return ns.sim_time()
+
+    def test_parallel_gates(self):
+        gate_time = GenericQDeviceConfig.perfect_config().single_qubit_gate_time
+        assert self._run(parallel=False) == 3 * gate_time
+        # The H gates act on disjoint qubits and are executed at the same time.
+        assert self._run(parallel=True) == 2 * gate_time
+
+
+class TestCompactAppMemory(unittest.TestCase):
+    SUBRT = """
+    # NETQASM 1.0
+    # APPID 0
+    set R0 0
+    set R1 3
+    array R1 @0
+    store R1 @0[R0]
+    add R0 R0 1
+    store R0 @0[R0]
+    load R2 @0[R0]
+    add R2 R2 R1
+    """
+
+    def _run(self, app_mem: AppMemory) -> None:
+        ns.sim_reset()
+        qdevice = build_nv_qdevice("qdevice", cfg=NVQDeviceConfig.perfect_config())
+        alice = NodeStack("alice", qdevice_type="nv", qdevice=qdevice, node_id=0)
+        alice.qnos = Qnos(alice.qnos_comp)
+
+        subrt = self.SUBRT
+
+        class AliceProcessor(NVProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(subrt, flavour=NVFlavour())
+                yield from self.execute_subroutine(subroutine)
+
+        alice.qnos.app_memories[0] = app_mem
+        alice.qnos.processor = AliceProcessor(
+            alice.qnos_comp.processor_comp, alice.qnos
+        )
+        alice.qnos.start()
+        ns.sim_run()
+
+    def test_same_as_app_memory(self):
+        app_mem = AppMemory(0, 2)
+        compact_mem = CompactAppMemory(0, 2)
+        self._run(app_mem)
+        self._run(compact_mem)
+
+        for reg in ["R0", "R1", "R2", "R3"]:
+            assert compact_mem.get_register(reg) == app_mem.get_register(reg)
+        assert compact_mem.get_array(0) == app_mem.get_array(0) == [3, 1, None]
+        assert compact_mem.get_array_part(0, 1) == 1
+        assert compact_mem.get_array_part(0, slice(1, 3)) == [1, None]
+
+    def test_bulk_access(self):
+        mem = CompactAppMemory(0, 2)
+        mem.init_new_array(0, 4)
+        mem.write_array(0, 1, np.array([5, CompactAppMemory.UNDEFINED, 7]))
+        assert mem.get_array(0) == [None, 5, None, 7]
+        assert mem.read_array(0, 2).tolist() == [CompactAppMemory.UNDEFINED, 7]
+        with self.assertRaises(IndexError):
+            mem.write_array(0, 2, np.array([1, 2, 3]))
+
+    def test_compact_storage_only(self):
+        mem = CompactAppMemory(0, 2)
+        assert not hasattr(mem, "_registers")
+        assert not hasattr(mem, "_arrays")
+        with self.assertRaises(IndexError):
+            mem.get_array_value(1, 0)
+        with self.assertRaises(IndexError):
+            mem.get_array(1)
+
+
+class TestCompiledSubroutines(unittest.TestCase):
+    """Differential tests, comparing compiled subroutines with the interpreter."""
+
+    def _run(self, subrt: str, compiled: bool, fuse: bool = False) -> Dict:
+        ns.sim_reset()
+        qdevice = build_nv_qdevice("qdevice", cfg=NVQDeviceConfig.perfect_config())
+        alice = NodeStack("alice", qdevice_type="nv", qdevice=qdevice, node_id=0)
+        alice.qnos = Qnos(alice.qnos_comp)
+
+        class AliceProcessor(NVProcessor):
+            def run(self) -> Generator[EventExpression, None, None]:
+                subroutine = parse_text_subroutine(subrt, flavour=NVFlavour())
+                # Executing twice also uses the cached compiled subroutine.
+                yield from self.execute_subroutine(subroutine)
+                yield from self.execute_subroutine(subroutine)
+
+        app_mem = AppMemory(0, 2)
+        alice.qnos.app_memories[0] = app_mem
+        alice.qnos.processor = AliceProcessor(
+            alice.qnos_comp.processor_comp, alice.qnos
+        )
+        alice.qnos.processor.compile_subroutines = compiled
+        alice.qnos.processor.fuse_gates = fuse
+        alice.qnos.start()
+        ns.sim_run()
+
+        registers = {
+            f"{group}{i}": app_mem.get_reg_value(f"{group}{i}")
+            for group in RegisterMeta.prefixes()
+            for i in range(16)
+        }
+        return {
+            "registers": registers,
+            "array": app_mem.get_array_part(0, slice(0, 4)),
+            "prog_counter": app_mem.prog_counter,
+            "time": ns.sim_time(),
+        }
+
+    def _check(self, subrt: str, fuse: bool = False) -> None:
+        interpreted = self._run(subrt, compiled=False, fuse=fuse)
+        compiled = self._run(subrt, compiled=True, fuse=fuse)
+        assert compiled == interpreted
+
+    def test_classical(self):
+        self._check(
+            """
+            # NETQASM 1.0
+            # APPID 0
+            set R0 0
+            set R1 4
+            set R2 1
+            set C0 3
+            array R1 @0
+            store R0 @0[R0]
+            add R0 R0 R2
+            addm R3 R0 C0 C0
+            sub R4 R1 R0
+            blt R0 R1 5
+            load R5 @0[R2]
+            undef @0[R2]
+            lea R6 @0
+            """
+        )
+
+    def test_quantum(self):
+        self._check(
+            """
+            # NETQASM 1.0
+            # APPID 0
+            set R0 1
+            array R0 @0
+            set Q0 0
+            qalloc Q0
+            init Q0
+            rot_x Q0 16 4
+            meas Q0 M0
+            qfree Q0
+            bez M0 12
+            set R1 7
+            store R1 @0[0]
+            set R2 1
+            """
+        )
+
+    def test_fused(self):
+        subrt = """
+            # NETQASM 1.0
+            # APPID 0
+            set Q0 0
+            qalloc Q0
+            init Q0
+            rot_x Q0 8 4
+            rot_x Q0 8 4
+            meas Q0 M0
+            qfree Q0
+            """
+        self._check(subrt)
+        self._check(subrt, fuse=True)
+
+    def test_cache_evicts_least_recently_used(self):
+        ns.sim_reset()
+        qdevice = build_nv_qdevice("qdevice", cfg=NVQDeviceConfig.perfect_config())
+        alice = NodeStack("alice", qdevice_type="nv", qdevice=qdevice, node_id=0)
+        processor = alice.qnos.processor
+        processor._MAX_COMPILED_SUBROUTINES = 2
+
+        subroutines = [
+            parse_text_subroutine(
+                f"""
+                # NETQASM 1.0
+                # APPID 0
+                set R0 {value}
+                """,
+                flavour=NVFlavour(),
+            )
+            for value in range(3)
+        ]
+        first = processor._get_compiled(subroutines[0])
+        processor._get_compiled(subroutines[1])
+        # Using the first subroutine again makes the second the least recent one.
+        assert processor._get_compiled(subroutines[0]) is first
+        processor._get_compiled(subroutines[2])
+
+        cached = [key for key, _ in processor._compiled]
+        assert cached == [bytes(subroutines[0]), bytes(subroutines[2])]
+        assert processor._get_compiled(subroutines[0]) is first
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,734 @@
+import json
+import os
+import tempfile
+import unittest
+from typing import Any, Dict, Generator, List
+
+from netqasm.sdk.qubit import Qubit
+
+from pydynaa import EventExpression
+from squidasm.run.stack.adaptive import run_until
+from squidasm.run.stack.config import LinkConfig, StackConfig, StackNetworkConfig
+from squidasm.run.stack.run import prepare, run, run_parallel, run_workload
+from squidasm.run.stack.sink import CallbackSink, ColumnarSink, JsonLinesSink
+from squidasm.run.stack.sweep import get_config_value, set_config_value, sweep
+from squidasm.sim.stack.netstack import PriorityPolicy
+from squidasm.sim.stack.profiling import Profiler
+from squidasm.sim.stack.program import Program, ProgramContext, ProgramMeta
+
+
+class MeasurePlusProgram(Program):
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="measure_plus",
+            csockets=[],
+            epr_sockets=[],
+            max_qubits=1,
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        q = Qubit(conn)
+        q.H()
+        m = q.measure()
+        yield from conn.flush()
+        return {"outcome": int(m)}
+
+
+class MeasureZeroProgram(Program):
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="measure_zero",
+            csockets=[],
+            epr_sockets=[],
+            max_qubits=1,
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        q = Qubit(conn)
+        m = q.measure()
+        yield from conn.flush()
+        return {"outcome": int(m)}
+
+
+class HubProgram(Program):
+    """Share an EPR pair with each leaf and tell the leaf the local outcome."""
+
+    def __init__(self, leaves: List[str]) -> None:
+        self._leaves = leaves
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="hub",
+            csockets=self._leaves,
+            epr_sockets=self._leaves,
+            max_qubits=1,
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        outcomes = {}
+        for leaf in self._leaves:
+            q = context.epr_sockets[leaf].create_keep()[0]
+            m = q.measure()
+            yield from conn.flush()
+            outcomes[leaf] = int(m)
+            context.csockets[leaf].send_int(int(m))
+        return outcomes
+
+
+class ConcurrentHubProgram(Program):
+    """Share an EPR pair with each leaf, requesting all pairs at once."""
+
+    def __init__(self, leaves: List[str]) -> None:
+        self._leaves = leaves
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="hub",
+            csockets=self._leaves,
+            epr_sockets=self._leaves,
+            max_qubits=len(self._leaves),
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        qubits = [context.epr_sockets[leaf].create_keep()[0] for leaf in self._leaves]
+        outcomes = [q.measure() for q in qubits]
+        yield from conn.flush()
+        for leaf, m in zip(self._leaves, outcomes):
+            context.csockets[leaf].send_int(int(m))
+        return {leaf: int(m) for leaf, m in zip(self._leaves, outcomes)}
+
+
+class LeafProgram(Program):
+    def __init__(self, hub: str) -> None:
+        self._hub = hub
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="leaf",
+            csockets=[self._hub],
+            epr_sockets=[self._hub],
+            max_qubits=1,
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        q = context.epr_sockets[self._hub].recv_keep()[0]
+        m = q.measure()
+        yield from conn.flush()
+        hub_outcome = yield from context.csockets[self._hub].recv_int()
+        return {"outcome": int(m), "hub_outcome": hub_outcome}
+
+
+class CreatePairsProgram(Program):
+    """Create a number of EPR pairs in each of a number of requests and measure
+    them."""
+
+    def __init__(
+        self, peer: str, num_pairs: int, receive: bool = False, num_requests: int = 1
+    ) -> None:
+        self._peer = peer
+        self._num_pairs = num_pairs
+        self._receive = receive
+        self._num_requests = num_requests
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="pairs",
+            csockets=[],
+            epr_sockets=[self._peer],
+            max_qubits=self._num_pairs * self._num_requests,
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        epr_socket = context.epr_sockets[self._peer]
+        qubits = []
+        for _ in range(self._num_requests):
+            if self._receive:
+                qubits += epr_socket.recv_keep(number=self._num_pairs)
+            else:
+                qubits += epr_socket.create_keep(number=self._num_pairs)
+        outcomes = [q.measure() for q in qubits]
+        yield from conn.flush()
+        return {"outcomes": [int(m) for m in outcomes]}
+
+
+class EprAndGatesProgram(Program):
+    """Apply gates to a local qubit and share an EPR pair with a peer, to which
+    an X gate is applied if `flip` is True, and measure both qubits."""
+
+    def __init__(
+        self, name: str, peer: str, receive: bool = False, flip: bool = False
+    ) -> None:
+        self._name = name
+        self._peer = peer
+        self._receive = receive
+        self._flip = flip
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name=self._name, csockets=[], epr_sockets=[self._peer], max_qubits=2
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        epr_socket = context.epr_sockets[self._peer]
+        local = Qubit(conn)
+        local.H()
+        local.Z()
+        local.H()
+        yield from conn.flush()
+
+        if self._receive:
+            q = epr_socket.recv_keep()[0]
+        else:
+            q = epr_socket.create_keep()[0]
+        if self._flip:
+            q.X()
+        m = q.measure()
+        m_local = local.measure()
+        yield from conn.flush()
+        return {"name": self._name, "outcome": int(m), "local": int(m_local)}
+
+
+class KeepAndMeasureProgram(Program):
+    """Apply gates to a local qubit while sharing an EPR pair with a peer, then
+    measure EPR pairs directly, and measure both kept qubits."""
+
+    def __init__(self, peer: str, num_measured: int, receive: bool = False) -> None:
+        self._peer = peer
+        self._num_measured = num_measured
+        self._receive = receive
+
+    @property
+    def meta(self) -> ProgramMeta:
+        return ProgramMeta(
+            name="keep_and_measure",
+            csockets=[],
+            epr_sockets=[self._peer],
+            max_qubits=2,
+        )
+
+    def run(
+        self, context: ProgramContext
+    ) -> Generator[EventExpression, None, Dict[str, Any]]:
+        conn = context.connection
+        epr_socket = context.epr_sockets[self._peer]
+        local = Qubit(conn)
+        local.H()
+        local.Z()
+        local.H()
+        if self._receive:
+            q = epr_socket.recv_keep()[0]
+            results = epr_socket.recv_measure(number=self._num_measured)
+        else:
+            q = epr_socket.create_keep()[0]
+            results = epr_socket.create_measure(number=self._num_measured)
+        m = q.measure()
+        m_local = local.measure()
+        yield from conn.flush()
+        return {
+            "outcome": int(m),
+            "local": int(m_local),
+            "measured": [int(r.measurement_outcome) for r in results],
+        }
+
+
+def _two_app_config(**stack_options: Any) -> StackNetworkConfig:
+    """Configuration of two nodes that each have room for two applications of
+    `EprAndGatesProgram`."""
+    stacks = [StackConfig.perfect_generic_config(name) for name in ["alice", "bob"]]
+    for stack in stacks:
+        stack.qdevice_cfg.num_qubits = 4
+        for option, value in stack_options.items():
+            setattr(stack, option, value)
+    return StackNetworkConfig(
+        stacks=stacks, links=[LinkConfig.perfect_config("alice", "bob")]
+    )
+
+
+def _single_node_config() -> StackNetworkConfig:
+    return StackNetworkConfig(
+        stacks=[StackConfig.perfect_generic_config("alice")], links=[]
+    )
+
+
+class TestRun(unittest.TestCase):
+    def test_run(self):
+        [results] = run(
+            _single_node_config(), {"alice": MeasurePlusProgram()}, num_times=5
+        )
+        assert len(results) == 5
+        assert all(r["outcome"] in [0, 1] for r in results)
+
+    def test_run_parallel(self):
+        [results] = run_parallel(
+            _single_node_config(),
+            {"alice": MeasurePlusProgram()},
+            num_times=7,
+            workers=3,
+            seed=42,
+        )
+        assert len(results) == 7
+        assert all(r["outcome"] in [0, 1] for r in results)
+
+    def test_seeded_run_is_reproducible(self):
+        config = _single_node_config()
+        programs = {"alice": MeasurePlusProgram()}
+        [serial] = run(config, programs, num_times=8, seed=7)
+        [parallel] = run_parallel(config, programs, num_times=8, workers=3, seed=7)
+        assert parallel == serial
+
+        # A single iteration can be replayed on its own.
+        [replayed] = prepare(config).run_iterations(programs, [5], seed=7)
+        assert replayed == [serial[5]]
+
+    def test_star_network(self):
+        leaves = ["alice", "charlie", "dave"]
+        config = StackNetworkConfig(
+            stacks=[
+                StackConfig.perfect_generic_config(name) for name in ["hub"] + leaves
+            ],
+            links=[LinkConfig.perfect_config("hub", leaf) for leaf in leaves],
+        )
+        programs = {leaf: LeafProgram("hub") for leaf in leaves}
+        programs["hub"] = HubProgram(leaves)
+        [hub_results, *leaf_results] = run(config, programs, num_times=2)
+
+        for hub_result, *leaf_result in zip(hub_results, *leaf_results):
+            for leaf, result in zip(leaves, leaf_result):
+                assert result["hub_outcome"] == hub_result[leaf]
+                assert result["outcome"] == hub_result[leaf]
+
+    def test_pairs_in_flight(self):
+        for max_pairs in [1, None]:
+            stacks = [
+                StackConfig.perfect_generic_config(name) for name in ["alice", "bob"]
+            ]
+            for stack in stacks:
+                stack.max_pairs_in_flight = max_pairs
+            config = StackNetworkConfig(
+                stacks=stacks, links=[LinkConfig.perfect_config("alice", "bob")]
+            )
+            programs = {
+                "alice": CreatePairsProgram("bob", 2),
+                "bob": CreatePairsProgram("alice", 2, receive=True),
+            }
+            [alice_results, bob_results] = run(config, programs, num_times=3)
+
+            for alice_result, bob_result in zip(alice_results, bob_results):
+                assert len(alice_result["outcomes"]) == 2
+                assert alice_result["outcomes"] == bob_result["outcomes"]
+
+    def test_late_receive_depolarise_link(self):
+        stacks = [StackConfig.perfect_generic_config(name) for name in ["alice", "bob"]]
+        # Bob's local gates delay his receive request long after alice's create
+        # request.
+        stacks[1].qdevice_cfg.single_qubit_gate_time = 1e6
+        link = LinkConfig(
+            stack1="alice",
+            stack2="bob",
+            typ="depolarise",
+            cfg={"fidelity": 1, "prob_success": 1, "t_cycle": 10},
+        )
+        config = StackNetworkConfig(stacks=stacks, links=[link])
+        programs = {
+            "alice": EprAndGatesProgram("alice", "bob"),
+            "bob": EprAndGatesProgram("bob", "alice", receive=True),
+        }
+        [alice_results, bob_results] = run(config, programs, num_times=2)
+
+        for alice_result, bob_result in zip(alice_results, bob_results):
+            assert alice_result["outcome"] == bob_result["outcome"]
+            assert bob_result["local"] == 1
+
+    def test_interleave_concurrent_apps(self):
+        config = _two_app_config(interleave_subroutines=True)
+        programs = {
+            "alice": [EprAndGatesProgram(name, "bob") for name in ["a", "b"]],
+            "bob": [
+                EprAndGatesProgram(name, "alice", receive=True) for name in ["a", "b"]
+            ],
+        }
+        [alice_results, bob_results] = run(config, programs, num_times=3)
+
+        assert len(alice_results) == len(bob_results) == 6
+        for results in [alice_results, bob_results]:
+            # H Z H is an X gate.
+            assert all(result["local"] == 1 for result in results)
+        for i in range(0, 6, 2):
+            alice_outcomes = [r["outcome"] for r in alice_results[i : i + 2]]
+            bob_outcomes = [r["outcome"] for r in bob_results[i : i + 2]]
+            assert sorted(alice_outcomes) == sorted(bob_outcomes)
+
+    def test_priority_concurrent_apps(self):
+        prepared = prepare(_two_app_config())
+        for stack in prepared.network.stacks.values():
+            stack.qnos.netstack.scheduling_policy = PriorityPolicy({1: 1})
+        programs = {
+            "alice": [
+                EprAndGatesProgram(name, "bob", flip=name == "b") for name in ["a", "b"]
+            ],
+            "bob": [
+                EprAndGatesProgram(name, "alice", receive=True) for name in ["a", "b"]
+            ],
+        }
+        for _ in range(3):
+            [alice_results, bob_results] = prepared.run(programs)
+
+            # Only the pair of "b" is flipped, so if the pairs of the applications
+            # were swapped, the outcomes of one of them would not match.
+            alice_outcomes = {r["name"]: r["outcome"] for r in alice_results}
+            bob_outcomes = {r["name"]: r["outcome"] for r in bob_results}
+            assert alice_outcomes["a"] == bob_outcomes["a"]
+            assert alice_outcomes["b"] == 1 - bob_outcomes["b"]
+
+    def test_outstanding_requests(self):
+        config = StackNetworkConfig(
+            stacks=[
+                StackConfig.perfect_generic_config(name) for name in ["alice", "bob"]
+            ],
+            links=[LinkConfig.perfect_config("alice", "bob")],
+        )
+        programs = {
+            "alice": CreatePairsProgram("bob", 1, num_requests=2),
+            "bob": CreatePairsProgram("alice", 1, receive=True, num_requests=2),
+        }
+        [alice_results, bob_results] = run(config, programs, num_times=3)
+
+        for alice_result, bob_result in zip(alice_results, bob_results):
+            assert len(alice_result["outcomes"]) == 2
+            assert alice_result["outcomes"] == bob_result["outcomes"]
+
+    def test_entanglement_buffer(self):
+        for max_age in [None, 1.0]:
+            link = LinkConfig.perfect_config("alice", "bob")
+            link.buffer_size = 2
+            link.buffer_max_age = max_age
+            config = StackNetworkConfig(
+                stacks=[
+                    StackConfig.perfect_generic_config(name)
+                    for name in ["alice", "bob"]
+                ],
+                links=[link],
+            )
+            programs = {
+                "alice": CreatePairsProgram("bob", 2),
+                "bob": CreatePairsProgram("alice", 2, receive=True),
+            }
+            [alice_results, bob_results] = run(config, programs, num_times=3)
+
+            for alice_result, bob_result in zip(alice_results, bob_results):
+                assert len(alice_result["outcomes"]) == 2
+                assert alice_result["outcomes"] == bob_result["outcomes"]
+
+    def test_entanglement_buffer_with_gates_and_md(self):
+        config = _two_app_config()
+        config.links[0].buffer_size = 2
+        programs = {
+            "alice": KeepAndMeasureProgram("bob", 2),
+            "bob": KeepAndMeasureProgram("alice", 2, receive=True),
+        }
+        [alice_results, bob_results] = run(config, programs, num_times=3)
+
+        for alice_result, bob_result in zip(alice_results, bob_results):
+            # H Z H is an X gate.
+            assert alice_result["local"] == bob_result["local"] == 1
+            assert alice_result["outcome"] == bob_result["outcome"]
+            assert len(alice_result["measured"]) == len(bob_result["measured"]) == 2
+
+    def test_concurrent_star_network(self):
+        leaves = ["alice", "charlie"]
+        config = StackNetworkConfig(
+            stacks=[
+                StackConfig.perfect_generic_config(name) for name in ["hub"] + leaves
+            ],
+            links=[LinkConfig.perfect_config("hub", leaf) for leaf in leaves],
+        )
+        programs = {leaf: LeafProgram("hub") for leaf in leaves}
+        programs["hub"] = ConcurrentHubProgram(leaves)
+        [hub_results, *leaf_results] = run(config, programs, num_times=2)
+
+        for hub_result, *leaf_result in zip(hub_results, *leaf_results):
+            for leaf, result in zip(leaves, leaf_result):
+                assert result["hub_outcome"] == hub_result[leaf]
+                assert result["outcome"] == hub_result[leaf]
+
+    def test_prepared_network(self):
+        prepared = prepare(_single_node_config())
+        network = prepared.network
+        for num_times in [1, 3, 2]:
+            [results] = prepared.run({"alice": MeasurePlusProgram()}, num_times)
+            assert len(results) == num_times
+            assert all(r["outcome"] in [0, 1] for r in results)
+        # The network is not rebuilt between runs.
+        assert prepared.network is network
+
+    def test_sweep(self):
+        config = _single_node_config()
+        result = sweep(
+            config,
+            {"alice": MeasurePlusProgram()},
+            {"stacks[0].qdevice_cfg.single_qubit_gate_time": [10, 20, 30]},
+            num_times=2,
+            workers=2,
+        )
+        assert len(result) == 3
+        for point, [results] in result:
+            assert len(results) == 2
+        assert len(result.rows()) == 6
+        # The base configuration is left untouched.
+        assert config.stacks[0].qdevice_cfg.single_qubit_gate_time == 1000
+
+    def test_sweep_splits_iterations(self):
+        config = _single_node_config()
+        programs = {"alice": MeasurePlusProgram()}
+        parameters = {"stacks[0].qdevice_cfg.single_qubit_gate_time": [10]}
+        split = sweep(config, programs, parameters, num_times=5, workers=3, seed=1)
+        single = sweep(config, programs, parameters, num_times=5, workers=1, seed=1)
+        [[results]] = split.results
+        assert len(results) == 5
+        # Splitting the iterations over workers does not change the results.
+        assert split.results == single.results
+
+    def test_run_workload(self):
+        config = _single_node_config()
+        [results] = run_workload(
+            config,
+            {"alice": [(MeasurePlusProgram(), 3), MeasureZeroProgram()]},
+        )
+        assert [name for name, _ in results] == ["measure_plus"] * 3 + ["measure_zero"]
+        assert results[-1][1]["outcome"] == 0
+
+        def programs():
+            for _ in range(2):
+                yield MeasureZeroProgram()
+                yield MeasurePlusProgram()
+
+        [results] = run_workload(config, {"alice": programs()})
+        assert [name for name, _ in results] == ["measure_zero", "measure_plus"] * 2
+
+    def test_run_until(self):
+        config = _single_node_config()
+        programs = {"alice": MeasurePlusProgram()}
+
+        def metric_fn(results):
+            return results["alice"]["outcome"]
+
+        result = run_until(
+            config, programs, metric_fn, rel_tol=0.2, batch_size=20, seed=7
+        )
+        assert result.converged
+        assert result.num_times % 20 == 0
+        assert len(result.results[0]) == result.num_times
+        assert result.half_width <= 0.2 * abs(result.mean)
+        assert abs(result.mean - 0.5) < 0.2
+
+        # The iterations are those of a seeded run, also when run in parallel.
+        parallel = run_until(
+            config, programs, metric_fn, rel_tol=0.2, batch_size=20, workers=2, seed=7
+        )
+        assert parallel.values == result.values
+        assert run(config, programs, result.num_times, seed=7) == result.results
+
+        capped = run_until(
+            config, programs, metric_fn, rel_tol=1e-6, max_times=30, batch_size=20
+        )
+        assert not capped.converged
+        assert capped.num_times == 30
+
+    def test_run_until_stack_without_program(self):
+        config = StackNetworkConfig(
+            stacks=[
+                StackConfig.perfect_generic_config(name) for name in ["alice", "bob"]
+            ],
+            links=[],
+        )
+
+        def metric_fn(results):
+            assert list(results) == ["alice"]
+            return results["alice"]["outcome"]
+
+        result = run_until(
+            config,
+            {"alice": MeasurePlusProgram()},
+            metric_fn,
+            rel_tol=1e-6,
+            max_times=10,
+            batch_size=4,
+        )
+        assert result.num_times == 10
+        assert len(result.results[0]) == 10
+        assert result.results[1] == []
+
+    def test_run_until_concurrent_programs(self):
+        config = _single_node_config()
+        programs = {"alice": [MeasurePlusProgram(), MeasurePlusProgram()]}
+
+        def metric_fn(results):
+            # Both concurrent programs of an iteration are passed to the metric.
+            assert len(results["alice"]) == 2
+            return sum(result["outcome"] for result in results["alice"]) / 2
+
+        result = run_until(
+            config, programs, metric_fn, rel_tol=1e-6, max_times=6, batch_size=4
+        )
+        assert result.num_times == 6
+        assert len(result.results[0]) == 12
+        outcomes = [r["outcome"] for r in result.results[0]]
+        assert result.values == [
+            (outcomes[2 * k] + outcomes[2 * k + 1]) / 2 for k in range(6)
+        ]
+
+
+class TestProfiling(unittest.TestCase):
+    def test_profile(self):
+        prepared = prepare(_single_node_config())
+        programs = {"alice": MeasurePlusProgram()}
+        [results], report = prepared.run(programs, num_times=3, profile=True)
+        assert len(results) == 3
+        assert not Profiler.is_enabled()
+
+        host_stats = report.protocols["alice_host_protocol"]
+        assert host_stats.yields > 0
+        assert host_stats.messages["qnos"] > 0
+        assert report.instructions["MeasInstruction"] == 3
+        assert 0 <= report.protocol_time <= report.wall_time
+
+        # Without profiling, the protocols are not instrumented.
+        prepared.run(programs, num_times=1)
+        assert "run" not in vars(prepared.network.stacks["alice"].host)
+
+    def test_profile_compiled_subroutines(self):
+        programs = {"alice": MeasurePlusProgram()}
+        reports = []
+        for compile_subroutines in [False, True]:
+            config = _single_node_config()
+            config.stacks[0].compile_subroutines = compile_subroutines
+            _, report = run(config, programs, num_times=3, profile=True)
+            reports.append(report)
+        interpreted, compiled = reports
+
+        # Compiled subroutines execute the same instructions, including the
+        # classical instructions that are translated into Python code.
+        assert compiled.instructions == interpreted.instructions
+        assert compiled.instructions["SetInstruction"] > 0
+        # Messages are counted however a protocol takes them from its listeners.
+        for name in ["alice_host_protocol", "alice_processor_protocol"]:
+            messages = compiled.protocols[name].messages
+            assert sum(messages.values()) > 0
+            assert messages == interpreted.protocols[name].messages
+
+
+class TestResultSinks(unittest.TestCase):
+    def test_callback_sink(self):
+        written = []
+        sink = CallbackSink(lambda name, i, result: written.append((name, i, result)))
+        [results] = run(
+            _single_node_config(),
+            {"alice": MeasurePlusProgram()},
+            num_times=4,
+            sink=sink,
+            retain_results=False,
+        )
+        assert results == []
+        assert [(name, i) for name, i, _ in written] == [("alice", i) for i in range(4)]
+
+    def test_json_lines_sink(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.jsonl")
+            [results] = run(
+                _single_node_config(),
+                {"alice": MeasurePlusProgram()},
+                num_times=3,
+                sink=JsonLinesSink(path),
+            )
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        assert [line["iteration"] for line in lines] == [0, 1, 2]
+        assert [line["result"] for line in lines] == results
+
+    def test_columnar_sink(self):
+        sink = ColumnarSink()
+        run_parallel(
+            _single_node_config(),
+            {"alice": MeasurePlusProgram()},
+            num_times=5,
+            workers=2,
+            sink=sink,
+            retain_results=False,
+        )
+        assert sink.num_results("alice") == 5
+        outcomes = sink.columns("alice")["outcome"]
+        assert outcomes.dtype == "int64"
+        assert len(outcomes) == 5
+
+    def test_columnar_sink_missing_keys(self):
+        sink = ColumnarSink()
+        sink.open(["alice"])
+        sink.write("alice", 0, {"m": 1})
+        sink.write("alice", 1, {"m": 0, "label": "x"})
+        sink.write("alice", 2, {})
+        columns = sink.columns("alice")
+        assert columns["m"][:2].tolist() == [1.0, 0.0]
+        assert columns["label"].tolist() == [None, "x", None]
+
+
+class TestConfigPaths(unittest.TestCase):
+    def test_set_config_value(self):
+        config = StackNetworkConfig(
+            stacks=[
+                StackConfig.perfect_generic_config("alice"),
+                StackConfig.perfect_generic_config("bob"),
+            ],
+            links=[
+                LinkConfig(
+                    stack1="alice",
+                    stack2="bob",
+                    typ="depolarise",
+                    cfg={"fidelity": 0.9, "prob_success": 1, "t_cycle": 10},
+                )
+            ],
+        )
+        set_config_value(config, "links[0].cfg.fidelity", 0.75)
+        set_config_value(config, "stacks[1].qdevice_cfg.T2", 1e6)
+        set_config_value(config, "stacks[alice].qdevice_cfg.T1", 1e7)
+        assert get_config_value(config, "links[0].cfg.fidelity") == 0.75
+        assert config.stacks[1].qdevice_cfg.T2 == 1e6
+        assert config.stacks[0].qdevice_cfg.T1 == 1e7
+
+        with self.assertRaises(AttributeError):
+            set_config_value(config, "stacks[0].qdevice_cfg.T3", 1)
+        with self.assertRaises(KeyError):
+            set_config_value(config, "links[0].cfg.fidelty", 0.5)
+        with self.assertRaises(ValueError):
+            set_config_value(config, "stacks..name", "carol")
+
+
+if __name__ == "__main__":
+    unittest.main()